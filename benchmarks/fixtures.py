@@ -0,0 +1,84 @@
+"""Synthetic file trees and images for the benchmarks."""
+import os
+
+LAYOUTS = ("flat", "deep")
+
+# Source formats of the synthetic images, as (extension, Pillow mode)
+IMAGE_SOURCES = (
+    (".png", "RGBA"),
+    (".jpg", "RGB"),
+    (".webp", "RGB"),
+    (".bmp", "RGB"),
+    (".tiff", "RGB"),
+    (".gif", "P"),
+    (".ico", "RGBA"),
+)
+
+_EXTENSIONS = (".jpg", ".png", ".txt", ".pdf", ".mp3", ".docx")
+_FILES_PER_DIR = 10
+_FANOUT = 4
+
+
+def file_paths(root, count, layout):
+    """Relative paths of a tree of `count` files.
+
+    flat puts every file in one folder; deep puts ten files in each folder and
+    nests folders four to a parent, which gives about 9 levels for 1M files.
+    """
+    paths = []
+    for i in range(count):
+        name = f"file{i}{_EXTENSIONS[i % len(_EXTENSIONS)]}"
+        if layout == "flat":
+            paths.append(os.path.join(root, name))
+            continue
+        dir_id = i // _FILES_PER_DIR
+        parts = []
+        while dir_id:
+            dir_id, digit = divmod(dir_id, _FANOUT)
+            parts.append(f"d{digit}")
+        paths.append(os.path.join(root, *reversed(parts), name))
+    return paths
+
+
+def make_tree(root, count, layout):
+    """Creates empty files (with staggered mtimes, so date sorts do real work)."""
+    paths = file_paths(root, count, layout)
+    made = set()
+    for i, path in enumerate(paths):
+        directory = os.path.dirname(path)
+        if directory not in made:
+            os.makedirs(directory, exist_ok=True)
+            made.add(directory)
+        with open(path, "wb"):
+            pass
+        # Not in name order, so sorting by date reorders the list
+        stamp = 1_600_000_000 + (i * 7919) % count
+        os.utime(path, (stamp, stamp))
+    return paths
+
+
+def make_images(root, per_format, size=(1024, 768)):
+    """Writes `per_format` gradient images in each source format, one folder per format."""
+    from PIL import Image
+
+    base = Image.linear_gradient("L").resize(size)
+    rgb = Image.merge("RGB", (base, base.transpose(Image.Transpose.FLIP_LEFT_RIGHT), base.rotate(90)))
+    images = {}
+    for ext, mode in IMAGE_SOURCES:
+        folder = os.path.join(root, ext[1:])
+        os.makedirs(folder, exist_ok=True)
+        if mode == "P":
+            image = rgb.convert("P", palette=Image.Palette.ADAPTIVE)
+        elif mode == "RGBA":
+            image = rgb.convert("RGBA")
+        else:
+            image = rgb
+        if ext == ".ico":
+            image = image.resize((256, 256))
+        paths = []
+        for i in range(per_format):
+            path = os.path.join(folder, f"image{i}{ext}")
+            image.save(path)
+            paths.append(path)
+        images[ext] = paths
+    return images
@@ -0,0 +1,335 @@
+"""Benchmarks for scanning, list population, sorting, renaming and conversion.
+
+    python -m benchmarks.run                          # 10k and 100k files, flat and deep
+    python -m benchmarks.run --sizes 10k,100k,1m --save-baseline
+    python -m benchmarks.run --threshold 0.25         # exit 1 if a stage got >25% slower
+
+Everything runs in a temporary folder (--tmpdir to pick the filesystem). Each
+stage is run --repeat times and the fastest run is kept. Results are compared
+with the stored baseline (benchmarks/baseline.json by default), which is only
+meaningful on the machine that recorded it.
+
+The GUI stages need a display: they use $DISPLAY, start Xvfb when it is
+installed, or are skipped.
+"""
+import argparse
+import json
+import os
+import platform
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+from benchmarks.fixtures import LAYOUTS, make_images, make_tree
+from organizer.converter import TARGET_FORMATS, ConvertJob, parse_targets, target_output_path
+from organizer.file_list import FileListModel
+from organizer.journal import RenameJournal, undo_journal
+from organizer.renamer import apply_plan, plan_renames
+from organizer.scanner import iter_folder_entries
+from organizer.sessions import SessionStore
+
+DEFAULT_BASELINE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "baseline.json")
+STAGES = ("scan", "populate", "add", "sort", "session", "rename", "gui", "convert")
+
+# Differences below this are timer noise, whatever the percentage
+MIN_DELTA = 0.005
+# Several outputs written from one decode per source, next to the one-format runs
+MULTI_TARGET = "png webp ico"
+
+
+def parse_size(text):
+    text = text.strip().lower()
+    scale = {"k": 1_000, "m": 1_000_000}.get(text[-1:], 1)
+    return int(text.rstrip("km")) * scale
+
+
+def best_time(fn, setup=None, repeat=3):
+    best = None
+    for _ in range(repeat):
+        arg = setup() if setup is not None else None
+        started = time.perf_counter()
+        fn(arg) if setup is not None else fn()
+        elapsed = time.perf_counter() - started
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+
+class Runner:
+    def __init__(self, args, workdir):
+        self.args = args
+        self.workdir = workdir
+        self.results = {}
+        self.stages = set(args.only.split(",")) if args.only else set(STAGES)
+        self._gui_root = None
+
+    def record(self, name, seconds):
+        self.results[name] = seconds
+        if not self.args.json:
+            print(f"  {name:<36} {seconds * 1000:10.1f} ms", flush=True)
+
+    def wants(self, stage):
+        return stage in self.stages
+
+    # --- File trees ---
+
+    def run_tree(self, count, layout):
+        label = f"{layout}/{self.args.size_labels[count]}"
+        root = os.path.join(self.workdir, f"tree-{layout}-{count}")
+        if not self.args.json:
+            print(f"{label}: creating {count} files...", flush=True)
+        paths = make_tree(root, count, layout)
+        repeat = self.args.repeat
+
+        entries = None
+        if self.wants("scan") or self.wants("populate") or self.wants("sort"):
+            entries = list(iter_folder_entries(root, "all_children"))
+        if self.wants("scan"):
+            self.record(f"scan/{label}", best_time(lambda: list(iter_folder_entries(root, "all_children")),
+                                                   repeat=repeat))
+        if self.wants("populate"):
+            self.record(f"populate/{label}", best_time(lambda m: m.add_scanned(entries), FileListModel, repeat))
+        if self.wants("add"):
+            # The Add Files / drop path: one stat per file
+            self.record(f"add/{label}", best_time(lambda m: m.add_many(paths), FileListModel, repeat))
+        if self.wants("sort"):
+            def loaded():
+                model = FileListModel()
+                model.add_scanned(entries)
+                return model
+
+            for field in ("name", "mtime", "size"):
+                self.record(f"sort_{field}/{label}",
+                            best_time(lambda m: m.sort([(field, False)]), loaded, repeat))
+        if self.wants("session"):
+            # Saving the scanned list, then reopening it with nothing changed on disk
+            model = FileListModel()
+            directories = []
+            model.add_scanned(iter_folder_entries(root, "all_children", directories=directories))
+            model.add_directories(root, "all_children", directories)
+            store = SessionStore(os.path.join(self.workdir, "sessions.sqlite3"))
+            self.record(f"session_save/{label}", best_time(lambda: store.save(label, model), repeat=repeat))
+            self.record(f"session_open/{label}",
+                        best_time(lambda: store.load(label).apply_to(FileListModel()), repeat=repeat))
+        if self.wants("rename"):
+            self.record(f"rename_plan/{label}",
+                        best_time(lambda: plan_renames(paths, "Ordered renaming", "renamed-@@@@@@@"), repeat=repeat))
+            # Applied once, then undone through the journal, which restores the tree
+            plan = plan_renames(paths, "Ordered renaming", "renamed-@@@@@@@")
+            journal = RenameJournal.create(os.path.join(self.workdir, "journals"))
+            started = time.perf_counter()
+            apply_plan(plan, journal)
+            self.record(f"rename_apply/{label}", time.perf_counter() - started)
+            started = time.perf_counter()
+            failed = undo_journal(journal.path)
+            self.record(f"rename_undo/{label}", time.perf_counter() - started)
+            if failed:
+                raise RuntimeError(f"undo left {failed} files renamed")
+        if self.wants("gui"):
+            if self.gui_root() is not None:
+                self.run_gui(root, paths, label)
+            elif not self.args.json and not self.args.no_gui:
+                print("  gui: skipped (no display and no Xvfb)", flush=True)
+
+        shutil.rmtree(root, ignore_errors=True)
+
+    # --- GUI list population ---
+
+    def gui_root(self):
+        if self._gui_root is None and not self.args.no_gui and _ensure_display():
+            import customtkinter as ctk
+
+            self._gui_root = ctk.CTk()
+            self._gui_root.geometry("900x700")
+            self._gui_root.update()
+        return self._gui_root
+
+    def run_gui(self, folder, paths, label):
+        from main import SortableFileList
+
+        root = self._gui_root
+
+        def new_list():
+            widget = SortableFileList(root)
+            widget.pack(fill="both", expand=True)
+            root.update()
+            return widget
+
+        def add_files(widget):
+            widget.add_files(paths)
+            root.update()
+
+        def scan(widget):
+            widget.start_scan(folder, "all_children")
+            while widget.is_scanning():
+                root.update()
+                time.sleep(0.002)
+            root.update()
+
+        for name, fn in (("gui_add_files", add_files), ("gui_scan", scan)):
+            widgets = []
+
+            def setup():
+                for old in widgets:
+                    old.destroy()
+                widgets[:] = [new_list()]
+                return widgets[0]
+
+            self.record(f"{name}/{label}", best_time(fn, setup, self.args.repeat))
+            for old in widgets:
+                old.destroy()
+
+    # --- Conversion ---
+
+    def run_images(self):
+        root = os.path.join(self.workdir, "images")
+        if not self.args.json:
+            print(f"images: creating {self.args.images} per source format...", flush=True)
+        images = make_images(root, self.args.images)
+        sources = [path for paths in images.values() for path in paths]
+        # Each format on its own, then several written from one decode
+        for target in TARGET_FORMATS + [MULTI_TARGET]:
+            targets = parse_targets(target)
+            batch = [path for path in sources if all(target_output_path(path, t) != path for t in targets)]
+            outputs = [target_output_path(path, t) for path in batch for t in targets]
+
+            def clean():
+                for output in outputs:
+                    if os.path.exists(output):
+                        os.remove(output)
+                return batch
+
+            def convert(files, target=target):
+                job = ConvertJob(files, target, keep_old=True, workers=self.args.workers).start()
+                job.wait()
+                if job.failed:
+                    errors = {r.error for r in job.results if r.error}
+                    raise RuntimeError(f"converting to {target}: {job.failed} failed ({'; '.join(sorted(errors))})")
+
+            self.record(f"convert_{target.replace(' ', '+')}/{len(batch)}", best_time(convert, clean, self.args.repeat))
+            clean()
+
+    def close(self):
+        if self._gui_root is not None:
+            self._gui_root.destroy()
+
+
+_xvfb = None
+
+
+def _ensure_display():
+    global _xvfb
+    if sys.platform.startswith("win") or sys.platform == "darwin" or os.environ.get("DISPLAY"):
+        return True
+    if _xvfb is None and shutil.which("Xvfb"):
+        display = ":97"
+        _xvfb = subprocess.Popen(["Xvfb", display, "-screen", "0", "1280x1024x24", "-nolisten", "tcp"],
+                                 stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        time.sleep(1.0)
+        if _xvfb.poll() is None:
+            os.environ["DISPLAY"] = display
+            return True
+    return False
+
+
+def machine_info():
+    return {
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "machine": platform.node(),
+        "cpus": os.cpu_count(),
+    }
+
+
+def compare(results, baseline, threshold):
+    """Rows of (name, seconds, baseline seconds or None, regressed)."""
+    rows = []
+    for name, seconds in results.items():
+        base = baseline.get(name)
+        regressed = base is not None and seconds > base * (1 + threshold) and seconds - base > MIN_DELTA
+        rows.append((name, seconds, base, regressed))
+    return rows
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(prog="python -m benchmarks.run", description=__doc__.split("\n\n")[0])
+    parser.add_argument("--sizes", default="10k,100k", help="file counts of the synthetic trees (default: 10k,100k)")
+    parser.add_argument("--layouts", default=",".join(LAYOUTS), help="tree shapes: flat, deep (default: both)")
+    parser.add_argument("--images", type=int, default=8, help="synthetic images per source format (default: 8)")
+    parser.add_argument("--workers", type=int, help="conversion worker processes (default: CPU count)")
+    parser.add_argument("--repeat", type=int, default=3, help="runs per stage, the fastest is kept (default: 3)")
+    parser.add_argument("--only", help=f"comma-separated stages to run: {', '.join(STAGES)}")
+    parser.add_argument("--no-gui", action="store_true", help="skip the Tk list stages")
+    parser.add_argument("--tmpdir", help="where to create the synthetic files (default: the system temp folder)")
+    parser.add_argument("--baseline", default=DEFAULT_BASELINE, help="baseline file to compare with or save to")
+    parser.add_argument("--save-baseline", action="store_true", help="store these results as the new baseline")
+    parser.add_argument("--threshold", type=float, default=0.25,
+                        help="fail when a stage is this much slower than the baseline (default: 0.25 = 25%%)")
+    parser.add_argument("--json", action="store_true", help="print the results as JSON")
+    return parser
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    sizes = [parse_size(s) for s in args.sizes.split(",") if s.strip()]
+    args.size_labels = dict(zip(sizes, (s.strip().lower() for s in args.sizes.split(",") if s.strip())))
+    layouts = [layout for layout in args.layouts.split(",") if layout]
+    for layout in layouts:
+        if layout not in LAYOUTS:
+            print(f"error: unknown layout {layout!r}", file=sys.stderr)
+            return 2
+
+    workdir = tempfile.mkdtemp(prefix="organizer-bench-", dir=args.tmpdir)
+    runner = Runner(args, workdir)
+    try:
+        for count in sizes:
+            for layout in layouts:
+                runner.run_tree(count, layout)
+        if runner.wants("convert") and args.images > 0:
+            runner.run_images()
+    finally:
+        runner.close()
+        shutil.rmtree(workdir, ignore_errors=True)
+        if _xvfb is not None:
+            _xvfb.terminate()
+
+    baseline = {}
+    if os.path.exists(args.baseline):
+        with open(args.baseline, encoding="utf-8") as f:
+            stored = json.load(f)
+        baseline = stored.get("results", {})
+        if stored.get("info", {}).get("machine") != platform.node() and not args.json:
+            print(f"note: the baseline was recorded on {stored.get('info', {}).get('machine')!r}, "
+                  "so the comparison is only indicative", file=sys.stderr)
+
+    rows = compare(runner.results, baseline, args.threshold)
+    regressions = [row for row in rows if row[3]]
+    if args.json:
+        json.dump({"info": machine_info(), "results": runner.results,
+                   "regressions": [name for name, *_ in regressions]}, sys.stdout, indent=2)
+        sys.stdout.write("\n")
+    elif baseline:
+        print(f"\n{'stage':<36} {'ms':>10} {'baseline':>10} {'change':>8}")
+        for name, seconds, base, regressed in rows:
+            if base is None:
+                print(f"{name:<36} {seconds * 1000:10.1f} {'-':>10} {'new':>8}")
+            else:
+                change = (seconds - base) / base * 100 if base else 0.0
+                flag = "  REGRESSED" if regressed else ""
+                print(f"{name:<36} {seconds * 1000:10.1f} {base * 1000:10.1f} {change:+7.1f}%{flag}")
+
+    if args.save_baseline:
+        merged = dict(baseline)
+        merged.update(runner.results)
+        with open(args.baseline, "w", encoding="utf-8") as f:
+            json.dump({"info": machine_info(), "results": merged}, f, indent=2, sort_keys=True)
+            f.write("\n")
+        if not args.json:
+            print(f"Saved baseline to {args.baseline}")
+        return 0
+    return 1 if regressions else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
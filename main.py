@@ -1,12 +1,22 @@
+import time
+_PROCESS_STARTED_AT = time.perf_counter()  # Before the heavy imports, for --startup-profile
+
 import customtkinter as ctk
 import tkinter as tk
 from tkinter import filedialog, messagebox
 import os
-import re
 import sys
-from PIL import Image
+import base64
 import threading
+from collections import OrderedDict
 from tkinterdnd2 import TkinterDnD, DND_FILES
+from organizer.file_list import FileListModel, collect_info
+from organizer.scanner import FolderScan, ScanFilter, iter_folder_entries, parse_date, parse_size
+from organizer.journal import RenameJournal, interrupted_journals, journal_summary, last_undoable_journal, load_journal, resume_journal, undo_journal
+from organizer.stats import STATS
+from organizer.renamer import (COUNTER_MODES, RENAME_MODES, PREVIEW_COLLISION, PREVIEW_PENDING, PREVIEW_UNCHANGED,
+                               DirectoryIndex, RenamePreview, apply_plan, name_function, parse_start_number,
+                               plan_renames, split_path)
 
 # --- Theme Configuration ---
 GOLD = "#D4AF37"
@@ -15,54 +25,140 @@ BLACK = "#000000"
 DARK_GRAY = "#1A1A1A"
 TEXT_COLOR = "#FFFFFF"  # White for general text readability against dark gray
 GOLD_TEXT = "#D4AF37"
+MUTED_TEXT = "#777777"
+ERROR_TEXT = "#E05555"
+ERROR_ROW = "#3A1414"
+
+ORGANIZE_DATE_SOURCES = {
+    "File date": "mtime",
+    "EXIF capture date": "exif",
+}
+
+SORT_FIELD_LABELS = {
+    "Name": "name",
+    "Extension": "ext",
+    "Size": "size",
+    "Date modified": "mtime",
+    "Date created/changed": "ctime",
+}
+
+# Thumbnail images kept by each list; enough for several screens of rows, so
+# scrolling back and forth never reloads them
+THUMBNAIL_IMAGES = 400
 
 ctk.set_appearance_mode("Dark")
 ctk.set_default_color_theme("dark-blue")  # We will override colors manually
 
-class SortableFileList(ctk.CTkScrollableFrame):
-    def __init__(self, master, allowed_extensions=None, **kwargs):
+class SortableFileList(ctk.CTkFrame):
+    # Virtualized list: only the rows that fit in the viewport exist as canvas items,
+    # and they are re-pointed at the model whenever the list scrolls or changes.
+    def __init__(self, master, allowed_extensions=None, row_height=28, **kwargs):
         super().__init__(master, **kwargs)
-        self.allowed_extensions = [ext.lower() for ext in allowed_extensions] if allowed_extensions else None
-        self.file_paths = []
-        self.labels = []
-        self.drag_source = None
+        self.model = FileListModel(allowed_extensions)
+        self.row_height = row_height
+        self._base_row_height = row_height
         self.drag_source_index = None
         self.dragging = False
+        self._drag_moved = False
+        self.selected = set()  # Indices of the selected rows
+        self._anchor_index = None  # Where a shift-click range starts
+        self._last_sort = None  # Sort spec last applied, so a second click flips it
 
         # Configure drag visuals
         self.drag_highlight_color = "#333333"
 
-        # Register Drop
-        self.drop_target_register(DND_FILES)
-        self.dnd_bind('<<Drop>>', self._on_drop)
-        
-        # Register Drop on internal widgets (Canvas etc) because they cover the main frame
-        children_widgets = []
-        try:
-            if hasattr(self, "_parent_canvas"):
-                children_widgets.append(self._parent_canvas)
-            if hasattr(self, "_scrollbar"):
-                children_widgets.append(self._scrollbar)
-        except Exception:
-            pass
-
-        for widget in children_widgets:
+        self._offset = 0  # Scroll position in pixels
+        self._rows = []  # Pool of (background, name, preview background, preview, thumbnail) canvas items
+        self._slot_state = []  # What each pooled row currently shows, to skip redundant updates
+        self._redraw_pending = False
+        self._font = ctk.CTkFont()
+        self._scans = []  # Active background folder scans
+        self._session_load = None  # (thread, cancel event, result) while a saved session opens
+
+        # Optional rename preview column, see set_preview()
+        self._preview_spec = None
+        self._preview = None
+        self._preview_count_after = None
+        self.dir_index = DirectoryIndex()
+        # Image headers read for template previews, kept across keystrokes
+        self.metadata = None
+        self._metadata_poll_after = None
+        # Optional per-file note in the same column, see set_annotations()
+        self._annotate = None
+        # Optional thumbnails, see set_thumbnails()
+        self._thumbs = None
+        self._thumb_images = OrderedDict()  # key -> PhotoImage, or None for a file that has none
+        self._thumb_poll_after = None
+
+        inset = max(self.cget("border_width"), 1) + 2
+        self.grid_columnconfigure(0, weight=1)
+        self.grid_rowconfigure(1, weight=1)
+
+        # Filter bar: which files folder scans (and watched folders) take, see scan_filter()
+        self._filter_bar = ctk.CTkFrame(self, fg_color="transparent")
+        self._filter_bar.grid(row=0, column=0, columnspan=2, sticky="ew", padx=inset, pady=(inset, 0))
+        ctk.CTkLabel(self._filter_bar, text="Folders:", text_color=GOLD).pack(side="left", padx=(4, 2))
+        self._filter_inputs = {}
+        for field, placeholder, width in (("include", "Include *.jpg", 95), ("exclude", "Exclude glob", 95),
+                                          ("name_regex", "Name regex", 85), ("min_size", "Min size", 65),
+                                          ("max_size", "Max size", 65), ("since", "Since date", 85),
+                                          ("until", "Until date", 85), ("depth", "Depth", 50)):
+            entry = ctk.CTkEntry(self._filter_bar, placeholder_text=placeholder, width=width, height=24,
+                                 border_color=DARK_GOLD, fg_color=BLACK, text_color=GOLD)
+            entry.pack(side="left", padx=2)
+            self._filter_inputs[field] = entry
+
+        self._canvas = tk.Canvas(self, bg=BLACK, highlightthickness=0, bd=0)
+        self._canvas.grid(row=1, column=0, sticky="nsew", padx=(inset, 0), pady=inset)
+        self._scrollbar = ctk.CTkScrollbar(self, command=self._on_scrollbar)
+        self._scrollbar.grid(row=1, column=1, sticky="ns", padx=(0, inset), pady=inset)
+
+        # Scan status bar, only shown while folders are being scanned
+        self._scan_bar = ctk.CTkFrame(self, fg_color=DARK_GRAY, corner_radius=0)
+        self._scan_label = ctk.CTkLabel(self._scan_bar, text="", text_color=GOLD, anchor="w")
+        self._scan_label.pack(side="left", padx=10, fill="x", expand=True)
+        self._scan_cancel_btn = ctk.CTkButton(self._scan_bar, text="Cancel", width=70, command=self.cancel_scans,
+                                              fg_color=DARK_GRAY, border_color=GOLD, border_width=2,
+                                              text_color=GOLD, hover_color="#333333")
+        self._scan_cancel_btn.pack(side="right", padx=5, pady=4)
+
+        self._canvas.bind("<Configure>", lambda e: self.refresh())
+        self._canvas.bind("<Button-1>", self._on_click)
+        self._canvas.bind("<B1-Motion>", self._on_drag_motion)
+        self._canvas.bind("<ButtonRelease-1>", self._on_drag_stop)
+        self._canvas.bind("<Control-a>", self.select_all)
+        self._canvas.bind("<Escape>", lambda e: self.select_none())
+        self._canvas.bind("<Alt-Home>", self.move_selection_to_top)
+        self._canvas.bind("<Alt-End>", self.move_selection_to_bottom)
+        self._canvas.bind("<Delete>", self.remove_selected)
+
+        self._context_menu = tk.Menu(self, tearoff=0)
+        self._context_menu.add_command(label="Move to top", command=self.move_selection_to_top)
+        self._context_menu.add_command(label="Move to bottom", command=self.move_selection_to_bottom)
+        self._context_menu.add_separator()
+        self._context_menu.add_command(label="Remove from list", command=self.remove_selected)
+        self._canvas.bind("<Button-3>" if sys.platform != "darwin" else "<Button-2>", self._on_context_menu)
+        for sequence in ("<MouseWheel>", "<Button-4>", "<Button-5>"):
+            self._canvas.bind(sequence, self._on_mousewheel)
+
+        # Register Drop on the frame and the canvas, since the canvas covers the frame
+        for widget in (self, self._canvas):
             try:
                 widget.drop_target_register(DND_FILES)
                 widget.dnd_bind('<<Drop>>', self._on_drop)
             except Exception as e:
                 print(f"Failed to register DND for {widget}: {e}")
 
-    def _is_valid_file(self, path):
-        if not os.path.isfile(path):
-            return False
+    @property
+    def allowed_extensions(self):
+        return self.model.allowed_extensions
 
-        if self.allowed_extensions:
-            _, ext = os.path.splitext(path)
-            if ext.lower() not in self.allowed_extensions:
-                return False
+    @property
+    def file_paths(self):
+        return self.model.paths
 
-        return True
+    def _is_valid_file(self, path):
+        return self.model.is_valid_file(path)
 
     def _folder_has_subfolders(self, folder_path):
         try:
@@ -118,37 +214,21 @@ class SortableFileList(ctk.CTkScrollableFrame):
         return result["value"]
 
     def _iter_folder_files(self, folder_path, mode):
-        if mode == "folder_only":
-            try:
-                with os.scandir(folder_path) as it:
-                    for entry in it:
-                        if entry.is_file() and self._is_valid_file(entry.path):
-                            yield entry.path
-            except Exception:
-                return
-            return
-
-        if mode == "direct_subfolders":
-            yield from self._iter_folder_files(folder_path, "folder_only")
-            try:
-                with os.scandir(folder_path) as it:
-                    for entry in it:
-                        if entry.is_dir():
-                            yield from self._iter_folder_files(entry.path, "folder_only")
-            except Exception:
-                return
-            return
-
-        if mode == "all_children":
-            try:
-                for root, _, files in os.walk(folder_path):
-                    for name in files:
-                        p = os.path.join(root, name)
-                        if self._is_valid_file(p):
-                            yield p
-            except Exception:
-                return
-            return
+        for entry in iter_folder_entries(folder_path, mode, self.allowed_extensions, scan_filter=self.scan_filter()):
+            yield entry.path
+
+    def scan_filter(self):
+        # The ScanFilter from the filter bar, or None when it is empty; raises ValueError
+        text = {field: entry.get().strip() for field, entry in self._filter_inputs.items()}
+        depth = text["depth"]
+        if depth and not depth.isdigit():
+            raise ValueError("Depth must be a whole number (0 = the folder itself).")
+        scan_filter = ScanFilter(include=_split_globs(text["include"]), exclude=_split_globs(text["exclude"]),
+                                 name_regex=text["name_regex"], min_size=parse_size(text["min_size"]),
+                                 max_size=parse_size(text["max_size"]), modified_since=parse_date(text["since"]),
+                                 modified_until=parse_date(text["until"], end_of_day=True),
+                                 max_depth=int(depth) if depth else None)
+        return scan_filter or None
 
     def add_path(self, path):
         if os.path.isdir(path):
@@ -159,8 +239,7 @@ class SortableFileList(ctk.CTkScrollableFrame):
                     return
                 mode = chosen
 
-            for file_path in self._iter_folder_files(path, mode):
-                self.add_file(file_path)
+            self.start_scan(path, mode)
             return
 
         self.add_file(path)
@@ -168,163 +247,737 @@ class SortableFileList(ctk.CTkScrollableFrame):
     def _on_drop(self, event):
         if event.data:
             try:
-                files = self.tk.splitlist(event.data)
-                for f in files:
-                    self.add_path(f)
+                files = []
+                for f in self.tk.splitlist(event.data):
+                    if os.path.isdir(f):
+                        self.add_path(f)
+                    else:
+                        files.append(f)
+                self.add_files(files)
             except Exception as e:
                 print(f"Drop error: {e}")
 
     def add_file(self, path):
-        if path in self.file_paths:
+        return self.add_files((path,)) == 1
+
+    def add_files(self, paths):
+        added = self.model.add_many(paths)
+        if added:
+            self.refresh()
+        return added
+
+    def clear(self):
+        self.cancel_scans()
+        self.model.clear()
+        self.selected = set()
+        self._anchor_index = None
+        self.dir_index = DirectoryIndex()
+        self._offset = 0
+        self.refresh()
+
+    def get_files(self):
+        return self.model.paths
+
+    def remove_selected(self, event=None):
+        removed = self.model.remove(self.selected)
+        self.selected = set()
+        self._anchor_index = None
+        if removed:
+            self.refresh()
+        return removed
+
+    def remove_paths(self, paths):
+        paths = set(paths)
+        removed = self.model.remove([i for i, path in enumerate(self.model.paths) if path in paths])
+        if removed:
+            self.selected = set()
+            self._anchor_index = None
+            self.refresh()
+        return removed
+
+    def select_paths(self, paths):
+        paths = set(paths)
+        self.selected = {i for i, path in enumerate(self.model.paths) if path in paths}
+        self._anchor_index = None
+        self.refresh()
+
+    # --- Background folder scans ---
+
+    def start_scan(self, folder_path, mode):
+        try:
+            scan_filter = self.scan_filter()
+        except ValueError as e:
+            messagebox.showerror("Error", str(e))
             return
+        scan = FolderScan(folder_path, mode, self.allowed_extensions, scan_filter=scan_filter).start()
+        if not self._scans:
+            self._scan_bar.grid(row=2, column=0, columnspan=2, sticky="ew", padx=2, pady=(0, 2))
+            self.after(50, self._poll_scans)
+        self._scans.append(scan)
+        self._update_scan_label()
+
+    def cancel_scans(self):
+        for scan in self._scans:
+            scan.cancel()
+        if self._session_load is not None:
+            self._session_load[1].set()
+
+    def is_scanning(self):
+        return bool(self._scans) or self._session_load is not None
+
+    def _update_scan_label(self):
+        found = sum(scan.found for scan in self._scans)
+        self._scan_label.configure(text=f"Scanning... {found:,} files found")
+
+    def _poll_scans(self):
+        for scan in list(self._scans):
+            finished = scan.done
+            for batch in scan.drain():
+                if not scan.cancelled:
+                    self.model.add_scanned(batch)
+            if finished:
+                self._scans.remove(scan)
+                if not scan.cancelled:
+                    # Lets a saved session rescan just the directories that change
+                    self.model.add_directories(scan.folder_path, scan.mode, scan.directories, scan.scan_filter)
+
+        self.refresh()
+        if self._scans:
+            self._update_scan_label()
+            self.after(50, self._poll_scans)
+        else:
+            self._scan_bar.grid_remove()
+
+    # --- Saved sessions ---
+
+    def open_session(self, name):
+        # Replaces the list with a saved session, brought up to date on a worker thread
+        import sqlite3
+
+        from organizer.sessions import SessionStore
 
-        if not self._is_valid_file(path):
+        if self.is_scanning():
+            messagebox.showwarning("Warning", "Wait for the folder scan to finish.")
             return
+        cancel = threading.Event()
+        result = {}
 
-        self.file_paths.append(path)
-        
-        # Create a container frame for the label to handle events better or just the label
-        # Using CTkLabel directly
-        lbl = ctk.CTkLabel(self, text=os.path.basename(path), text_color="white", anchor="w", cursor="hand2")
-        lbl.pack(fill="x", padx=5, pady=2)
-        
-        # Bind events for Drag and Drop (Internal Reorder)
-        lbl.bind("<Button-1>", self._on_drag_start)
-        lbl.bind("<B1-Motion>", self._on_drag_motion)
-        lbl.bind("<ButtonRelease-1>", self._on_drag_stop)
-        
-        # Register Label as Drop Target for External Files
-        # This is CRITICAL because the label covers the frame background
+        def run():
+            try:
+                result["session"] = SessionStore().load(name, self.allowed_extensions, cancel)
+            except (OSError, ValueError, sqlite3.Error) as e:
+                result["error"] = str(e)
+
+        worker = threading.Thread(target=run, daemon=True)
+        self._session_load = (worker, cancel, result)
+        self._scan_label.configure(text=f"Opening session {name}...")
+        self._scan_bar.grid(row=2, column=0, columnspan=2, sticky="ew", padx=2, pady=(0, 2))
+        worker.start()
+        self.after(50, self._poll_session)
+
+    def _poll_session(self):
+        worker, cancel, result = self._session_load
+        if worker.is_alive():
+            self.after(50, self._poll_session)
+            return
+        self._session_load = None
+        self._scan_bar.grid_remove()
+        if "error" in result:
+            messagebox.showerror("Error", result["error"])
+            return
+        session = result.get("session")
+        if session is None or cancel.is_set():
+            return
+        self.clear()
+        session.apply_to(self.model)
+        self.refresh()
+
+    def ask_session(self):
+        import sqlite3
+
+        from organizer.sessions import SessionStore
+
+        store = SessionStore()
         try:
-            lbl.drop_target_register(DND_FILES)
-            lbl.dnd_bind('<<Drop>>', self._on_drop)
+            sessions = store.list()
+        except (OSError, sqlite3.Error) as e:
+            messagebox.showerror("Error", str(e))
+            return
+        win = ctk.CTkToplevel(self.winfo_toplevel())
+        win.title("Sessions")
+        win.resizable(False, False)
+
+        container = ctk.CTkFrame(win, fg_color="transparent")
+        container.pack(fill="both", expand=True, padx=20, pady=20)
+
+        ctk.CTkLabel(container, text="Saved sessions", text_color=GOLD).grid(row=0, column=0, columnspan=2,
+                                                                            pady=(0, 10))
+        labels = {f"{info.name} ({info.files:,} files, {time.strftime('%Y-%m-%d %H:%M', time.localtime(info.saved))})":
+                  info.name for info in sessions}
+        session_var = ctk.StringVar(value=next(iter(labels), "(none saved)"))
+        ctk.CTkOptionMenu(container, variable=session_var, values=list(labels) or ["(none saved)"], width=320,
+                          fg_color=GOLD, button_color=DARK_GOLD, button_hover_color=GOLD, text_color=BLACK,
+                          dropdown_fg_color=DARK_GRAY,
+                          dropdown_text_color=GOLD).grid(row=1, column=0, columnspan=2, sticky="ew", pady=5)
+
+        def open_selected():
+            name = labels.get(session_var.get())
+            if name is None:
+                return
+            win.destroy()
+            self.open_session(name)
+
+        def delete_selected():
+            name = labels.get(session_var.get())
+            if name is None or not messagebox.askyesno("Sessions", f"Delete the saved session {name}?", parent=win):
+                return
+            win.destroy()
+            try:
+                store.delete(name)
+            except (OSError, sqlite3.Error) as e:
+                messagebox.showerror("Error", str(e))
+
+        def save():
+            name = name_input.get().strip()
+            if not name:
+                return
+            if self.is_scanning():
+                messagebox.showwarning("Warning", "Wait for the folder scan to finish.", parent=win)
+                return
+            win.destroy()
+            try:
+                count = store.save(name, self.model)
+            except (OSError, ValueError, sqlite3.Error) as e:
+                messagebox.showerror("Error", str(e))
+                return
+            messagebox.showinfo("Sessions", f"Saved {count:,} files as {name}.")
+
+        ctk.CTkButton(container, text="Open", command=open_selected,
+                      fg_color=GOLD, text_color=BLACK, hover_color=DARK_GOLD).grid(row=2, column=0, sticky="ew",
+                                                                                   padx=(0, 5), pady=5)
+        ctk.CTkButton(container, text="Delete", command=delete_selected,
+                      fg_color=DARK_GRAY, border_color=GOLD, border_width=2,
+                      text_color=GOLD, hover_color="#333333").grid(row=2, column=1, sticky="ew", pady=5)
+
+        name_input = ctk.CTkEntry(container, placeholder_text="Name for the current list",
+                                  border_color=GOLD, fg_color=BLACK, text_color=GOLD)
+        name_input.grid(row=3, column=0, sticky="ew", padx=(0, 5), pady=(15, 5))
+        ctk.CTkButton(container, text="Save", command=save,
+                      fg_color=GOLD, text_color=BLACK, hover_color=DARK_GOLD).grid(row=3, column=1, sticky="ew",
+                                                                                   pady=(15, 5))
+
+        try:
+            win.transient(self.winfo_toplevel())
+            win.grab_set()
         except Exception:
-            pass # In case widget doesn't support it (though CTkLabel usually wraps a widget that does if root is DnD)
+            pass
 
-        self.labels.append(lbl)
+    # --- Rename preview ---
 
-    def clear(self):
-        for lbl in self.labels:
-            lbl.destroy()
-        self.labels = []
-        self.file_paths = []
+    def set_preview(self, spec):
+        # spec is (mode, value, start) to show a preview column, or None to hide it
+        self._preview_spec = spec
+        self._drop_preview()
+        self.refresh()
 
-    def get_files(self):
-        return self.file_paths
-
-    def _on_drag_start(self, event):
-        self.dragging = True
-        self.drag_source = event.widget
-        # Find the CTkLabel wrapper if event.widget is the internal tkinter label
-        # In CTk, event.widget from bind on CTkLabel is usually the internal tkinter label/canvas.
-        # We need to match it to our self.labels list.
-        
-        # Search for the label object that owns this widget or is this widget
-        self.drag_source_item = None
-        self.drag_source_index = -1
-        
-        # CTk specific: event.widget might be the internal widget.
-        # We can iterate our labels and check which one matches or contains event.widget
-        for i, lbl in enumerate(self.labels):
-            if lbl == event.widget or event.widget in lbl.winfo_children() or str(event.widget).startswith(str(lbl)):
-                # The str(event.widget).startswith(str(lbl)) check helps if the event comes from a child
-                self.drag_source_item = lbl
-                self.drag_source_index = i
-                break
-        
-        if self.drag_source_item:
-            self.drag_source_item.configure(fg_color=self.drag_highlight_color)
+    def set_annotations(self, annotate):
+        # annotate(path) -> (text, color) or None, shown where the rename preview
+        # goes; keyed by path so it follows rows through sorting and removal
+        self._annotate = annotate
+        self.refresh()
+
+    def set_thumbnails(self, enabled, size=48):
+        # Shows a preview of each image at the start of its row, made in the
+        # background for the rows on screen only
+        if enabled == (self._thumbs is not None):
+            return
+        first = self._offset // self.row_height
+        if enabled:
+            from organizer.thumbnails import ThumbnailLoader
+
+            self._thumbs = ThumbnailLoader(size)
+            self.row_height = max(self._base_row_height, size + 8)
+        else:
+            self._thumbs.close()
+            self._thumbs = None
+            self._thumb_images.clear()
+            if self._thumb_poll_after is not None:
+                self.after_cancel(self._thumb_poll_after)
+                self._thumb_poll_after = None
+            self.row_height = self._base_row_height
+        # Keep the same row at the top
+        self._offset = first * self.row_height
+        self._slot_state = [False] * len(self._slot_state)
+        self.refresh()
+
+    def _thumbnail_for(self, path, missing):
+        # The PhotoImage for a row, or None; keys still to be made are added to `missing`
+        info = self.model.info.get(path)
+        key = self._thumbs.key(path, info.size, info.mtime) if info is not None else (path, None, None)
+        images = self._thumb_images
+        if key in images:
+            images.move_to_end(key)
+            return images[key]
+        found, data = self._thumbs.cached(key)
+        if not found:
+            missing.append(key)
+            return None
+        return self._store_thumbnail(key, data)
+
+    def _store_thumbnail(self, key, data):
+        image = tk.PhotoImage(data=base64.b64encode(data).decode("ascii"), master=self._canvas) if data is not None else None
+        images = self._thumb_images
+        images[key] = image
+        while len(images) > THUMBNAIL_IMAGES:
+            images.popitem(last=False)
+        return image
+
+    def _schedule_thumbnail_poll(self):
+        if self._thumb_poll_after is None:
+            self._thumb_poll_after = self.after(50, self._poll_thumbnails)
+
+    def _poll_thumbnails(self):
+        self._thumb_poll_after = None
+        thumbs = self._thumbs
+        if thumbs is None:
+            return
+        finished = thumbs.results()
+        for key, data in finished:
+            self._store_thumbnail(key, data)
+        if finished:
+            self.refresh()
+        if thumbs.busy:
+            self._schedule_thumbnail_poll()
+
+    def _drop_preview(self):
+        if self._preview is not None:
+            self._preview.cancel()
+            self._preview = None
+        if self._preview_count_after is not None:
+            self.after_cancel(self._preview_count_after)
+            self._preview_count_after = None
+
+    def _current_preview(self):
+        if self._preview_spec is None:
+            return None
+        if self._preview is None or self._preview.version != self.model.version:
+            self._drop_preview()
+            try:
+                self._preview = RenamePreview(self.model.paths, *self._preview_spec, index=self.dir_index,
+                                              version=self.model.version, metadata=self.metadata,
+                                              info=self.model.info)
+            except ValueError:
+                self._preview_spec = None
+                return None
+            if self._preview.metadata is not None:
+                self.metadata = self._preview.metadata
+            # Only check the whole list for duplicate targets once it has settled
+            self._preview_count_after = self.after(300, self._count_preview_targets)
+        return self._preview
+
+    def _schedule_metadata_poll(self):
+        if self._metadata_poll_after is None:
+            self._metadata_poll_after = self.after(50, self._poll_metadata)
+
+    def _poll_metadata(self):
+        self._metadata_poll_after = None
+        metadata = self.metadata
+        if metadata is None:
+            return
+        if metadata.updated():
+            self.refresh()
+        if metadata.busy:
+            self._schedule_metadata_poll()
+
+    def _count_preview_targets(self):
+        self._preview_count_after = None
+        preview = self._preview
+        if preview is None:
+            return
+        snapshot = list(self.model.paths)
+        worker = threading.Thread(target=preview.count_targets, args=(snapshot,), daemon=True)
+        worker.start()
+
+        def check():
+            if worker.is_alive():
+                self.after(100, check)
+            elif preview is self._preview and preview.target_counts is not None:
+                self.refresh()
+        self.after(100, check)
+
+    # --- Rendering ---
+
+    def refresh(self):
+        # Coalesce redraws so a burst of add_file calls costs a single repaint
+        if not self._redraw_pending:
+            self._redraw_pending = True
+            self.after_idle(self._redraw)
+
+    def _visible_height(self):
+        return max(self._canvas.winfo_height(), 1)
+
+    def _max_offset(self):
+        return max(len(self.model) * self.row_height - self._visible_height(), 0)
+
+    def _redraw(self):
+        self._redraw_pending = False
+        started = time.perf_counter() if STATS.enabled else None
+        height = self._visible_height()
+        width = self._canvas.winfo_width()
+        self._offset = min(max(self._offset, 0), self._max_offset())
+
+        needed = height // self.row_height + 2
+        while len(self._rows) < needed:
+            rect = self._canvas.create_rectangle(0, 0, 0, 0, width=0, fill="")
+            text = self._canvas.create_text(8, 0, anchor="w", fill="white", font=self._font)
+            preview_rect = self._canvas.create_rectangle(0, 0, 0, 0, width=0, fill=BLACK, state="hidden")
+            preview_text = self._canvas.create_text(0, 0, anchor="w", fill=GOLD, font=self._font, state="hidden")
+            thumbnail = self._canvas.create_image(8, 0, anchor="w", state="hidden")
+            self._rows.append((rect, text, preview_rect, preview_text, thumbnail))
+            self._slot_state.append(False)
+
+        preview = self._current_preview()
+        annotate = self._annotate
+        split = width // 2
+        first = self._offset // self.row_height
+        y = first * self.row_height - self._offset
+        paths = self.model.paths
+        selected = self.selected
+        canvas = self._canvas
+        thumbs = self._thumbs
+        missing = []
+        text_x = 8 if thumbs is None else thumbs.size + 16
+        for slot, items in enumerate(self._rows):
+            rect, text, preview_rect, preview_text, thumbnail = items
+            index = first + slot
+            if index >= len(paths) or slot >= needed:
+                state = None
+            else:
+                top = y + slot * self.row_height
+                fill = self.drag_highlight_color if index in selected else ""
+                new_name = color = None
+                if preview is not None:
+                    new_name, status = preview.row(index)
+                    color = GOLD
+                    if status in (PREVIEW_UNCHANGED, PREVIEW_PENDING):
+                        color = MUTED_TEXT
+                    elif status == PREVIEW_COLLISION:
+                        color = ERROR_TEXT
+                        fill = fill or ERROR_ROW
+                elif annotate is not None:
+                    note = annotate(paths[index])
+                    if note is not None:
+                        new_name, color = note
+                image = None
+                if thumbs is not None:
+                    image = self._thumbnail_for(paths[index], missing)
+                state = (top, width, paths[index], fill, new_name, color, image)
+
+            # Only talk to Tk about rows whose content or position actually changed,
+            # so moving one row touches that row and the one it swapped with
+            if self._slot_state[slot] == state:
+                continue
+            self._slot_state[slot] = state
+            if state is None:
+                for item in items:
+                    canvas.itemconfigure(item, state="hidden")
+                continue
+
+            middle = top + self.row_height // 2
+            canvas.coords(rect, 0, top, width, top + self.row_height)
+            canvas.itemconfigure(rect, state="normal", fill=fill)
+            canvas.coords(text, text_x, middle)
+            canvas.itemconfigure(text, state="normal", text=os.path.basename(paths[index]))
+            if image is None:
+                canvas.itemconfigure(thumbnail, state="hidden")
+            else:
+                canvas.coords(thumbnail, 8, middle)
+                canvas.itemconfigure(thumbnail, state="normal", image=image)
+            if new_name is None:
+                canvas.itemconfigure(preview_rect, state="hidden")
+                canvas.itemconfigure(preview_text, state="hidden")
+            else:
+                # The preview background also hides long names running into the preview column
+                canvas.coords(preview_rect, split, top, width, top + self.row_height)
+                canvas.itemconfigure(preview_rect, state="normal", fill=fill or BLACK)
+                canvas.coords(preview_text, split + 8, middle)
+                label = new_name if preview is None else "\u2192 " + new_name
+                canvas.itemconfigure(preview_text, state="normal", text=label, fill=color)
+
+        if missing:
+            # Only the rows on screen are asked for; rows scrolled past are dropped
+            thumbs.want(missing)
+            self._schedule_thumbnail_poll()
+        if self.metadata is not None and (preview is not None or annotate is not None):
+            # Likewise for image headers the rows on screen are still waiting for
+            self.metadata.request_missed()
+            if self.metadata.busy:
+                self._schedule_metadata_poll()
+
+        total = len(paths) * self.row_height
+        if total <= height:
+            self._scrollbar.set(0.0, 1.0)
+        else:
+            self._scrollbar.set(self._offset / total, (self._offset + height) / total)
+        if started is not None:
+            STATS.add("list.redraw", time.perf_counter() - started)
+
+    def _scroll_to(self, offset):
+        self._offset = int(min(max(offset, 0), self._max_offset()))
+        self._redraw()
+
+    def _on_scrollbar(self, action, value, unit=None):
+        if action == "moveto":
+            self._scroll_to(float(value) * len(self.model) * self.row_height)
+        elif action == "scroll":
+            step = self._visible_height() if unit == "pages" else self.row_height
+            self._scroll_to(self._offset + int(value) * step)
+
+    def _on_mousewheel(self, event):
+        if event.num == 4:
+            steps = -1
+        elif event.num == 5:
+            steps = 1
+        elif sys.platform.startswith("win"):
+            steps = -int(event.delta / 120) or (-1 if event.delta > 0 else 1)
+        else:
+            steps = -event.delta
+        self._scroll_to(self._offset + steps * 3 * self.row_height)
+
+    def _index_at(self, y):
+        return int((y + self._offset) // self.row_height)
+
+    # --- Selection and internal reorder ---
+
+    def _on_click(self, event):
+        self._canvas.focus_set()
+        index = self._index_at(event.y)
+        if not 0 <= index < len(self.model):
+            self.select_none()
+            return
+
+        if event.state & 0x0001 and self._anchor_index is not None:  # Shift
+            low, high = sorted((self._anchor_index, index))
+            self.selected = set(range(low, high + 1))
+        elif event.state & 0x0004:  # Control
+            self.selected ^= {index}
+            self._anchor_index = index
+        else:
+            # Pressing inside a multi-selection keeps it, so the whole block can be dragged
+            if index not in self.selected:
+                self.selected = {index}
+            self._anchor_index = index
+            self.dragging = True
+            self._drag_moved = False
+            self.drag_source_index = index
+        self.refresh()
 
     def _on_drag_motion(self, event):
-        if not self.dragging or self.drag_source_item is None:
+        if not self.dragging or self.drag_source_index is None:
             return
 
-        y_root = self.winfo_pointery()
-        
-        # Check which item we are over
-        target_index = -1
-        for i, lbl in enumerate(self.labels):
-            lbl_y = lbl.winfo_rooty()
-            lbl_h = lbl.winfo_height()
-            # Add some buffer or just check strict bounds
-            if lbl_y <= y_root <= lbl_y + lbl_h:
-                target_index = i
-                break
-        
-        if target_index != -1 and target_index != self.drag_source_index:
-            # Swap logic
-            # Move element in lists
-            item = self.labels.pop(self.drag_source_index)
-            path = self.file_paths.pop(self.drag_source_index)
-            
-            self.labels.insert(target_index, item)
-            self.file_paths.insert(target_index, path)
-            
-            self.drag_source_index = target_index
-            
-            # Re-pack everything
-            for lbl in self.labels:
-                lbl.pack_forget()
-            for lbl in self.labels:
-                lbl.pack(fill="x", padx=5, pady=2)
+        # Scroll while the pointer is dragged past the top or bottom edge
+        if event.y < 0:
+            self._scroll_to(self._offset - self.row_height)
+        elif event.y > self._visible_height():
+            self._scroll_to(self._offset + self.row_height)
+
+        target_index = min(max(self._index_at(event.y), 0), len(self.model) - 1)
+        if target_index == self.drag_source_index:
+            return
+
+        # Move the selection as one block so the grabbed row ends up under the pointer
+        block = sorted(self.selected)
+        grabbed = block.index(self.drag_source_index)
+        start = min(max(target_index - grabbed, 0), len(self.model) - len(block))
+        moved = self.model.move_block(block, start)
+        self.selected = set(moved)
+        self.drag_source_index = moved.start + grabbed
+        self._anchor_index = self.drag_source_index
+        self._drag_moved = True
+        self._last_sort = None
+        self.refresh()
 
     def _on_drag_stop(self, event):
+        if self.dragging and not self._drag_moved and len(self.selected) > 1:
+            # A plain click inside a multi-selection (no drag) selects just that row
+            self.selected = {self.drag_source_index}
         self.dragging = False
-        if self.drag_source_item:
-            self.drag_source_item.configure(fg_color="transparent")
-        self.drag_source = None
-        self.drag_source_item = None
+        self.drag_source_index = None
+        self.refresh()
+
+    def select_all(self, event=None):
+        self.selected = set(range(len(self.model)))
+        self.refresh()
+        return "break"
 
-    def repack_items(self):
-        for lbl in self.labels:
-            lbl.pack_forget()
-        for lbl in self.labels:
-            lbl.pack(fill="x", padx=5, pady=2)
+    def select_none(self):
+        self.selected = set()
+        self._anchor_index = None
+        self.refresh()
+
+    def _move_selection(self, start):
+        if not self.selected:
+            return
+        moved = self.model.move_block(sorted(self.selected), start)
+        self.selected = set(moved)
+        self._anchor_index = moved.start
+        self._last_sort = None
+        self.refresh()
+
+    def move_selection_to_top(self, event=None):
+        self._move_selection(0)
+
+    def move_selection_to_bottom(self, event=None):
+        self._move_selection(len(self.model) - len(self.selected))
+
+    def _on_context_menu(self, event):
+        index = self._index_at(event.y)
+        if 0 <= index < len(self.model) and index not in self.selected:
+            self.selected = {index}
+            self._anchor_index = index
+            self.refresh()
+        if self.selected:
+            self._context_menu.tk_popup(event.x_root, event.y_root)
 
     def invert_order(self):
-        self.file_paths.reverse()
-        self.labels.reverse()
-        self.repack_items()
+        self.model.reverse()
+        last = len(self.model) - 1
+        self.selected = {last - i for i in self.selected}
+        self._anchor_index = None
+        self._last_sort = None
+        self.refresh()
+
+    # --- Sorting (on cached metadata, no disk access) ---
+
+    def sort_by(self, keys):
+        if not self.model: return
+        self.model.sort(keys)
+        self.selected = set()
+        self._anchor_index = None
+        self._last_sort = list(keys)
+        self.refresh()
+
+    def _sort_toggle(self, field):
+        # Clicking the same sort twice switches between ascending and descending
+        descending = self._last_sort == [(field, False)]
+        self.sort_by([(field, descending)])
 
     def sort_by_name(self):
-        if not self.file_paths: return
-        combined = list(zip(self.file_paths, self.labels))
-        combined.sort(key=lambda x: os.path.basename(x[0]).lower())
-        self.file_paths, self.labels = zip(*combined)
-        self.file_paths = list(self.file_paths)
-        self.labels = list(self.labels)
-        self.repack_items()
+        self._sort_toggle("name")
 
     def sort_by_date(self):
-        if not self.file_paths: return
-        combined = list(zip(self.file_paths, self.labels))
-        # Sort by modification time, handling potential missing files
-        combined.sort(key=lambda x: os.path.getmtime(x[0]) if os.path.exists(x[0]) else 0)
-        self.file_paths, self.labels = zip(*combined)
-        self.file_paths = list(self.file_paths)
-        self.labels = list(self.labels)
-        self.repack_items()
+        self._sort_toggle("mtime")
+
+    def sort_by_size(self):
+        self._sort_toggle("size")
+
+    def sort_by_extension(self):
+        self._sort_toggle("ext")
+
+    def refresh_metadata(self):
+        # Re-stat every file on a worker thread and swap the result in when done
+        paths = list(self.model.paths)
+        version = self.model.version
+        result = {}
+        worker = threading.Thread(target=lambda: result.update(collect_info(paths)), daemon=True)
+        worker.start()
+
+        def check():
+            if worker.is_alive():
+                self.after(100, check)
+            elif self.model.version == version:
+                self.model.update_info(result)
+                self.refresh()
+        self.after(100, check)
+
+    def ask_sort(self):
+        win = ctk.CTkToplevel(self.winfo_toplevel())
+        win.title("Sort files")
+        win.resizable(False, False)
+
+        container = ctk.CTkFrame(win, fg_color="transparent")
+        container.pack(fill="both", expand=True, padx=20, pady=20)
+
+        ctk.CTkLabel(container, text="Sort by", text_color=GOLD).grid(row=0, column=0, columnspan=2, pady=(0, 10))
+
+        rows = []
+        for i in range(3):
+            field_var = ctk.StringVar(value="Name" if i == 0 else "(none)")
+            values = list(SORT_FIELD_LABELS) if i == 0 else ["(none)"] + list(SORT_FIELD_LABELS)
+            ctk.CTkOptionMenu(container, variable=field_var, values=values,
+                              fg_color=GOLD, button_color=DARK_GOLD, button_hover_color=GOLD, text_color=BLACK,
+                              dropdown_fg_color=DARK_GRAY, dropdown_text_color=GOLD).grid(row=i + 1, column=0, padx=5, pady=5)
+            descending_var = ctk.BooleanVar(value=False)
+            ctk.CTkCheckBox(container, text="Descending", variable=descending_var,
+                            fg_color=GOLD, checkmark_color=BLACK, hover_color=DARK_GOLD,
+                            text_color=GOLD).grid(row=i + 1, column=1, padx=5, pady=5)
+            rows.append((field_var, descending_var))
+
+        def apply():
+            keys = [(SORT_FIELD_LABELS[field_var.get()], descending_var.get())
+                    for field_var, descending_var in rows if field_var.get() in SORT_FIELD_LABELS]
+            win.destroy()
+            self.sort_by(keys)
+
+        def refresh():
+            win.destroy()
+            self.refresh_metadata()
+
+        ctk.CTkButton(container, text="Sort", command=apply,
+                      fg_color=GOLD, text_color=BLACK, hover_color=DARK_GOLD).grid(row=4, column=0, columnspan=2, sticky="ew", pady=(15, 5))
+        ctk.CTkButton(container, text="Refresh metadata", command=refresh,
+                      fg_color=DARK_GRAY, border_color=GOLD, border_width=2,
+                      text_color=GOLD, hover_color="#333333").grid(row=5, column=0, columnspan=2, sticky="ew", pady=5)
+
+        try:
+            win.transient(self.winfo_toplevel())
+            win.grab_set()
+        except Exception:
+            pass
+
+class StartupProfile:
+    # Wall-clock time per start-up phase, printed with --startup-profile
+    def __init__(self, started_at):
+        self.started_at = started_at
+        self._last = started_at
+        self.phases = []
+
+    def mark(self, phase):
+        now = time.perf_counter()
+        self.phases.append((phase, now - self._last))
+        self._last = now
+
+    def report(self):
+        lines = ["Startup profile:"]
+        for phase, seconds in self.phases:
+            lines.append(f"  {phase:<20} {seconds * 1000:8.1f} ms")
+        lines.append(f"  {'total':<20} {(self._last - self.started_at) * 1000:8.1f} ms")
+        return "\n".join(lines)
+
+def _resource_path(name):
+    # Next to this file, or in the PyInstaller bundle
+    bundle_dir = getattr(sys, "_MEIPASS", None)
+    if bundle_dir and os.path.exists(os.path.join(bundle_dir, name)):
+        return os.path.join(bundle_dir, name)
+    return os.path.join(os.path.dirname(os.path.abspath(__file__)), name)
 
 class App(ctk.CTk, TkinterDnD.DnDWrapper):
-    def __init__(self):
+    def __init__(self, startup_profile=None, stats=False):
+        self.startup_profile = startup_profile
+        STATS.enabled = stats
+        self._mark("imports")
+
         super().__init__()
         self.TkdndVersion = TkinterDnD._require(self)
 
         self.title("Organizer - Gold Edition")
         self.geometry("900x700")
         self.configure(fg_color=BLACK)
+        self._mark("window")
 
-        icon_path = os.path.join(os.path.dirname(__file__), "icon.ico")
-        if getattr(sys, "_MEIPASS", None):
-            bundled_icon_path = os.path.join(sys._MEIPASS, "icon.ico")
-            if os.path.exists(bundled_icon_path):
-                icon_path = bundled_icon_path
-
-        if os.path.exists(icon_path):
-            try:
-                self.iconbitmap(icon_path)
-            except Exception:
-                pass
+        self._set_window_icon()
+        self._mark("icon")
 
         # Main Layout
         self.grid_columnconfigure(0, weight=1)
@@ -338,7 +991,8 @@ class App(ctk.CTk, TkinterDnD.DnDWrapper):
                                       segmented_button_selected_hover_color=DARK_GOLD,
                                       segmented_button_unselected_color=DARK_GRAY,
                                       segmented_button_unselected_hover_color="#333333",
-                                      text_color=BLACK) # Text color on the selected button (Gold) needs to be black or contrasting. 
+                                      text_color=BLACK, # Text color on the selected button (Gold) needs to be black or contrasting. 
+                                      command=self._on_tab_change)
         # Actually CTk doesn't allow changing text color for selected vs unselected easily in constructor alone for some versions, 
         # but let's try setting text_color which applies to all. 
         # If the button is Gold, Black text is good. If button is Black, Black text is bad.
@@ -352,12 +1006,59 @@ class App(ctk.CTk, TkinterDnD.DnDWrapper):
         
         self.tabview.add("Renaming")
         self.tabview.add("Converting")
+        self.tabview.add("Duplicates")
+        self.tabview.add("Organizing")
+
+        # Tabs are filled in the first time they are shown, so only the visible one
+        # is built before the first paint
+        self._tab_builders = {
+            "Renaming": self.setup_renaming_tab,
+            "Converting": self.setup_converting_tab,
+            "Duplicates": self.setup_duplicates_tab,
+            "Organizing": self.setup_organizing_tab,
+        }
+        self._on_tab_change()
+
+        # Watched folders: "rename" / "convert" -> [FolderWatcher, files processed]
+        self._watchers = {}
 
-        # --- Tab 1: Renaming ---
-        self.setup_renaming_tab()
+        # A rename batch cut short by a crash or power loss is offered for resume/undo
+        self.after(500, self._check_interrupted_renames)
+
+        self._first_paint_done = False
+        if self.startup_profile is not None:
+            self.bind("<Map>", self._on_first_map, add="+")
+
+    def _mark(self, phase):
+        if self.startup_profile is not None:
+            self.startup_profile.mark(phase)
+
+    def _on_first_map(self, event):
+        if event.widget is not self or self._first_paint_done:
+            return
+        self._first_paint_done = True
+        self.update_idletasks()
+        self._mark("first paint")
+        print(self.startup_profile.report(), file=sys.stderr)
+
+    def _set_window_icon(self):
+        # Small pre-extracted icons: the full icon.ico (2.5 MB) is only used for the
+        # executable itself
+        try:
+            if sys.platform.startswith("win"):
+                self.iconbitmap(_resource_path("icon-small.ico"))
+            else:
+                self._icon_image = tk.PhotoImage(file=_resource_path("icon-64.png"))
+                self.iconphoto(True, self._icon_image)
+        except Exception:
+            pass
 
-        # --- Tab 2: Converting ---
-        self.setup_converting_tab()
+    def _on_tab_change(self):
+        name = self.tabview.get()
+        builder = self._tab_builders.pop(name, None)
+        if builder is not None:
+            builder()
+            self._mark(f"{name.lower()} tab")
 
     def setup_renaming_tab(self):
         tab = self.tabview.tab("Renaming")
@@ -376,14 +1077,7 @@ class App(ctk.CTk, TkinterDnD.DnDWrapper):
         self.rename_option_var = ctk.StringVar(value="Ordered renaming") # Set as default to test
         self.rename_option_menu = ctk.CTkOptionMenu(options_frame, 
                                                     variable=self.rename_option_var,
-                                                    values=[
-                                                        "After X characters", 
-                                                        "Before X characters", 
-                                                        "After expression", 
-                                                        "Before expression", 
-                                                        "Remove expression only",
-                                                        "Ordered renaming"
-                                                    ],
+                                                    values=RENAME_MODES,
                                                     command=self._on_rename_mode_change,
                                                     fg_color=GOLD,
                                                     button_color=DARK_GOLD,
@@ -396,8 +1090,6 @@ class App(ctk.CTk, TkinterDnD.DnDWrapper):
         # Trigger the mode change manually for the default value
         self.after(100, lambda: self._on_rename_mode_change("Ordered renaming"))
 
-        # Input Entry (for X or Expression)
-
         # Input Entry (for X or Expression)
         self.rename_input = ctk.CTkEntry(options_frame, placeholder_text="Value (X or Expression)", 
                                          border_color=GOLD, fg_color=BLACK, text_color=GOLD)
@@ -416,6 +1108,17 @@ class App(ctk.CTk, TkinterDnD.DnDWrapper):
                                               text_color=GOLD, hover_color="#333333")
         self.btn_clear_rename.pack(side="left", padx=5)
 
+        self.btn_undo_rename = ctk.CTkButton(btn_frame, text="Undo Last Rename", command=self.undo_last_rename,
+                                             fg_color=DARK_GRAY, border_color=GOLD, border_width=2,
+                                             text_color=GOLD, hover_color="#333333")
+        self.btn_undo_rename.pack(side="left", padx=5)
+
+        self.btn_watch_rename = ctk.CTkButton(btn_frame, text="Watch Folder...", width=110,
+                                              command=lambda: self.toggle_watch("rename"),
+                                              fg_color=DARK_GRAY, border_color=GOLD, border_width=2,
+                                              text_color=GOLD, hover_color="#333333")
+        self.btn_watch_rename.pack(side="left", padx=5)
+
         self.btn_run_rename = ctk.CTkButton(btn_frame, text="Apply Rename", command=self.run_rename,
                                             fg_color=GOLD, text_color=BLACK, hover_color=DARK_GOLD)
         self.btn_run_rename.pack(side="right", padx=5)
@@ -435,16 +1138,36 @@ class App(ctk.CTk, TkinterDnD.DnDWrapper):
                                               text_color=GOLD, hover_color="#333333")
         self.btn_invert_rename.pack(side="right", padx=5)
 
+        self.btn_sort_more_rename = ctk.CTkButton(btn_frame, text="Sort...", width=60,
+                                              fg_color=DARK_GRAY, border_color=GOLD, border_width=2, 
+                                              text_color=GOLD, hover_color="#333333")
+        self.btn_sort_more_rename.pack(side="right", padx=5)
+
+        self.btn_sessions_rename = ctk.CTkButton(btn_frame, text="Sessions...", width=80,
+                                                fg_color=DARK_GRAY, border_color=GOLD, border_width=2,
+                                                text_color=GOLD, hover_color="#333333")
+        self.btn_sessions_rename.pack(side="right", padx=5)
+
         # File List (Scrollable Frame imitating a list)
         self.rename_file_list_frame = SortableFileList(tab, fg_color=BLACK, border_color=GOLD, border_width=1)
         self.rename_file_list_frame.grid(row=2, column=0, padx=10, pady=10, sticky="nsew")
 
+        # Live preview of the new names, recomputed shortly after the last keystroke
+        self._rename_preview_after = None
+        self.rename_input.bind("<KeyRelease>", self._schedule_rename_preview)
+        self.rename_start_input.bind("<KeyRelease>", self._schedule_rename_preview)
+
         # Configure commands for sort buttons NOW that list frame exists
         self.btn_sort_date_rename.configure(command=self.rename_file_list_frame.sort_by_date)
         self.btn_sort_name_rename.configure(command=self.rename_file_list_frame.sort_by_name)
         self.btn_invert_rename.configure(command=self.rename_file_list_frame.invert_order)
+        self.btn_sort_more_rename.configure(command=self.rename_file_list_frame.ask_sort)
+        self.btn_sessions_rename.configure(command=self.rename_file_list_frame.ask_session)
 
     def setup_converting_tab(self):
+        # The conversion stack is only loaded once this tab is first opened
+        from organizer.converter import IMAGE_EXTENSIONS, TARGET_FORMATS, default_worker_count
+
         tab = self.tabview.tab("Converting")
         tab.grid_columnconfigure(0, weight=1)
         tab.grid_rowconfigure(2, weight=1)
@@ -458,7 +1181,7 @@ class App(ctk.CTk, TkinterDnD.DnDWrapper):
         self.convert_format_var = ctk.StringVar(value="png")
         self.convert_option_menu = ctk.CTkOptionMenu(options_frame,
                                                      variable=self.convert_format_var,
-                                                     values=["png", "jpg", "jpeg", "webp", "bmp", "ico", "tiff"],
+                                                     values=TARGET_FORMATS,
                                                      fg_color=GOLD,
                                                      button_color=DARK_GOLD,
                                                      button_hover_color=GOLD,
@@ -467,11 +1190,40 @@ class App(ctk.CTk, TkinterDnD.DnDWrapper):
                                                      dropdown_text_color=GOLD)
         self.convert_option_menu.pack(side="left", padx=5)
 
+        # Several outputs from one decode, e.g. "png webp@1024:80 ico"; overrides the menu when filled in
+        self.convert_targets_input = ctk.CTkEntry(options_frame, placeholder_text="or: png webp@1024:80 ico", width=170,
+                                                  border_color=GOLD, fg_color=BLACK, text_color=GOLD)
+        self.convert_targets_input.pack(side="left", padx=5)
+
         self.keep_old_files_var = ctk.BooleanVar(value=False)
         self.check_keep_files = ctk.CTkCheckBox(options_frame, text="Keep old files", variable=self.keep_old_files_var,
                                                 fg_color=GOLD, checkmark_color=BLACK, hover_color=DARK_GOLD, text_color=GOLD)
         self.check_keep_files.pack(side="left", padx=20)
 
+        ctk.CTkLabel(options_frame, text="Workers:", text_color=GOLD).pack(side="left", padx=5)
+        self.convert_workers_input = ctk.CTkEntry(options_frame, width=50, border_color=GOLD, fg_color=BLACK, text_color=GOLD)
+        self.convert_workers_input.insert(0, str(default_worker_count()))
+        self.convert_workers_input.pack(side="left", padx=5)
+
+        self.convert_incremental_var = ctk.BooleanVar(value=False)
+        self.check_incremental = ctk.CTkCheckBox(options_frame, text="Skip up-to-date", variable=self.convert_incremental_var,
+                                                 fg_color=GOLD, checkmark_color=BLACK, hover_color=DARK_GOLD, text_color=GOLD)
+        self.check_incremental.pack(side="left", padx=10)
+
+        self.convert_thumbnails_var = ctk.BooleanVar(value=False)
+        ctk.CTkCheckBox(options_frame, text="Thumbnails", variable=self.convert_thumbnails_var,
+                        command=lambda: self.convert_file_list_frame.set_thumbnails(self.convert_thumbnails_var.get()),
+                        fg_color=GOLD, checkmark_color=BLACK, hover_color=DARK_GOLD,
+                        text_color=GOLD).pack(side="left", padx=10)
+
+        # Optional limits for very large images; empty means no limit
+        self.convert_max_size_input = ctk.CTkEntry(options_frame, placeholder_text="Max px", width=70,
+                                                   border_color=GOLD, fg_color=BLACK, text_color=GOLD)
+        self.convert_max_size_input.pack(side="left", padx=5)
+        self.convert_memory_input = ctk.CTkEntry(options_frame, placeholder_text="Mem MB", width=70,
+                                                 border_color=GOLD, fg_color=BLACK, text_color=GOLD)
+        self.convert_memory_input.pack(side="left", padx=5)
+
         # Buttons Frame
         btn_frame = ctk.CTkFrame(tab, fg_color="transparent")
         btn_frame.grid(row=1, column=0, padx=10, pady=5, sticky="ew")
@@ -485,6 +1237,12 @@ class App(ctk.CTk, TkinterDnD.DnDWrapper):
                                                text_color=GOLD, hover_color="#333333")
         self.btn_clear_convert.pack(side="left", padx=5)
 
+        self.btn_watch_convert = ctk.CTkButton(btn_frame, text="Watch Folder...", width=110,
+                                               command=lambda: self.toggle_watch("convert"),
+                                               fg_color=DARK_GRAY, border_color=GOLD, border_width=2,
+                                               text_color=GOLD, hover_color="#333333")
+        self.btn_watch_convert.pack(side="left", padx=5)
+
         self.btn_run_convert = ctk.CTkButton(btn_frame, text="Convert All", command=self.run_convert,
                                              fg_color=GOLD, text_color=BLACK, hover_color=DARK_GOLD)
         self.btn_run_convert.pack(side="right", padx=5)
@@ -504,23 +1262,212 @@ class App(ctk.CTk, TkinterDnD.DnDWrapper):
                                               text_color=GOLD, hover_color="#333333")
         self.btn_invert_convert.pack(side="right", padx=5)
 
+        self.btn_sort_more_convert = ctk.CTkButton(btn_frame, text="Sort...", width=60,
+                                              fg_color=DARK_GRAY, border_color=GOLD, border_width=2, 
+                                              text_color=GOLD, hover_color="#333333")
+        self.btn_sort_more_convert.pack(side="right", padx=5)
+
+        self.btn_sessions_convert = ctk.CTkButton(btn_frame, text="Sessions...", width=80,
+                                                fg_color=DARK_GRAY, border_color=GOLD, border_width=2,
+                                                text_color=GOLD, hover_color="#333333")
+        self.btn_sessions_convert.pack(side="right", padx=5)
+
         # File List
-        self.convert_file_list_frame = SortableFileList(tab, allowed_extensions=[".jpg", ".jpeg", ".png", ".webp", ".bmp", ".ico", ".tiff", ".gif"], fg_color=BLACK, border_color=GOLD, border_width=1)
+        self.convert_file_list_frame = SortableFileList(tab, allowed_extensions=IMAGE_EXTENSIONS, fg_color=BLACK, border_color=GOLD, border_width=1)
         self.convert_file_list_frame.grid(row=2, column=0, padx=10, pady=10, sticky="nsew")
 
+        # Progress (shown while a conversion is running)
+        self.convert_progress_frame = ctk.CTkFrame(tab, fg_color="transparent")
+        self.convert_progress_bar = ctk.CTkProgressBar(self.convert_progress_frame, progress_color=GOLD)
+        self.convert_progress_bar.pack(side="left", padx=5, fill="x", expand=True)
+        self.convert_progress_label = ctk.CTkLabel(self.convert_progress_frame, text="", text_color=GOLD)
+        self.convert_progress_label.pack(side="left", padx=10)
+        self.btn_cancel_convert = ctk.CTkButton(self.convert_progress_frame, text="Cancel", width=70, command=self.cancel_convert,
+                                                fg_color=DARK_GRAY, border_color=GOLD, border_width=2,
+                                                text_color=GOLD, hover_color="#333333")
+        self.btn_cancel_convert.pack(side="right", padx=5)
+        self.convert_job = None
+        self._convert_job_watched = False
+
         # Configure commands for sort buttons NOW that list frame exists
         self.btn_sort_date_convert.configure(command=self.convert_file_list_frame.sort_by_date)
         self.btn_sort_name_convert.configure(command=self.convert_file_list_frame.sort_by_name)
         self.btn_invert_convert.configure(command=self.convert_file_list_frame.invert_order)
+        self.btn_sort_more_convert.configure(command=self.convert_file_list_frame.ask_sort)
+        self.btn_sessions_convert.configure(command=self.convert_file_list_frame.ask_session)
+
+    def setup_duplicates_tab(self):
+        from organizer.similar import HASH_ALGORITHMS
+
+        tab = self.tabview.tab("Duplicates")
+        tab.grid_columnconfigure(0, weight=1)
+        tab.grid_rowconfigure(2, weight=1)
+
+        # Summary of the last search
+        options_frame = ctk.CTkFrame(tab, fg_color="transparent")
+        options_frame.grid(row=0, column=0, padx=10, pady=10, sticky="ew")
+
+        self.duplicates_mode_var = ctk.StringVar(value="Identical files")
+        self.duplicates_mode_menu = ctk.CTkOptionMenu(options_frame, variable=self.duplicates_mode_var,
+                                                      values=["Identical files", "Similar images"],
+                                                      command=self._on_duplicates_mode_change,
+                                                      fg_color=GOLD, button_color=DARK_GOLD, button_hover_color=GOLD,
+                                                      text_color=BLACK, dropdown_fg_color=DARK_GRAY,
+                                                      dropdown_text_color=GOLD)
+        self.duplicates_mode_menu.pack(side="left", padx=5)
+
+        # Similar-image options, shown only in that mode
+        self.similar_options = ctk.CTkFrame(options_frame, fg_color="transparent")
+        self.similar_algorithm_var = ctk.StringVar(value="dhash")
+        ctk.CTkOptionMenu(self.similar_options, variable=self.similar_algorithm_var, values=list(HASH_ALGORITHMS),
+                          width=90, fg_color=GOLD, button_color=DARK_GOLD, button_hover_color=GOLD,
+                          text_color=BLACK, dropdown_fg_color=DARK_GRAY,
+                          dropdown_text_color=GOLD).pack(side="left", padx=5)
+        ctk.CTkLabel(self.similar_options, text="Max distance:", text_color=GOLD).pack(side="left", padx=5)
+        self.similar_distance_input = ctk.CTkEntry(self.similar_options, width=40, border_color=GOLD,
+                                                   fg_color=BLACK, text_color=GOLD)
+        self.similar_distance_input.insert(0, "6")
+        self.similar_distance_input.pack(side="left", padx=5)
+
+        self.duplicates_summary = ctk.CTkLabel(options_frame, text="Add files or folders, then Find Duplicates.",
+                                               text_color=GOLD, anchor="w")
+        self.duplicates_summary.pack(side="left", padx=5, fill="x", expand=True)
+
+        # Buttons Frame
+        btn_frame = ctk.CTkFrame(tab, fg_color="transparent")
+        btn_frame.grid(row=1, column=0, padx=10, pady=5, sticky="ew")
+
+        self.btn_add_duplicates = ctk.CTkButton(btn_frame, text="Add Files", command=self.add_files_duplicates,
+                                                fg_color=GOLD, text_color=BLACK, hover_color=DARK_GOLD)
+        self.btn_add_duplicates.pack(side="left", padx=5)
+
+        self.btn_clear_duplicates = ctk.CTkButton(btn_frame, text="Clear List", command=self.clear_list_duplicates,
+                                                  fg_color=DARK_GRAY, border_color=GOLD, border_width=2,
+                                                  text_color=GOLD, hover_color="#333333")
+        self.btn_clear_duplicates.pack(side="left", padx=5)
+
+        self.btn_run_duplicates = ctk.CTkButton(btn_frame, text="Find Duplicates", command=self.run_find_duplicates,
+                                                fg_color=GOLD, text_color=BLACK, hover_color=DARK_GOLD)
+        self.btn_run_duplicates.pack(side="right", padx=5)
+
+        self.btn_rename_duplicates = ctk.CTkButton(btn_frame, text="Send to Renaming", width=120,
+                                                   command=self.send_duplicates_to_renaming,
+                                                   fg_color=DARK_GRAY, border_color=GOLD, border_width=2,
+                                                   text_color=GOLD, hover_color="#333333")
+        self.btn_rename_duplicates.pack(side="right", padx=5)
+
+        self.btn_delete_duplicates = ctk.CTkButton(btn_frame, text="Delete Selected", width=110,
+                                                   command=self.delete_selected_duplicates,
+                                                   fg_color=DARK_GRAY, border_color=GOLD, border_width=2,
+                                                   text_color=GOLD, hover_color="#333333")
+        self.btn_delete_duplicates.pack(side="right", padx=5)
+
+        self.btn_select_extras = ctk.CTkButton(btn_frame, text="Select Extras", width=100,
+                                               command=self.select_duplicate_extras,
+                                               fg_color=DARK_GRAY, border_color=GOLD, border_width=2,
+                                               text_color=GOLD, hover_color="#333333")
+        self.btn_select_extras.pack(side="right", padx=5)
+
+        # File List
+        self.duplicates_file_list_frame = SortableFileList(tab, fg_color=BLACK, border_color=GOLD, border_width=1)
+        self.duplicates_file_list_frame.grid(row=2, column=0, padx=10, pady=10, sticky="nsew")
+
+        # Progress (shown while a search is running)
+        self.duplicates_progress_frame = ctk.CTkFrame(tab, fg_color="transparent")
+        self.duplicates_progress_bar = ctk.CTkProgressBar(self.duplicates_progress_frame, progress_color=GOLD)
+        self.duplicates_progress_bar.pack(side="left", padx=5, fill="x", expand=True)
+        self.duplicates_progress_label = ctk.CTkLabel(self.duplicates_progress_frame, text="", text_color=GOLD)
+        self.duplicates_progress_label.pack(side="left", padx=10)
+        self.btn_cancel_duplicates = ctk.CTkButton(self.duplicates_progress_frame, text="Cancel", width=70,
+                                                   command=self.cancel_find_duplicates,
+                                                   fg_color=DARK_GRAY, border_color=GOLD, border_width=2,
+                                                   text_color=GOLD, hover_color="#333333")
+        self.btn_cancel_duplicates.pack(side="right", padx=5)
+        self.duplicate_search = None
+        self._duplicate_group_of = {}  # path -> group number, from the last search
+        self._duplicate_keepers = (None, set(), set())  # (model version, first file of each set, their sets)
+
+    def setup_organizing_tab(self):
+        from organizer.organize import TEMPLATE_PRESETS
+
+        tab = self.tabview.tab("Organizing")
+        tab.grid_columnconfigure(0, weight=1)
+        tab.grid_rowconfigure(2, weight=1)
+
+        # Options Frame: a preset or custom folder template, and where dates come from
+        options_frame = ctk.CTkFrame(tab, fg_color="transparent")
+        options_frame.grid(row=0, column=0, padx=10, pady=10, sticky="ew")
+
+        self.organize_preset_var = ctk.StringVar(value="By type")
+        ctk.CTkOptionMenu(options_frame, variable=self.organize_preset_var,
+                          values=list(TEMPLATE_PRESETS) + ["Custom"], command=self._on_organize_preset_change,
+                          fg_color=GOLD, button_color=DARK_GOLD, button_hover_color=GOLD, text_color=BLACK,
+                          dropdown_fg_color=DARK_GRAY, dropdown_text_color=GOLD).pack(side="left", padx=5)
+
+        # One or more rules separated by ";", e.g. "jpg,png: Photos/{year}; {category}"
+        self.organize_template_input = ctk.CTkEntry(options_frame, placeholder_text="Folders, e.g. {category}/{year}",
+                                                    border_color=GOLD, fg_color=BLACK, text_color=GOLD)
+        self.organize_template_input.insert(0, TEMPLATE_PRESETS["By type"])
+        self.organize_template_input.pack(side="left", padx=5, fill="x", expand=True)
+
+        self.organize_date_var = ctk.StringVar(value="File date")
+        ctk.CTkOptionMenu(options_frame, variable=self.organize_date_var, values=list(ORGANIZE_DATE_SOURCES),
+                          command=lambda choice: self._schedule_organize_preview(),
+                          fg_color=GOLD, button_color=DARK_GOLD, button_hover_color=GOLD, text_color=BLACK,
+                          dropdown_fg_color=DARK_GRAY, dropdown_text_color=GOLD).pack(side="left", padx=5)
+
+        # Buttons Frame, with the destination root (empty: next to each file)
+        btn_frame = ctk.CTkFrame(tab, fg_color="transparent")
+        btn_frame.grid(row=1, column=0, padx=10, pady=5, sticky="ew")
+
+        self.btn_add_organize = ctk.CTkButton(btn_frame, text="Add Files", command=self.add_files_organize,
+                                              fg_color=GOLD, text_color=BLACK, hover_color=DARK_GOLD)
+        self.btn_add_organize.pack(side="left", padx=5)
+
+        self.btn_clear_organize = ctk.CTkButton(btn_frame, text="Clear List", command=self.clear_list_organize,
+                                                fg_color=DARK_GRAY, border_color=GOLD, border_width=2,
+                                                text_color=GOLD, hover_color="#333333")
+        self.btn_clear_organize.pack(side="left", padx=5)
+
+        self.organize_dest_input = ctk.CTkEntry(btn_frame, placeholder_text="Destination (empty: each file's folder)",
+                                                border_color=GOLD, fg_color=BLACK, text_color=GOLD)
+        self.organize_dest_input.pack(side="left", padx=5, fill="x", expand=True)
+
+        ctk.CTkButton(btn_frame, text="Browse...", width=80, command=self.browse_organize_destination,
+                      fg_color=DARK_GRAY, border_color=GOLD, border_width=2,
+                      text_color=GOLD, hover_color="#333333").pack(side="left", padx=5)
+
+        self.btn_run_organize = ctk.CTkButton(btn_frame, text="Organize", command=self.run_organize,
+                                              fg_color=GOLD, text_color=BLACK, hover_color=DARK_GOLD)
+        self.btn_run_organize.pack(side="right", padx=5)
+
+        ctk.CTkButton(btn_frame, text="Undo", width=60, command=self.undo_last_rename,
+                      fg_color=DARK_GRAY, border_color=GOLD, border_width=2,
+                      text_color=GOLD, hover_color="#333333").pack(side="right", padx=5)
+
+        # File List
+        self.organize_file_list_frame = SortableFileList(tab, fg_color=BLACK, border_color=GOLD, border_width=1)
+        self.organize_file_list_frame.grid(row=2, column=0, padx=10, pady=10, sticky="nsew")
+
+        # Preview of each file's new folder, for the rows on screen only
+        self._organize_namer = None
+        self._organize_preview_after = None
+        self.organize_template_input.bind("<KeyRelease>", self._on_organize_template_edit)
+        self.organize_dest_input.bind("<KeyRelease>", self._schedule_organize_preview)
+        self._update_organize_preview()
 
     # --- Logic: Renaming ---
 
     def _on_rename_mode_change(self, choice):
-        if choice == "Ordered renaming":
+        if choice in COUNTER_MODES:
             self.rename_input.pack_forget()
             self.rename_start_input.pack(side="left", padx=5)
             self.rename_input.pack(side="left", padx=5, fill="x", expand=True)
-            self.rename_input.configure(placeholder_text="Pattern (e.g. File-@@@@@)")
+            if choice == "Template":
+                self.rename_input.configure(
+                    placeholder_text="Template (e.g. {exif_date:%Y%m%d|mtime}_{camera|unknown}_{@@@@})")
+            else:
+                self.rename_input.configure(placeholder_text="Pattern (e.g. File-@@@@@)")
             if not self.rename_input.get():
                 self.rename_input.insert(0, "@@@@@")
             if not self.rename_start_input.get():
@@ -530,11 +1477,31 @@ class App(ctk.CTk, TkinterDnD.DnDWrapper):
             self.rename_input.configure(placeholder_text="Value (X or Expression)")
             # Clear default pattern if present to avoid confusion? 
             # Or leave it. Let's leave it, user might switch back.
+        self._schedule_rename_preview()
+
+    def _schedule_rename_preview(self, event=None):
+        if self._rename_preview_after is not None:
+            self.after_cancel(self._rename_preview_after)
+        self._rename_preview_after = self.after(150, self._update_rename_preview)
+
+    def _update_rename_preview(self):
+        self._rename_preview_after = None
+        mode = self.rename_option_var.get()
+        value = self.rename_input.get()
+        spec = None
+        if value:
+            try:
+                start = parse_start_number(self.rename_start_input.get()) if mode in COUNTER_MODES else 1
+                # Validate up front so a half-typed value just hides the preview
+                RenamePreview([], mode, value, start)
+                spec = (mode, value, start)
+            except ValueError:
+                spec = None
+        self.rename_file_list_frame.set_preview(spec)
 
     def add_files_rename(self):
         files = filedialog.askopenfilenames(title="Select files to rename")
-        for f in files:
-            self.rename_file_list_frame.add_file(f)
+        self.rename_file_list_frame.add_files(files)
 
     def clear_list_rename(self):
         self.rename_file_list_frame.clear()
@@ -544,170 +1511,727 @@ class App(ctk.CTk, TkinterDnD.DnDWrapper):
         if not rename_files:
             messagebox.showwarning("Warning", "No files selected.")
             return
-        
+        if self.rename_file_list_frame.is_scanning():
+            messagebox.showwarning("Warning", "Wait for the folder scan to finish.")
+            return
+
+        settings = self._rename_settings()
+        if settings is None:
+            return
+        file_list = self.rename_file_list_frame
+        try:
+            plan = plan_renames(rename_files, *settings, metadata=file_list.metadata, info=file_list.model.info)
+        except ValueError as e:
+            messagebox.showerror("Error", str(e))
+            return
+
+        try:
+            count = apply_plan(plan, RenameJournal.create())
+            messagebox.showinfo("Success", f"Renamed {count} files.")
+            self.clear_list_rename()
+
+        except Exception as e:
+            messagebox.showerror("Error", f"An error occurred: {e}")
+        self._show_stats("Rename timings")
+
+    def _rename_settings(self):
+        # (mode, value, start) from the option widgets, or None after reporting a problem
         mode = self.rename_option_var.get()
         value = self.rename_input.get()
-
         if not value:
             messagebox.showerror("Error", "Please provide a value (X characters or Expression).")
+            return None
+        try:
+            start = parse_start_number(self.rename_start_input.get()) if mode in COUNTER_MODES else 1
+            # Validates the expression too
+            name_function(mode, value, start)
+        except ValueError as e:
+            messagebox.showerror("Error", str(e))
+            return None
+        return mode, value, start
+
+    def _rename_watched(self, paths):
+        # A batch of files that arrived in the watched folder, renamed with the
+        # current options; ordered and template renaming number on from the previous batch
+        mode = self.rename_option_var.get()
+        value = self.rename_input.get()
+        try:
+            start = parse_start_number(self.rename_start_input.get()) if mode in COUNTER_MODES else 1
+            plan = plan_renames(paths, mode, value, start, metadata=self.rename_file_list_frame.metadata)
+            apply_plan(plan, RenameJournal.create())
+        except (ValueError, OSError) as e:
+            self._stop_watch("rename", str(e))
             return
+        if mode in COUNTER_MODES:
+            self.rename_start_input.delete(0, "end")
+            self.rename_start_input.insert(0, str(start + len(paths)))
+        self._watch_processed("rename", len(plan))
+
+    def undo_last_rename(self):
+        path = last_undoable_journal()
+        if path is None:
+            messagebox.showinfo("Undo", "There is no rename or move to undo.")
+            return
+        summary = journal_summary(path)
+        files = summary.files
+        where = "in their old folders" if summary.kind == "move" else "under their old names"
+        if not messagebox.askyesno("Undo", f"Put the {files} files of the last {summary.kind} back {where}?"):
+            return
+        try:
+            failed = undo_journal(path)
+        except Exception as e:
+            messagebox.showerror("Error", f"An error occurred: {e}")
+            return
+        self.clear_list_rename()
+        if failed:
+            messagebox.showwarning("Undo", f"{failed} files could not be put back (moved or renamed since).")
+        else:
+            messagebox.showinfo("Undo", f"Restored {files} files.")
 
-        count = 0
+    def _check_interrupted_renames(self):
         try:
-            for file_path in rename_files:
-                directory = os.path.dirname(file_path)
-                filename = os.path.basename(file_path)
-                name, ext = os.path.splitext(filename)
-                
-                new_name = name # Default
-
-                if mode == "After X characters":
-                    # Remove everything AFTER the Xth character (Keep first X)
-                    try:
-                        x = int(value)
-                        new_name = name[:x]
-                    except ValueError:
-                        messagebox.showerror("Error", "Value must be an integer for 'X characters'.")
-                        return
-
-                elif mode == "Before X characters":
-                    # Remove everything BEFORE the Xth character (Keep from X to end)
-                    try:
-                        x = int(value)
-                        new_name = name[x:]
-                    except ValueError:
-                        messagebox.showerror("Error", "Value must be an integer for 'X characters'.")
-                        return
-
-                elif mode == "After expression":
-                    # Remove everything after the expression
-                    if value in name:
-                        idx = name.find(value)
-                        # Keep part before expression and the expression itself?
-                        # Usually "Remove after X" means X is the boundary.
-                        # I will assume we keep the expression.
-                        new_name = name[:idx+len(value)] 
-
-                elif mode == "Before expression":
-                    # Remove everything before the expression
-                    if value in name:
-                        idx = name.find(value)
-                        new_name = name[idx:] # Keep expression + suffix
-
-                elif mode == "Remove expression only":
-                    new_name = name.replace(value, "")
-
-                elif mode == "Ordered renaming":
-                    # value is Pattern
-                    pattern = value
-                    start_num_str = self.rename_start_input.get()
-                    try:
-                        start_num = int(start_num_str) if start_num_str else 1
-                    except ValueError:
-                         messagebox.showerror("Error", "Start Number must be an integer.")
-                         return
-
-                    current_num = start_num + (count) # count starts at 0 for first file in loop
-                    
-                    # Regex to find sequences of @
-                    # We replace each sequence with the formatted number
-                    # But the prompt says "The @ symbol ... means a number filled to that amount of zeros."
-                    # Implies we replace the @ block with the number padded to block length.
-                    
-                    def replace_match(match):
-                        length = len(match.group(0))
-                        return str(current_num).zfill(length)
-                    
-                    new_name = re.sub(r'@+', replace_match, pattern)
-
-                if new_name == name:
-                    continue
-
-                new_full_name = new_name + ext
-                new_path = os.path.join(directory, new_full_name)
-
-                # Handle collision
-                if os.path.exists(new_path):
-                    # Simple collision handling: append _1
-                    base_new = new_name
-                    c = 1
-                    while os.path.exists(os.path.join(directory, f"{base_new}_{c}{ext}")):
-                        c += 1
-                    new_path = os.path.join(directory, f"{base_new}_{c}{ext}")
-                
-                os.rename(file_path, new_path)
-                count += 1
-            
-            messagebox.showinfo("Success", f"Renamed {count} files.")
-            self.clear_list_rename()
+            paths = interrupted_journals()
+        except OSError:
+            return
+        for path in paths:
+            summary = journal_summary(path)
+            try:
+                undoing = load_journal(path).undoing
+            except OSError:
+                continue
+            if undoing:
+                # Cut short while being undone: the only way to finish is to put the rest back
+                answer = messagebox.askokcancel(
+                    "Interrupted undo",
+                    f"Undoing a {summary.kind} of {summary.files} files did not finish.\n\n"
+                    "OK: finish putting the files back\nCancel: decide later") or None
+            else:
+                answer = messagebox.askyesnocancel(
+                    f"Interrupted {summary.kind}",
+                    f"A {summary.kind} of {summary.files} files did not finish.\n\n"
+                    "Yes: finish it\nNo: put the files back where they were\nCancel: decide later")
+            if answer is None:
+                continue
+            try:
+                if answer and not undoing:
+                    skipped = resume_journal(path).skipped
+                    if skipped:
+                        messagebox.showwarning(
+                            f"Interrupted {summary.kind}",
+                            f"{len(skipped)} files were left where they were: their new name was taken since.")
+                else:
+                    failed = undo_journal(path)
+                    if failed:
+                        messagebox.showwarning(
+                            "Undo", f"{failed} files could not be put back (moved or renamed since).")
+            except Exception as e:
+                messagebox.showerror("Error", f"An error occurred: {e}")
+
+    # --- Logic: Organizing ---
+
+    def _on_organize_preset_change(self, choice):
+        from organizer.organize import TEMPLATE_PRESETS
+
+        template = TEMPLATE_PRESETS.get(choice)
+        if template is not None:
+            self.organize_template_input.delete(0, "end")
+            self.organize_template_input.insert(0, template)
+        self._schedule_organize_preview()
+
+    def _on_organize_template_edit(self, event=None):
+        self.organize_preset_var.set("Custom")
+        self._schedule_organize_preview()
+
+    def _organize_rules(self):
+        # Raises ValueError for an empty or invalid template
+        from organizer.organize import parse_rule
+
+        rules = [parse_rule(text) for text in self.organize_template_input.get().split(";") if text.strip()]
+        if not rules:
+            raise ValueError("Enter a folder template, e.g. {category} or {year}/{month}.")
+        return rules
+
+    def _organize_destination(self):
+        dest = self.organize_dest_input.get().strip()
+        return os.path.abspath(os.path.expanduser(dest)) if dest else None
+
+    def _schedule_organize_preview(self, event=None):
+        if self._organize_preview_after is not None:
+            self.after_cancel(self._organize_preview_after)
+        self._organize_preview_after = self.after(150, self._update_organize_preview)
+
+    def _update_organize_preview(self):
+        from organizer.organize import FolderNamer
+
+        self._organize_preview_after = None
+        try:
+            self._organize_namer = FolderNamer(self._organize_rules(), self._organize_destination())
+        except ValueError:
+            # A half-typed template just hides the preview
+            self._organize_namer = None
+        file_list = self.organize_file_list_frame
+        file_list.set_annotations(self._annotate_organize if self._organize_namer is not None else None)
+
+    def _annotate_organize(self, path):
+        namer = self._organize_namer
+        directory, _, ext = split_path(path)
+        n = namer.rule_for(ext)
+        if n is None:
+            return "stays", MUTED_TEXT
+        timestamp = None
+        if namer.needs_date[n]:
+            file_list = self.organize_file_list_frame
+            if ORGANIZE_DATE_SOURCES[self.organize_date_var.get()] == "exif":
+                # Headers are read in the background (see SortableFileList._redraw), never here
+                if file_list.metadata is None:
+                    from organizer.metadata import MetadataCache
+
+                    file_list.metadata = MetadataCache()
+                fields = file_list.metadata.lookup(file_list.model.info, wait=False)(path)
+                if fields is None:
+                    return "\u2026", MUTED_TEXT
+                timestamp = fields.image.exif_date
+            if timestamp is None:
+                info = file_list.model.info.get(path)
+                timestamp = info.mtime if info is not None else None
+        folder = namer.folder(n, directory, ext, timestamp)
+        if folder == directory:
+            return "stays", MUTED_TEXT
+        if namer.destination is None:
+            folder = folder[len(directory):]
+        return "\u2192 " + folder, GOLD
+
+    def add_files_organize(self):
+        files = filedialog.askopenfilenames(title="Select files to organize")
+        self.organize_file_list_frame.add_files(files)
+
+    def clear_list_organize(self):
+        self.organize_file_list_frame.clear()
+
+    def browse_organize_destination(self):
+        folder = filedialog.askdirectory(title="Select the destination folder")
+        if folder:
+            self.organize_dest_input.delete(0, "end")
+            self.organize_dest_input.insert(0, folder)
+            self._schedule_organize_preview()
+
+    def run_organize(self):
+        from organizer.organize import apply_moves, plan_moves
+
+        file_list = self.organize_file_list_frame
+        files = file_list.get_files()
+        if not files:
+            messagebox.showwarning("Warning", "No files selected.")
+            return
+        if file_list.is_scanning():
+            messagebox.showwarning("Warning", "Wait for the folder scan to finish.")
+            return
+        try:
+            rules = self._organize_rules()
+        except ValueError as e:
+            messagebox.showerror("Error", str(e))
+            return
 
+        date_source = ORGANIZE_DATE_SOURCES[self.organize_date_var.get()]
+        plan = plan_moves(files, rules, self._organize_destination(), date_source, file_list.model.info,
+                          file_list.metadata)
+        if not plan:
+            messagebox.showinfo("Organize", "Every file is already in its folder.")
+            return
+        try:
+            count = apply_moves(plan, RenameJournal.create())
+            messagebox.showinfo("Success", f"Moved {count} files.")
+            self.clear_list_organize()
         except Exception as e:
             messagebox.showerror("Error", f"An error occurred: {e}")
+        self._show_stats("Organize timings")
+
+    # --- Logic: Watched folders ---
+
+    def toggle_watch(self, kind):
+        # Starts watching a folder for the Renaming ("rename") or Converting
+        # ("convert") tab, or stops the watch already running there
+        button = self.btn_watch_rename if kind == "rename" else self.btn_watch_convert
+        entry = self._watchers.pop(kind, None)
+        if entry is not None:
+            entry[0].stop()
+            button.configure(text="Watch Folder...")
+            return
+
+        if kind == "rename":
+            file_list = self.rename_file_list_frame
+            if self._rename_settings() is None:
+                return
+        else:
+            file_list = self.convert_file_list_frame
+            if self._convert_settings() is None:
+                return
+        try:
+            scan_filter = file_list.scan_filter()
+        except ValueError as e:
+            messagebox.showerror("Error", str(e))
+            return
+        folder = filedialog.askdirectory(title="Select the folder to watch")
+        if not folder:
+            return
+        mode = "folder_only"
+        if file_list._folder_has_subfolders(folder):
+            mode = file_list._ask_folder_drop_mode()
+            if not mode:
+                return
+        # Only files arriving from now on are processed
+        from organizer.watcher import FolderWatcher
+
+        self._watchers[kind] = [FolderWatcher([folder], mode, file_list.allowed_extensions,
+                                              scan_filter=scan_filter).start(), 0]
+        button.configure(text="Stop Watching")
+        self.after(200, lambda: self._poll_watch(kind))
+
+    def _watch_processed(self, kind, count):
+        entry = self._watchers.get(kind)
+        if entry is not None:
+            entry[1] += count
+            button = self.btn_watch_rename if kind == "rename" else self.btn_watch_convert
+            button.configure(text=f"Stop Watching ({entry[1]})")
+
+    def _stop_watch(self, kind, message):
+        entry = self._watchers.get(kind)
+        if entry is not None:
+            self.toggle_watch(kind)
+            messagebox.showerror("Error", f"Stopped watching {entry[0].folders[0]}: {message}")
+
+    def _poll_watch(self, kind):
+        entry = self._watchers.get(kind)
+        if entry is None:
+            return
+        watcher = entry[0]
+        if watcher.error:
+            self._stop_watch(kind, watcher.error)
+            return
+        if kind == "rename":
+            batch = watcher.get_batch(0)
+            if batch:
+                self._rename_watched(batch)
+        elif self.convert_job is None:
+            batch = watcher.get_batch(0)
+            if batch:
+                # Outputs land next to their sources; converting them again would never end
+                settings = self._convert_settings()
+                if settings is None:
+                    self._stop_watch(kind, "the conversion options are not valid.")
+                    return
+                outputs = {"." + target.format for target in settings["target_ext"]}
+                batch = [path for path in batch if os.path.splitext(path)[1].lower() not in outputs]
+                if batch:
+                    self._start_convert(batch, settings, watched=True)
+        self.after(200, lambda: self._poll_watch(kind))
 
     # --- Logic: Converting ---
 
     def add_files_convert(self):
+        from organizer.converter import IMAGE_EXTENSIONS
+
         files = filedialog.askopenfilenames(title="Select images to convert", 
-                                            filetypes=[("Images", "*.jpg *.jpeg *.png *.webp *.bmp *.ico *.tiff *.gif")])
-        for f in files:
-            self.convert_file_list_frame.add_file(f)
+                                            filetypes=[("Images", " ".join(f"*{ext}" for ext in IMAGE_EXTENSIONS))])
+        self.convert_file_list_frame.add_files(files)
 
     def clear_list_convert(self):
         self.convert_file_list_frame.clear()
 
     def run_convert(self):
+        if self.convert_job is not None:
+            return
+
         convert_files = self.convert_file_list_frame.get_files()
         if not convert_files:
             messagebox.showwarning("Warning", "No files selected.")
             return
+        if self.convert_file_list_frame.is_scanning():
+            messagebox.showwarning("Warning", "Wait for the folder scan to finish.")
+            return
 
-        target_ext = self.convert_format_var.get().lower()
-        keep_old = self.keep_old_files_var.get()
-        
-        # PIL format mapping
-        format_map = {
-            "jpg": "JPEG",
-            "jpeg": "JPEG",
-            "png": "PNG",
-            "webp": "WEBP",
-            "bmp": "BMP",
-            "ico": "ICO",
-            "tiff": "TIFF"
-        }
-        pil_format = format_map.get(target_ext, "PNG")
+        settings = self._convert_settings()
+        if settings is not None:
+            self._start_convert(convert_files, settings)
+
+    def _convert_settings(self):
+        # ConvertJob keyword arguments from the option widgets, or None after
+        # reporting an invalid one
+        from organizer.converter import default_worker_count, parse_targets
 
-        count = 0
         try:
-            for file_path in convert_files:
-                directory = os.path.dirname(file_path)
-                filename = os.path.basename(file_path)
-                name, _ = os.path.splitext(filename)
-                
-                new_filename = f"{name}.{target_ext}"
-                new_path = os.path.join(directory, new_filename)
-
-                try:
-                    with Image.open(file_path) as img:
-                        # Convert mode if necessary (e.g. RGBA to RGB for JPEG)
-                        if pil_format == "JPEG" and img.mode in ("RGBA", "P"):
-                            img = img.convert("RGB")
-                        
-                        img.save(new_path, format=pil_format)
-                        count += 1
-                    
-                    if not keep_old:
-                        os.remove(file_path)
-
-                except Exception as img_err:
-                    print(f"Failed to convert {filename}: {img_err}")
-                    # Continue to next file
-            
-            messagebox.showinfo("Success", f"Converted {count} images.")
-            self.clear_list_convert()
+            targets = parse_targets(self.convert_targets_input.get().strip() or self.convert_format_var.get())
+        except ValueError as e:
+            messagebox.showerror("Error", str(e))
+            return None
 
-        except Exception as e:
-            messagebox.showerror("Error", f"An error occurred: {e}")
+        workers_str = self.convert_workers_input.get()
+        try:
+            workers = int(workers_str) if workers_str else default_worker_count()
+            if workers < 1:
+                raise ValueError
+        except ValueError:
+            messagebox.showerror("Error", "Workers must be a positive integer.")
+            return
+
+        try:
+            max_dimension = _parse_optional_positive_int(self.convert_max_size_input.get())
+        except ValueError:
+            messagebox.showerror("Error", "Max size must be a positive number of pixels.")
+            return
+        try:
+            memory_mb = _parse_optional_positive_int(self.convert_memory_input.get())
+        except ValueError:
+            messagebox.showerror("Error", "Memory limit must be a positive number of MB.")
+            return
+        memory_limit = memory_mb * 1024 * 1024 if memory_mb else None
+        return {"target_ext": targets, "keep_old": self.keep_old_files_var.get(),
+                "workers": workers, "max_dimension": max_dimension, "memory_limit": memory_limit,
+                "incremental": self.convert_incremental_var.get()}
+
+    def _start_convert(self, files, settings, watched=False):
+        from organizer.converter import ConvertJob
+
+        self.convert_job = ConvertJob(files, **settings).start()
+        self._convert_job_watched = watched
+        self.btn_run_convert.configure(state="disabled")
+        self.btn_cancel_convert.configure(state="normal")
+        self.convert_progress_bar.set(0)
+        self.convert_progress_frame.grid(row=3, column=0, padx=10, pady=(0, 10), sticky="ew")
+        self.after(100, self._poll_convert)
+
+    def cancel_convert(self):
+        if self.convert_job is not None:
+            self.convert_job.cancel()
+            self.btn_cancel_convert.configure(state="disabled")
+
+    def _poll_convert(self):
+        job = self.convert_job
+        if job.total:
+            self.convert_progress_bar.set(job.completed / job.total)
+        eta = job.eta
+        eta_text = _format_duration(eta) if eta is not None else "--:--"
+        self.convert_progress_label.configure(
+            text=f"{job.completed}/{job.total}  {job.rate:.1f} files/s  ETA {eta_text}")
+
+        if not job.finished:
+            self.after(100, self._poll_convert)
+            return
+
+        self.convert_job = None
+        self.convert_progress_frame.grid_remove()
+        self.btn_run_convert.configure(state="normal")
+        if self._convert_job_watched:
+            # Batches from a watched folder only speak up when something failed
+            self._watch_processed("convert", len(job.results))
+            if job.failed:
+                self._show_convert_report(job)
+            return
+        self._show_convert_report(job)
+        self.clear_list_convert()
+        self._show_stats("Conversion timings")
+
+    def _show_stats(self, title):
+        # Timings since the previous panel (so adding and scanning the files count
+        # towards the job that uses them); only collected with --stats
+        if not STATS.enabled or not STATS:
+            return
+        text = STATS.report()
+        exported = STATS.to_json()
+        STATS.reset()
+
+        win = ctk.CTkToplevel(self)
+        win.title(title)
+        win.geometry("760x360")
+        report = ctk.CTkTextbox(win, fg_color=BLACK, text_color=TEXT_COLOR, font=("Courier", 12), wrap="none")
+        report.pack(fill="both", expand=True, padx=10, pady=10)
+        report.insert("1.0", text)
+        report.configure(state="disabled")
+
+        def export():
+            path = filedialog.asksaveasfilename(parent=win, title="Export timings", defaultextension=".json",
+                                                filetypes=[("JSON", "*.json")])
+            if path:
+                with open(path, "w", encoding="utf-8") as f:
+                    f.write(exported + "\n")
+
+        ctk.CTkButton(win, text="Export JSON...", command=export,
+                      fg_color=GOLD, text_color=BLACK, hover_color=DARK_GOLD).pack(side="right", padx=10, pady=(0, 10))
+        try:
+            win.transient(self)
+        except Exception:
+            pass
+
+    def _show_convert_report(self, job):
+        results = job.results
+        converted = len(results) - job.failed - job.skipped
+        summary = f"Converted {converted} images in {_format_duration(job.elapsed)}."
+        if job.skipped:
+            summary += f" {job.skipped} already up to date."
+        if job.failed:
+            summary += f" {job.failed} failed."
+        if job.cancelled:
+            summary += f" Cancelled, {job.total - len(results)} not processed."
+
+        if not job.failed and not job.cancelled:
+            messagebox.showinfo("Success", summary)
+            return
+
+        win = ctk.CTkToplevel(self)
+        win.title("Conversion report")
+        win.geometry("700x400")
+        ctk.CTkLabel(win, text=summary, text_color=GOLD).pack(padx=10, pady=10, anchor="w")
+        report = ctk.CTkTextbox(win, fg_color=BLACK, text_color=TEXT_COLOR)
+        report.pack(fill="both", expand=True, padx=10, pady=(0, 10))
+        lines = []
+        for result in results:
+            name = os.path.basename(result.source)
+            if result.error:
+                lines.append(f"FAILED  {name}: {result.error}")
+            elif result.skipped:
+                lines.append(f"SKIPPED {name}: {os.path.basename(result.output)} is up to date")
+            else:
+                outputs = result.outputs or (result.output,)
+                lines.append(f"OK      {name} -> {', '.join(os.path.basename(path) for path in outputs)}")
+        report.insert("1.0", "\n".join(lines))
+        report.configure(state="disabled")
+        try:
+            win.transient(self)
+        except Exception:
+            pass
+
+    # --- Logic: Duplicates ---
+
+    def add_files_duplicates(self):
+        files = filedialog.askopenfilenames(title="Select files to check for duplicates")
+        self.duplicates_file_list_frame.add_files(files)
+
+    def clear_list_duplicates(self):
+        self.duplicates_file_list_frame.clear()
+        self._set_duplicate_groups([])
+        self.duplicates_summary.configure(text="Add files or folders, then Find Duplicates.")
+
+    def _on_duplicates_mode_change(self, choice):
+        if choice == "Similar images":
+            self.similar_options.pack(side="left", after=self.duplicates_mode_menu)
+        else:
+            self.similar_options.pack_forget()
+
+    def run_find_duplicates(self):
+        files = self.duplicates_file_list_frame.get_files()
+        if not files:
+            messagebox.showwarning("Warning", "No files selected.")
+            return
+        if self.duplicates_file_list_frame.is_scanning():
+            messagebox.showwarning("Warning", "Wait for the folder scan to finish.")
+            return
+        if self.duplicates_mode_var.get() == "Similar images":
+            from organizer.converter import IMAGE_EXTENSIONS
+
+            try:
+                max_distance = int(self.similar_distance_input.get())
+                if not 0 <= max_distance < 64:
+                    raise ValueError
+            except ValueError:
+                messagebox.showerror("Error", "Max distance must be a whole number from 0 to 63.")
+                return
+            images = [path for path in files if os.path.splitext(path)[1].lower() in IMAGE_EXTENSIONS]
+            if not images:
+                messagebox.showwarning("Warning", "There are no images in the list.")
+                return
+            from organizer.similar import SimilarSearch
+
+            self.duplicate_search = SimilarSearch(images, self.similar_algorithm_var.get(), max_distance).start()
+        else:
+            from organizer.duplicates import DuplicateSearch
+
+            self.duplicate_search = DuplicateSearch(files).start()
+        self.btn_run_duplicates.configure(state="disabled")
+        self.btn_cancel_duplicates.configure(state="normal")
+        self.duplicates_progress_bar.set(0)
+        self.duplicates_progress_label.configure(text="")
+        self.duplicates_progress_frame.grid(row=3, column=0, padx=10, pady=(0, 10), sticky="ew")
+        self.after(100, self._poll_find_duplicates)
+
+    def cancel_find_duplicates(self):
+        if self.duplicate_search is not None:
+            self.duplicate_search.cancel()
+            self.btn_cancel_duplicates.configure(state="disabled")
+
+    def _poll_find_duplicates(self):
+        from organizer.similar import SimilarSearch
+
+        search = self.duplicate_search
+        if search.total:
+            self.duplicates_progress_bar.set(search.completed / search.total)
+        similar = isinstance(search, SimilarSearch)
+        if similar:
+            phase = "Grouping similar images" if search.phase == "clustering" else "Fingerprinting images"
+            self.duplicates_progress_label.configure(text=f"{phase}: {search.completed}/{search.total}")
+        else:
+            phase = {"partial": "Comparing file ends", "full": "Hashing candidates"}.get(search.phase, "Reading sizes")
+            self.duplicates_progress_label.configure(
+                text=f"{phase}: {search.completed}/{search.total}  {_format_size(search.bytes_hashed)} read")
+
+        if not search.finished:
+            self.after(100, self._poll_find_duplicates)
+            return
+
+        self.duplicate_search = None
+        self.duplicates_progress_frame.grid_remove()
+        self.btn_run_duplicates.configure(state="normal")
+        if search.error:
+            messagebox.showerror("Error", f"An error occurred: {search.error}")
+            return
+        if search.cancelled:
+            self.duplicates_summary.configure(text="Search cancelled.")
+            return
+
+        self._set_duplicate_groups(search.groups)
+        if similar:
+            text = (f"{len(search.groups)} sets of similar images: {search.redundant_files} extra copies. "
+                    "The largest file of each set is kept; drag to change it." if search.groups
+                    else "No similar images found.")
+            if search.failed:
+                text += f" {len(search.failed)} images could not be read."
+            self.duplicates_summary.configure(text=text)
+        elif search.groups:
+            self.duplicates_summary.configure(
+                text=f"{len(search.groups)} sets of identical files: {search.redundant_files} extra copies, "
+                     f"{_format_size(search.redundant_bytes)}. The first file of each set is kept; drag to change it.")
+        else:
+            self.duplicates_summary.configure(text="No duplicates found.")
+        self._show_stats("Duplicate search timings")
+
+    def _set_duplicate_groups(self, groups):
+        # Puts each set's files together at the top of the list, in set order
+        file_list = self.duplicates_file_list_frame
+        self._duplicate_group_of = {path: number for number, group in enumerate(groups, 1) for path in group.paths}
+        if groups:
+            grouped = [path for group in groups for path in group.paths]
+            rest = [path for path in file_list.get_files() if path not in self._duplicate_group_of]
+            file_list.model.reorder(grouped + rest)
+            file_list.selected = set()
+            file_list.set_annotations(self._annotate_duplicate)
+        else:
+            file_list.set_annotations(None)
+
+    def _current_keepers(self):
+        # The first remaining file of each set, in the current list order, and the
+        # numbers of the sets that still have more than one file
+        model = self.duplicates_file_list_frame.model
+        version, keepers, kept_groups = self._duplicate_keepers
+        if version != model.version:
+            keepers = set()
+            seen = set()
+            counts = {}
+            for path in model.paths:
+                number = self._duplicate_group_of.get(path)
+                if number is not None:
+                    counts[number] = counts.get(number, 0) + 1
+                    if number not in seen:
+                        seen.add(number)
+                        keepers.add(path)
+            # A set down to one file is no longer a duplicate
+            keepers = {path for path in keepers if counts[self._duplicate_group_of[path]] > 1}
+            kept_groups = {self._duplicate_group_of[path] for path in keepers}
+            self._duplicate_keepers = (model.version, keepers, kept_groups)
+        return keepers, kept_groups
+
+    def _annotate_duplicate(self, path):
+        number = self._duplicate_group_of.get(path)
+        if number is None:
+            return None
+        keepers, kept_groups = self._current_keepers()
+        if number not in kept_groups:
+            return None
+        if path in keepers:
+            return f"Set {number} \u00b7 keep", GOLD
+        return f"Set {number} \u00b7 duplicate", ERROR_TEXT
+
+    def _duplicate_extras(self):
+        keepers, kept_groups = self._current_keepers()
+        return [path for path in self.duplicates_file_list_frame.get_files()
+                if self._duplicate_group_of.get(path) in kept_groups and path not in keepers]
+
+    def select_duplicate_extras(self):
+        extras = self._duplicate_extras()
+        if not extras:
+            messagebox.showinfo("Duplicates", "There are no duplicates to select.")
+            return
+        self.duplicates_file_list_frame.select_paths(extras)
+
+    def _selected_duplicate_paths(self):
+        file_list = self.duplicates_file_list_frame
+        paths = file_list.get_files()
+        return [paths[i] for i in sorted(file_list.selected)]
+
+    def delete_selected_duplicates(self):
+        paths = self._selected_duplicate_paths()
+        if not paths:
+            messagebox.showwarning("Warning", "Select the files to delete first (Select Extras picks every copy but one).")
+            return
+        if not messagebox.askyesno("Delete files", f"Permanently delete {len(paths)} files from disk?"):
+            return
+        deleted = []
+        failed = []
+        for path in paths:
+            try:
+                os.remove(path)
+                deleted.append(path)
+            except OSError as e:
+                failed.append(f"{os.path.basename(path)}: {e}")
+        self.duplicates_file_list_frame.remove_paths(deleted)
+        if failed:
+            messagebox.showerror("Error", f"Deleted {len(deleted)} files; {len(failed)} failed:\n" + "\n".join(failed[:20]))
+        else:
+            messagebox.showinfo("Success", f"Deleted {len(deleted)} files.")
+
+    def send_duplicates_to_renaming(self):
+        # The selected files (or the whole list) go to the Renaming tab's list
+        paths = self._selected_duplicate_paths() or list(self.duplicates_file_list_frame.get_files())
+        if not paths:
+            messagebox.showwarning("Warning", "No files selected.")
+            return
+        builder = self._tab_builders.pop("Renaming", None)
+        if builder is not None:
+            builder()
+        self.rename_file_list_frame.add_files(paths)
+        self.tabview.set("Renaming")
+
+def _split_globs(text):
+    # "*.jpg; *.png" or "*.jpg, *.png" -> ["*.jpg", "*.png"]
+    return [p.strip() for p in text.replace(",", ";").split(";") if p.strip()]
+
+
+def _format_size(size):
+    for unit in ("B", "KB", "MB", "GB"):
+        if size < 1024 or unit == "GB":
+            return f"{size:.0f} {unit}" if unit == "B" else f"{size:.1f} {unit}"
+        size /= 1024
+
+def _parse_optional_positive_int(text):
+    text = text.strip()
+    if not text:
+        return None
+    value = int(text)
+    if value < 1:
+        raise ValueError(text)
+    return value
+
+def _format_duration(seconds):
+    seconds = int(seconds)
+    hours, rest = divmod(seconds, 3600)
+    minutes, seconds = divmod(rest, 60)
+    if hours:
+        return f"{hours}:{minutes:02d}:{seconds:02d}"
+    return f"{minutes}:{seconds:02d}"
 
 if __name__ == "__main__":
-    app = App()
+    # Needed for the conversion process pool in frozen (PyInstaller) builds
+    import multiprocessing
+
+    multiprocessing.freeze_support()
+    profile = StartupProfile(_PROCESS_STARTED_AT) if "--startup-profile" in sys.argv[1:] else None
+    app = App(startup_profile=profile, stats="--stats" in sys.argv[1:])
     app.mainloop()
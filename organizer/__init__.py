@@ -0,0 +1,2 @@
+# Core logic for File Organizer. Nothing in this package imports Tk, so it can be
+# used from the GUI in main.py as well as headless.
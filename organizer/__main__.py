@@ -0,0 +1,9 @@
+import sys
+
+from organizer.cli import main
+
+if __name__ == "__main__":
+    # Needed for the conversion process pool in frozen builds
+    import multiprocessing
+    multiprocessing.freeze_support()
+    sys.exit(main())
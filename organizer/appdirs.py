@@ -0,0 +1,20 @@
+import os
+import sys
+
+
+def _user_dir(xdg_var, fallback):
+    if sys.platform.startswith("win"):
+        return os.environ.get("LOCALAPPDATA") or os.path.expanduser("~")
+    return os.environ.get(xdg_var) or os.path.join(os.path.expanduser("~"), *fallback)
+
+
+def state_dir(*parts):
+    # Data worth keeping (rename journals): %LOCALAPPDATA%\organizer or ~/.local/state/organizer
+    return os.path.join(_user_dir("XDG_STATE_HOME", (".local", "state")), "organizer", *parts)
+
+
+def cache_dir(*parts):
+    # Data that can be rebuilt (hashes): %LOCALAPPDATA%\organizer\cache or ~/.cache/organizer
+    if sys.platform.startswith("win"):
+        return os.path.join(_user_dir("", ()), "organizer", "cache", *parts)
+    return os.path.join(_user_dir("XDG_CACHE_HOME", (".cache",)), "organizer", *parts)
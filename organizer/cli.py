@@ -0,0 +1,418 @@
+"""Headless command line for File Organizer.
+
+    python -m organizer rename PATH... --mode ordered --value "Photo-@@@@" --start 1
+    python -m organizer rename PATH... --mode template --value "{exif_date:%Y%m%d|mtime}_{camera}_{@@@@}"
+    python -m organizer convert PATH... --to webp --keep-old --workers 4
+    python -m organizer organize PATH... --rule "jpg,png:Photos/{year}/{month}" --rule "{category}" --dest ~/Sorted
+    python -m organizer convert inbox --to webp --watch
+    python -m organizer journal undo
+
+Only the standard library and this package are imported up front; Pillow is loaded
+by the conversion workers, and Tk is never imported.
+"""
+import argparse
+import glob
+import json
+import os
+import sys
+
+from organizer.converter import (IMAGE_EXTENSIONS, TARGET_FORMATS, ConvertJob, default_worker_count, parse_targets,
+                                 target_output_path)
+from organizer.file_list import SORT_FIELDS, FileListModel
+from organizer.journal import (RenameJournal, RollbackError, interrupted_journals, journal_summary,
+                               last_undoable_journal, list_journals, load_journal, resume_journal, undo_journal)
+from organizer.organize import DATE_SOURCES, TEMPLATE_PRESETS, apply_moves, parse_rule, plan_moves
+from organizer.renamer import apply_plan, parse_start_number, plan_renames
+from organizer.scanner import SCAN_MODES, ScanFilter, iter_folder_entries, parse_date, parse_size
+from organizer.stats import STATS
+from organizer.watcher import FolderWatcher
+
+RENAME_MODE_ALIASES = {
+    "after-chars": "After X characters",
+    "before-chars": "Before X characters",
+    "after-expr": "After expression",
+    "before-expr": "Before expression",
+    "remove-expr": "Remove expression only",
+    "ordered": "Ordered renaming",
+    "template": "Template",
+}
+
+PRESET_ALIASES = {
+    "type": TEMPLATE_PRESETS["By type"],
+    "ext": TEMPLATE_PRESETS["By extension"],
+    "year": TEMPLATE_PRESETS["By year"],
+    "month": TEMPLATE_PRESETS["By year/month"],
+    "type-year": TEMPLATE_PRESETS["By type, then year"],
+}
+
+
+def collect_files(patterns, scan_mode, allowed_extensions=None, scan_filter=None):
+    # Files, directories and glob patterns, in the order given, de-duplicated the
+    # same way the GUI list does it; the filter applies to files found in folders
+    model = FileListModel(allowed_extensions)
+    for pattern in patterns:
+        matches = sorted(glob.glob(pattern, recursive=True)) if glob.has_magic(pattern) else [pattern]
+        for path in matches:
+            if os.path.isdir(path):
+                model.add_scanned(iter_folder_entries(path, scan_mode, model.allowed_extensions,
+                                                      scan_filter=scan_filter))
+            else:
+                model.add_many((path,))
+    return model
+
+
+def _add_common_arguments(parser):
+    parser.add_argument("paths", nargs="+", help="files, folders or glob patterns (quote them to use ** recursion)")
+    parser.add_argument("--scan", choices=SCAN_MODES, default="folder_only",
+                        help="which files to take from folders (default: folder_only)")
+    parser.add_argument("--include", action="append", metavar="GLOB",
+                        help="only take files from folders whose name matches, e.g. '*.jpg' (repeatable)")
+    parser.add_argument("--exclude", action="append", metavar="GLOB",
+                        help="skip files and folders whose name matches, e.g. node_modules (repeatable)")
+    parser.add_argument("--name-regex", metavar="REGEX", help="only take files whose name contains a match")
+    parser.add_argument("--min-size", metavar="SIZE", help="only take files at least this large, e.g. 100KB")
+    parser.add_argument("--max-size", metavar="SIZE", help="only take files at most this large, e.g. 2GB")
+    parser.add_argument("--modified-since", metavar="DATE", help="only take files modified on or after "
+                                                                  "YYYY-MM-DD[ HH:MM]")
+    parser.add_argument("--modified-until", metavar="DATE", help="only take files modified on or before "
+                                                                  "YYYY-MM-DD[ HH:MM]")
+    parser.add_argument("--max-depth", type=int, metavar="N",
+                        help="do not look more than N folders deep (0 = the folder itself), within --scan")
+    parser.add_argument("--sort", choices=SORT_FIELDS, help="sort the files before processing")
+    parser.add_argument("--descending", action="store_true", help="reverse the --sort order")
+    parser.add_argument("--dry-run", action="store_true", help="show what would happen without changing any file")
+    parser.add_argument("--json", action="store_true", help="print the result as JSON")
+    parser.add_argument("--watch", action="store_true",
+                        help="after the files already there, keep processing files as they arrive in the given "
+                             "folders, in small batches, until interrupted with Ctrl+C")
+    parser.add_argument("--stats", nargs="?", const="-", metavar="FILE",
+                        help="time each phase (scan, stat, decode, encode, write...) and print the table to "
+                             "stderr, or write it as JSON to FILE")
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(prog="organizer", description="Batch rename and convert files without the GUI.")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    rename = subparsers.add_parser("rename", help="rename files")
+    _add_common_arguments(rename)
+    rename.add_argument("--mode", required=True, choices=RENAME_MODE_ALIASES,
+                        help="rename mode, as in the Renaming tab")
+    rename.add_argument("--value", required=True,
+                        help="X, the expression, the pattern for ordered renaming (@ = counter digit), or a "
+                             "template of tokens such as {name}, {mtime:%%Y-%%m}, {exif_date:%%Y%%m%%d|mtime}, "
+                             "{camera|unknown} and {@@@@}")
+    rename.add_argument("--start", default="1", help="first number for ordered and template renaming (default: 1)")
+    rename.add_argument("--no-journal", action="store_true",
+                        help="do not record the batch (it can then not be resumed or undone)")
+
+    convert = subparsers.add_parser("convert", help="convert images")
+    _add_common_arguments(convert)
+    convert.add_argument("--to", required=True, action="append", metavar="FORMAT[@SIZE][:QUALITY]",
+                         help=f"output format ({', '.join(TARGET_FORMATS)}), optionally with a longest side in "
+                              "pixels and a JPEG/WEBP quality, e.g. webp@1024:80; ico@16,32,48 picks icon layers. "
+                              "Repeat (or separate with spaces) to write several outputs from one decode")
+    convert.add_argument("--keep-old", action="store_true", help="keep the original files")
+    convert.add_argument("--workers", type=int, default=default_worker_count(),
+                         help="number of worker processes (default: CPU count)")
+    convert.add_argument("--max-dimension", type=int, metavar="PX",
+                         help="shrink images to fit this many pixels on their longest side")
+    convert.add_argument("--memory-limit", type=int, metavar="MB",
+                         help="cap the estimated memory of images converted at once")
+    convert.add_argument("--incremental", action="store_true",
+                         help="skip sources already converted with the same settings (manifest per folder)")
+    convert.add_argument("--hash", action="store_true",
+                         help="with --incremental, compare content hashes of sources that were touched")
+
+    organize = subparsers.add_parser("organize", help="move files into folders by type, extension or date")
+    _add_common_arguments(organize)
+    organize.add_argument("--rule", action="append", metavar="[EXTS:]TEMPLATE",
+                          help="folder template, optionally only for some extensions, e.g. \"jpg,png:Photos/{year}\"; "
+                               "fields: {category} {ext} {year} {month} {day}; the first matching rule wins and "
+                               "files no rule matches stay put (repeatable)")
+    organize.add_argument("--by", choices=PRESET_ALIASES, default="type",
+                          help="preset used when no --rule is given (default: type)")
+    organize.add_argument("--dest", metavar="FOLDER",
+                          help="root of the new folders (default: each file's own folder)")
+    organize.add_argument("--date-source", choices=DATE_SOURCES, default="mtime",
+                          help="date for {year}/{month}/{day}: file modification time, or the EXIF capture date "
+                               "falling back to it (default: mtime)")
+    organize.add_argument("--no-journal", action="store_true",
+                          help="don't record the batch (it can't be resumed or undone with 'journal')")
+
+    journal = subparsers.add_parser("journal", help="list, resume or undo recorded rename and move batches")
+    journal.add_argument("action", choices=("list", "resume", "undo"))
+    journal.add_argument("journal", nargs="?",
+                         help="journal file (default: the last interrupted batch for resume, the last "
+                              "completed or interrupted batch for undo)")
+    journal.add_argument("--json", action="store_true", help="print the result as JSON")
+    return parser
+
+
+def _emit(args, payload, lines):
+    if args.json:
+        json.dump(payload, sys.stdout, indent=2)
+        sys.stdout.write("\n")
+    else:
+        for line in lines:
+            print(line)
+
+
+def run_rename(args, model):
+    try:
+        start = parse_start_number(args.start)
+        plan = plan_renames(model.paths, RENAME_MODE_ALIASES[args.mode], args.value, start, info=model.info)
+    except ValueError as e:
+        print(f"error: {e}", file=sys.stderr)
+        return 2
+
+    error = None
+    unreversed = 0
+    journal = None
+    if not args.dry_run and plan:
+        journal = None if args.no_journal else RenameJournal.create()
+        try:
+            apply_plan(plan, journal)
+        except OSError as e:
+            error = str(e)
+            if isinstance(e, RollbackError):
+                unreversed = e.unreversed
+
+    moves = [{"source": source, "target": target} for source, target in plan]
+    lines = [f"{source} -> {target}" for source, target in plan]
+    if error:
+        lines.append(f"error: {error}" + ("" if unreversed else " (no files were renamed)"))
+    else:
+        verb = "Would rename" if args.dry_run else "Renamed"
+        lines.append(f"{verb} {len(plan)} of {len(model)} files.")
+        if journal is not None:
+            lines.append(f"Journal: {journal.path}")
+    payload = {"command": "rename", "dry_run": args.dry_run, "files": len(model),
+               "renamed": 0 if error or args.dry_run else len(plan), "moves": moves, "error": error,
+               "unreversed": unreversed, "journal": journal.path if journal is not None else None}
+    _emit(args, payload, lines)
+    return 1 if error else 0
+
+
+def run_organize(args, model):
+    try:
+        rules = [parse_rule(text) for text in args.rule or [PRESET_ALIASES[args.by]]]
+    except ValueError as e:
+        print(f"error: {e}", file=sys.stderr)
+        return 2
+    paths = model.paths
+    destination = os.path.abspath(os.path.expanduser(args.dest)) if args.dest else None
+    plan = plan_moves(paths, rules, destination, args.date_source, model.info)
+
+    error = None
+    unreversed = 0
+    journal = None
+    if not args.dry_run and plan:
+        journal = None if args.no_journal else RenameJournal.create()
+        try:
+            apply_moves(plan, journal)
+        except OSError as e:
+            error = str(e)
+            if isinstance(e, RollbackError):
+                unreversed = e.unreversed
+
+    moves = [{"source": source, "target": target} for source, target in plan]
+    lines = [f"{source} -> {target}" for source, target in plan]
+    if error:
+        lines.append(f"error: {error}" + ("" if unreversed else " (no files were moved)"))
+    else:
+        verb = "Would move" if args.dry_run else "Moved"
+        lines.append(f"{verb} {len(plan)} of {len(model)} files.")
+        if journal is not None:
+            lines.append(f"Journal: {journal.path}")
+    payload = {"command": "organize", "dry_run": args.dry_run, "files": len(model),
+               "moved": 0 if error or args.dry_run else len(plan), "moves": moves, "error": error,
+               "unreversed": unreversed, "journal": journal.path if journal is not None else None}
+    _emit(args, payload, lines)
+    return 1 if error else 0
+
+
+def run_convert(args, model):
+    for option, value in (("--workers", args.workers), ("--max-dimension", args.max_dimension),
+                          ("--memory-limit", args.memory_limit)):
+        if value is not None and value < 1:
+            print(f"error: {option} must be a positive integer", file=sys.stderr)
+            return 2
+
+    try:
+        targets = parse_targets(" ".join(args.to))
+    except ValueError as e:
+        print(f"error: {e}", file=sys.stderr)
+        return 2
+
+    if args.dry_run:
+        results = [{"source": path, "output": target_output_path(path, targets[0], args.max_dimension),
+                    "outputs": [target_output_path(path, target, args.max_dimension) for target in targets],
+                    "error": None, "skipped": False}
+                   for path in model.paths]
+        lines = [f"{r['source']} -> {', '.join(r['outputs'])}" for r in results]
+        lines.append(f"Would convert {len(results)} images.")
+        _emit(args, {"command": "convert", "dry_run": True, "converted": 0, "skipped": 0, "failed": 0,
+                     "results": results}, lines)
+        return 0
+
+    memory_limit = args.memory_limit * 1024 * 1024 if args.memory_limit else None
+    job = ConvertJob(model.paths, targets, keep_old=args.keep_old, workers=args.workers,
+                     max_dimension=args.max_dimension, memory_limit=memory_limit,
+                     incremental=args.incremental, use_hash=args.hash).start()
+    job.wait()
+    results = [{"source": r.source, "output": r.output, "outputs": list(r.outputs or ([r.output] if r.output else [])),
+                "error": r.error, "skipped": r.skipped} for r in job.results]
+    lines = []
+    for r in results:
+        if r["error"]:
+            lines.append(f"FAILED {r['source']}: {r['error']}")
+        elif r["skipped"]:
+            lines.append(f"up to date: {r['output']}")
+        else:
+            lines.append(f"{r['source']} -> {', '.join(r['outputs'])}")
+    converted = len(results) - job.failed - job.skipped
+    lines.append(f"Converted {converted} images, {job.skipped} up to date, {job.failed} failed, in {job.elapsed:.1f}s.")
+    payload = {"command": "convert", "dry_run": False, "converted": converted, "skipped": job.skipped,
+               "failed": job.failed, "elapsed": job.elapsed, "results": results}
+    _emit(args, payload, lines)
+    return 1 if job.failed else 0
+
+
+def run_journal(args):
+    if args.action == "list":
+        entries = []
+        for path in list_journals():
+            summary = journal_summary(path)
+            entries.append({"journal": path, "kind": summary.kind, "files": summary.files,
+                            "status": summary.status or "interrupted"})
+        _emit(args, {"command": "journal", "journals": entries},
+              [f"{e['status']:<12} {e['kind']:<7} {e['files']:>8} files  {e['journal']}" for e in entries]
+              or ["No journals."])
+        return 0
+
+    path = args.journal
+    if path is None:
+        if args.action == "resume":
+            path = next(iter(interrupted_journals()), None)
+        else:
+            path = last_undoable_journal()
+        if path is None:
+            print(f"error: no batch to {args.action}", file=sys.stderr)
+            return 2
+
+    skipped = 0
+    try:
+        if args.action == "resume" and not load_journal(path).undoing:
+            failed = 0
+            state = resume_journal(path)
+            status, skipped = state.status, len(state.skipped)
+        else:
+            failed = undo_journal(path)
+            status = journal_summary(path).status
+    except OSError as e:
+        print(f"error: {e}", file=sys.stderr)
+        return 1
+    lines = [f"{path}: {status}"]
+    if failed:
+        lines.append(f"{failed} files could not be put back (moved or renamed since).")
+    if skipped:
+        lines.append(f"{skipped} files were left where they were (their new name was taken since).")
+    _emit(args, {"command": "journal", "action": args.action, "journal": path, "status": status, "failed": failed,
+                 "skipped": skipped}, lines)
+    return 1 if failed or skipped else 0
+
+
+def scan_filter_from_args(args):
+    # The folder scan filter given by the options, or None; raises ValueError
+    scan_filter = ScanFilter(include=args.include or (), exclude=args.exclude or (), name_regex=args.name_regex,
+                             min_size=parse_size(args.min_size), max_size=parse_size(args.max_size),
+                             modified_since=parse_date(args.modified_since),
+                             modified_until=parse_date(args.modified_until, end_of_day=True),
+                             max_depth=args.max_depth)
+    return scan_filter or None
+
+
+def _advance_counter(args, model):
+    # Ordered and template renaming carry on numbering where the last batch stopped
+    if args.command == "rename":
+        args.start = str(parse_start_number(args.start) + len(model))
+
+
+def run_watch(args, watcher, run):
+    # Runs each batch of newly arrived files through the command, like a fresh
+    # invocation on just those files
+    print(f"Watching {', '.join(watcher.folders)} ({watcher.backend or 'starting'}); press Ctrl+C to stop.",
+          file=sys.stderr)
+    status = 0
+    try:
+        while True:
+            batch = watcher.get_batch(timeout=1.0)
+            if batch is None:
+                if watcher.error:
+                    print(f"error: {watcher.error}", file=sys.stderr)
+                    return 1
+                continue
+            model = FileListModel(watcher.allowed_extensions)
+            model.add_many(batch)
+            if args.sort:
+                model.sort([(args.sort, args.descending)])
+            status = run(args, model) or status
+            _advance_counter(args, model)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        watcher.stop()
+    return status
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    if args.command == "journal":
+        return run_journal(args)
+    STATS.enabled = bool(args.stats)
+    allowed = IMAGE_EXTENSIONS if args.command == "convert" else None
+    run = {"rename": run_rename, "organize": run_organize, "convert": run_convert}[args.command]
+    try:
+        scan_filter = scan_filter_from_args(args)
+    except ValueError as e:
+        print(f"error: {e}", file=sys.stderr)
+        return 2
+
+    watcher = None
+    if args.watch:
+        not_folders = [path for path in args.paths if not os.path.isdir(path)]
+        if not_folders:
+            print(f"error: --watch takes folders: {', '.join(not_folders)}", file=sys.stderr)
+            return 2
+        watched = allowed
+        if args.command == "convert":
+            # Outputs land next to their sources; converting them again would never end
+            try:
+                outputs = {"." + target.format for target in parse_targets(" ".join(args.to))}
+            except ValueError as e:
+                print(f"error: {e}", file=sys.stderr)
+                return 2
+            watched = [ext for ext in allowed if ext not in outputs]
+        # Started before the first listing, so no file slips in between the two
+        watcher = FolderWatcher(args.paths, args.scan, watched, scan_filter=scan_filter).start()
+
+    model = collect_files(args.paths, args.scan, allowed, scan_filter)
+    if args.sort:
+        model.sort([(args.sort, args.descending)])
+    if watcher is not None:
+        watcher.mark_seen(model.paths)
+
+    status = run(args, model)
+    if watcher is not None:
+        if status == 2:
+            watcher.stop()
+        else:
+            _advance_counter(args, model)
+            status = run_watch(args, watcher, run)
+    if args.stats == "-":
+        print(STATS.report(), file=sys.stderr)
+    elif args.stats:
+        with open(args.stats, "w", encoding="utf-8") as f:
+            f.write(STATS.to_json() + "\n")
+    return status
@@ -0,0 +1,579 @@
+import io
+import os
+import threading
+import time
+from collections import namedtuple
+
+from organizer.stats import STATS
+
+# PIL format mapping
+FORMAT_MAP = {
+    "jpg": "JPEG",
+    "jpeg": "JPEG",
+    "png": "PNG",
+    "webp": "WEBP",
+    "bmp": "BMP",
+    "ico": "ICO",
+    "tiff": "TIFF"
+}
+
+TARGET_FORMATS = ["png", "jpg", "jpeg", "webp", "bmp", "ico", "tiff"]
+IMAGE_EXTENSIONS = [".jpg", ".jpeg", ".png", ".webp", ".bmp", ".ico", ".tiff", ".gif"]
+
+# Icon layers written for an "ico" target unless sizes are given
+ICO_SIZES = (16, 24, 32, 48, 64, 128, 256)
+# Formats whose encoders take a quality setting
+QUALITY_FORMATS = ("jpg", "jpeg", "webp")
+
+# skipped: the output was already up to date according to the manifest
+# timings: (phase, seconds, bytes) triples measured in the worker, when stats are on
+# outputs: every file written, when the job has several targets (output is the first)
+ConvertResult = namedtuple("ConvertResult", ["source", "output", "error", "skipped", "timings", "outputs"],
+                           defaults=(False, None, None))
+
+# One output of a conversion. size: longest side in pixels (None keeps the
+# image's size), or for "ico" the icon layer sizes; quality: 1-100 for JPEG/WEBP
+OutputTarget = namedtuple("OutputTarget", ["format", "size", "quality"], defaults=(None, None))
+
+# Bytes per pixel Pillow uses in memory for each mode; anything not listed is
+# assumed to take 4 (RGB is stored padded to 4 bytes)
+_MODE_BYTES = {"1": 1, "L": 1, "P": 1, "LA": 4, "I;16": 2, "I;16B": 2, "I;16L": 2}
+
+# Formats that can decode straight to a reduced size (Image.draft)
+_DRAFT_FORMATS = ("JPEG",)
+
+
+def output_path_for(file_path, target_ext):
+    directory = os.path.dirname(file_path)
+    name, _ = os.path.splitext(os.path.basename(file_path))
+    return os.path.join(directory, f"{name}.{target_ext}")
+
+
+def parse_target(text):
+    """An OutputTarget from "FORMAT[@SIZE][:QUALITY]", e.g. "webp@1024:80" or "ico@16,32,48"."""
+    spec = text.strip().lower()
+    spec, _, quality = spec.partition(":")
+    target_format, _, size = spec.partition("@")
+    if target_format not in FORMAT_MAP:
+        raise ValueError(f"Unknown output format '{target_format}' (use {', '.join(TARGET_FORMATS)}).")
+    try:
+        if target_format == "ico":
+            sizes = tuple(sorted({int(n) for n in size.split(",")})) if size else ICO_SIZES
+            if not all(1 <= n <= 256 for n in sizes):
+                raise ValueError
+            size = sizes
+        else:
+            size = int(size) if size else None
+            if size is not None and size < 1:
+                raise ValueError
+    except ValueError:
+        raise ValueError(f"Bad size in '{text.strip()}': use a number of pixels"
+                         + (" (1-256, comma separated)." if target_format == "ico" else ".")) from None
+    if quality:
+        if target_format not in QUALITY_FORMATS:
+            raise ValueError(f"'{text.strip()}': only {', '.join(QUALITY_FORMATS)} take a quality.")
+        try:
+            quality = int(quality)
+            if not 1 <= quality <= 100:
+                raise ValueError
+        except ValueError:
+            raise ValueError(f"Bad quality in '{text.strip()}': use 1-100.") from None
+    return OutputTarget(target_format, size, quality or None)
+
+
+def parse_targets(targets):
+    """A list of OutputTargets from a format name, a space separated list of specs, or a list of either.
+
+    Raises ValueError for a bad spec, or for two targets that would write the same file.
+    """
+    if isinstance(targets, str):
+        targets = targets.split()
+    parsed = [target if isinstance(target, OutputTarget) else parse_target(target) for target in targets]
+    if not parsed:
+        raise ValueError("Choose at least one output format.")
+    names = [target_output_path("x", target) for target in parsed]
+    if len(set(names)) != len(names):
+        raise ValueError("Two outputs would write the same file; give them different sizes.")
+    return parsed
+
+
+def target_key(targets):
+    # Canonical text of a target list, e.g. "png webp@1024:80"; a single plain
+    # format is just its name, as in manifests written before multi-target jobs
+    parts = []
+    for target in targets:
+        part = target.format
+        if target.size is not None and target.format != "ico":
+            part += f"@{target.size}"
+        elif target.format == "ico" and target.size != ICO_SIZES:
+            part += "@" + ",".join(map(str, target.size))
+        if target.quality is not None:
+            part += f":{target.quality}"
+        parts.append(part)
+    return " ".join(parts)
+
+
+def _same_path(path, other):
+    return os.path.normcase(os.path.abspath(path)) == os.path.normcase(os.path.abspath(other))
+
+
+def _sized_path(file_path, target_ext, size):
+    directory = os.path.dirname(file_path)
+    name, _ = os.path.splitext(os.path.basename(file_path))
+    return os.path.join(directory, f"{name}-{size}px.{target_ext}")
+
+
+def target_output_path(file_path, target, max_dimension=None):
+    # Sized raster outputs get the size in their name, so several sizes can coexist.
+    # So does an output shrunk to max_dimension that would otherwise land on its own
+    # source: the full-size original is never written over
+    if target.size is not None and target.format != "ico":
+        return _sized_path(file_path, target.format, target.size)
+    path = output_path_for(file_path, target.format)
+    if max_dimension and _same_path(path, file_path):
+        return _sized_path(file_path, target.format, max_dimension)
+    return path
+
+
+def _draft_scale(size, max_dimension):
+    # The 1/2, 1/4 or 1/8 scale a JPEG decoder picks for Image.draft: the smallest
+    # image that is still at least max_dimension on its longest side
+    scale = 1
+    while scale < 8 and max(size) / (scale * 2) >= max_dimension:
+        scale *= 2
+    return scale
+
+
+def estimate_memory(file_path, max_dimension=None, copies=1):
+    """Rough peak memory, in bytes, to convert one image, read from its header only.
+
+    Counts the decoded image plus `copies` working copies (mode conversion or
+    resize; one per output encoded at once). Returns 0 when the header can't be
+    read; the conversion itself reports that.
+    """
+    from PIL import Image
+
+    try:
+        with Image.open(file_path) as img:
+            width, height = img.size
+            if max_dimension and img.format in _DRAFT_FORMATS:
+                scale = _draft_scale(img.size, max_dimension)
+                width, height = -(-width // scale), -(-height // scale)
+            return width * height * _MODE_BYTES.get(img.mode, 4) * (1 + copies)
+    except Exception:
+        return 0
+
+
+def convert_image(file_path, target_ext, keep_old=False, max_dimension=None, timed=False):
+    # Runs inside a worker process, so every failure is returned rather than raised.
+    # PIL is imported here so that importing this module stays cheap.
+    from PIL import Image
+
+    pil_format = FORMAT_MAP.get(target_ext, "PNG")
+    new_path = target_output_path(file_path, OutputTarget(target_ext), max_dimension)
+    timings = [] if timed else None
+    perf_counter = time.perf_counter
+    try:
+        if timed:
+            started = perf_counter()
+        with Image.open(file_path) as img:
+            if max_dimension:
+                # JPEG decodes directly at 1/2, 1/4 or 1/8 scale, never below the
+                # requested size; thumbnail() then shrinks the rest of the way, using
+                # reduce() for the bulk of it
+                img.draft(None, (max_dimension, max_dimension))
+                img.thumbnail((max_dimension, max_dimension))
+
+            img = _writable(img, pil_format)
+
+            if timed:
+                # Decoding is otherwise lazy, and encoding goes to memory first so
+                # the disk write is measured on its own
+                img.load()
+                timings.append(("convert.decode", perf_counter() - started, os.path.getsize(file_path)))
+                started = perf_counter()
+                buffer = io.BytesIO()
+                img.save(buffer, format=pil_format)
+                timings.append(("convert.encode", perf_counter() - started, 0))
+                started = perf_counter()
+                with open(new_path, "wb") as f:
+                    f.write(buffer.getbuffer())
+                timings.append(("convert.write", perf_counter() - started, buffer.tell()))
+            else:
+                img.save(new_path, format=pil_format)
+
+        # Converting to the same extension writes over the source, so never delete it then
+        if not keep_old and not _same_path(new_path, file_path):
+            if timed:
+                started = perf_counter()
+            os.remove(file_path)
+            if timed:
+                timings.append(("convert.delete", perf_counter() - started, 0))
+    except Exception as e:
+        return ConvertResult(file_path, None, str(e) or type(e).__name__, timings=timings)
+    return ConvertResult(file_path, new_path, None, timings=timings)
+
+
+def _writable(img, pil_format):
+    # `img` in a mode `pil_format` can store: JPEG has no alpha, palette or
+    # 16-bit modes (RGBA, LA, P, I;16...), so those become RGB
+    if pil_format == "JPEG" and img.mode not in ("RGB", "L", "CMYK"):
+        return img.convert("RGB")
+    return img
+
+
+def _fit(size, longest):
+    # (width, height) scaled down so the longest side is at most `longest`
+    width, height = size
+    scale = longest / max(width, height)
+    if scale >= 1:
+        return size
+    return max(1, round(width * scale)), max(1, round(height * scale))
+
+
+def _icon_layers(img, sizes):
+    # Square layers, largest first: the image is centered on a transparent square
+    # once, and every layer is scaled from the largest one instead of the original
+    from PIL import Image
+
+    largest = max(sizes)
+    frame = img
+    if max(frame.size) > largest:
+        frame = frame.resize(_fit(frame.size, largest), Image.Resampling.LANCZOS, reducing_gap=2.0)
+    frame = frame.convert("RGBA")
+    side = max(frame.size)
+    if frame.width != frame.height:
+        square = Image.new("RGBA", (side, side), (0, 0, 0, 0))
+        square.paste(frame, ((side - frame.width) // 2, (side - frame.height) // 2))
+        frame = square
+    sizes = sorted((n for n in sizes if n <= side), reverse=True) or [side]
+    base = frame if side == sizes[0] else frame.resize((sizes[0], sizes[0]), Image.Resampling.LANCZOS)
+    return [base] + [base.resize((n, n), Image.Resampling.LANCZOS) for n in sizes[1:]]
+
+
+def _encode_target(img, target, path, timed):
+    # Writes one output from the shared decoded image, which is only read here:
+    # every branch works on its own copy. Returns the timings list (or None).
+    from PIL import Image
+
+    perf_counter = time.perf_counter
+    started = perf_counter() if timed else None
+    pil_format = FORMAT_MAP[target.format]
+    options = {}
+    if target.format == "ico":
+        layers = _icon_layers(img, target.size)
+        frame = layers[0]
+        options = {"sizes": [layer.size for layer in layers], "append_images": layers[1:]}
+    else:
+        frame = img
+        if target.size is not None and max(img.size) > target.size:
+            frame = frame.resize(_fit(img.size, target.size), Image.Resampling.BICUBIC, reducing_gap=2.0)
+        frame = _writable(frame, pil_format)
+        if frame is img:
+            # save() may touch the image it writes, and the others share this one
+            frame = img.copy()
+        if target.quality is not None:
+            options["quality"] = target.quality
+    if not timed:
+        frame.save(path, format=pil_format, **options)
+        return None
+    buffer = io.BytesIO()
+    frame.save(buffer, format=pil_format, **options)
+    encoded = perf_counter()
+    with open(path, "wb") as f:
+        f.write(buffer.getbuffer())
+    return [("convert.encode", encoded - started, 0), ("convert.write", perf_counter() - encoded, buffer.tell())]
+
+
+def convert_image_targets(file_path, targets, keep_old=False, max_dimension=None, timed=False):
+    """Decodes file_path once and writes every OutputTarget from it.
+
+    The image is decoded at the smallest size the largest output needs, and the
+    outputs are encoded on threads of this worker process (Pillow's encoders
+    release the GIL). Runs inside a worker process, so failures are returned.
+    """
+    from concurrent.futures import ThreadPoolExecutor
+
+    from PIL import Image
+
+    outputs = [target_output_path(file_path, target, max_dimension) for target in targets]
+    timings = [] if timed else None
+    perf_counter = time.perf_counter
+    # None when some output keeps the full size
+    needed = 0
+    for target in targets:
+        if target.format == "ico":
+            needed = max(needed, max(target.size))
+        elif target.size is None:
+            needed = None
+            break
+        else:
+            needed = max(needed, target.size)
+    if max_dimension:
+        needed = min(needed, max_dimension) if needed else max_dimension
+    try:
+        started = perf_counter()
+        with Image.open(file_path) as img:
+            if needed:
+                img.draft(None, (needed, needed))
+            if max_dimension:
+                img.thumbnail((max_dimension, max_dimension))
+            img.load()
+            if timed:
+                timings.append(("convert.decode", perf_counter() - started, os.path.getsize(file_path)))
+            # More threads than cores would only add switching
+            threads = min(len(targets), os.cpu_count() or 1)
+            if threads == 1:
+                encoded = [_encode_target(img, target, path, timed) for target, path in zip(targets, outputs)]
+            else:
+                with ThreadPoolExecutor(max_workers=threads) as pool:
+                    encoded = list(pool.map(_encode_target, [img] * len(targets), targets, outputs,
+                                            [timed] * len(targets)))
+        if timed:
+            for target_timings in encoded:
+                timings.extend(target_timings)
+
+        if not keep_old and not any(_same_path(path, file_path) for path in outputs):
+            if timed:
+                started = perf_counter()
+            os.remove(file_path)
+            if timed:
+                timings.append(("convert.delete", perf_counter() - started, 0))
+    except Exception as e:
+        return ConvertResult(file_path, None, str(e) or type(e).__name__, timings=timings)
+    return ConvertResult(file_path, outputs[0], None, timings=timings, outputs=tuple(outputs))
+
+
+def default_worker_count():
+    return os.cpu_count() or 1
+
+
+class ConvertJob:
+    """Converts a batch of images on a process pool, reporting progress as it goes.
+
+    Cancelling is cooperative: no new files are handed out, and images already
+    being converted are allowed to finish.
+
+    With max_dimension, images are shrunk to fit that many pixels on their longest
+    side, decoding at reduced resolution where the format allows. memory_limit
+    (bytes) caps the estimated memory of the images in flight at once; an image
+    larger than the whole budget still runs, just on its own.
+
+    With incremental, every finished file is recorded in a manifest next to its
+    output (see organizer.manifest), and sources whose output is already up to
+    date are skipped without being opened. use_hash also compares content hashes
+    for sources that were touched but kept their size.
+
+    `target_ext` is a format name, or several targets (see parse_targets), in
+    which case each source is decoded once and written to all of them.
+    """
+
+    def __init__(self, files, target_ext, keep_old=False, workers=None, max_dimension=None, memory_limit=None,
+                 incremental=False, use_hash=False):
+        self.files = list(files)
+        self.targets = parse_targets(target_ext)
+        # Manifest key; a plain single format goes through convert_image as before
+        self.target_ext = target_key(self.targets)
+        self._single = len(self.targets) == 1 and self.targets[0].size is None and self.targets[0].quality is None
+        self.keep_old = keep_old
+        self.workers = max(1, workers or default_worker_count())
+        self.max_dimension = max_dimension
+        self.memory_limit = memory_limit
+        self.incremental = incremental
+        self.use_hash = use_hash
+        # Workers only time their phases when stats collection is on (organizer.stats)
+        self.timed = STATS.enabled
+        self.skipped = 0
+        self.total = len(self.files)
+        self.completed = 0
+        self.failed = 0
+        self.finished = False
+        self.started_at = None
+        self.finished_at = None
+        self._results = [None] * self.total
+        self._cancel = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    def start(self):
+        self.started_at = time.monotonic()
+        self._thread.start()
+        return self
+
+    def cancel(self):
+        self._cancel.set()
+
+    @property
+    def cancelled(self):
+        return self._cancel.is_set()
+
+    def wait(self, timeout=None):
+        self._thread.join(timeout)
+        return self.finished
+
+    @property
+    def elapsed(self):
+        if self.started_at is None:
+            return 0.0
+        return (self.finished_at or time.monotonic()) - self.started_at
+
+    @property
+    def rate(self):
+        elapsed = self.elapsed
+        return self.completed / elapsed if elapsed > 0 else 0.0
+
+    @property
+    def eta(self):
+        rate = self.rate
+        if not rate:
+            return None
+        return (self.total - self.completed) / rate
+
+    @property
+    def results(self):
+        # Per-file results in list order; files skipped by a cancel are left out
+        return [r for r in self._results if r is not None]
+
+    def _record(self, index, result):
+        if result.timings:
+            STATS.merge(result.timings)
+        self._results[index] = result
+        if result.error:
+            self.failed += 1
+        elif result.skipped:
+            self.skipped += 1
+        self.completed += 1
+
+    def _options(self):
+        # Settings that change the output, so a manifest entry only matches a rerun with the same ones
+        return {"max_dimension": self.max_dimension}
+
+    def outputs(self, file_path):
+        # Every file converting file_path writes, first target first
+        return [target_output_path(file_path, target, self.max_dimension) for target in self.targets]
+
+    def _conflicts(self):
+        """{index: error} for sources that would write a file another source of the batch writes or reads.
+
+        img.png and img.jpg converted to bmp would otherwise be encoded into
+        img.bmp at once by two workers. The first source in the list keeps the
+        name; the others are reported as failures.
+        """
+        normcase, abspath = os.path.normcase, os.path.abspath
+        sources = [normcase(abspath(path)) for path in self.files]
+        # Case-folded absolute path -> index of the source reading or writing it
+        owners = {key: index for index, key in enumerate(sources)}
+        conflicts = {}
+        for index, file_path in enumerate(self.files):
+            outputs = self.outputs(file_path)
+            keys = [normcase(abspath(path)) for path in outputs]
+            for n, (path, key) in enumerate(zip(outputs, keys)):
+                name = os.path.basename(path)
+                other = owners.get(key, index)
+                if key in keys[:n]:
+                    conflicts[index] = f"Two of its outputs would be {name}"
+                elif other == index:
+                    continue
+                elif key == sources[other]:
+                    conflicts[index] = f"{name} would overwrite another image being converted"
+                else:
+                    conflicts[index] = f"{name} is also written for {os.path.basename(self.files[other])}"
+                break
+            else:
+                owners.update(dict.fromkeys(keys, index))
+        return conflicts
+
+    def _run(self):
+        # Imported here: the process pool machinery is not needed just to import this module
+        from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+
+        manifests = None
+        if self.incremental:
+            from organizer.manifest import ManifestStore, hash_file
+            manifests = ManifestStore()
+        options = self._options()
+        conflicts = self._conflicts()
+
+        try:
+            with ProcessPoolExecutor(max_workers=self.workers) as pool:
+                queued = iter(enumerate(self.files))
+                pending = {}
+                in_flight = 0  # Estimated bytes of the images being converted
+                waiting = None  # Next (index, path, cost, source), held back by the memory budget
+                # Keep only a few tasks per worker queued so a cancel takes effect quickly
+                max_pending = self.workers * 2
+                while True:
+                    while not self.cancelled and len(pending) < max_pending:
+                        if waiting is None:
+                            nxt = next(queued, None)
+                            if nxt is None:
+                                break
+                            index, file_path = nxt
+                            if index in conflicts:
+                                self._record(index, ConvertResult(file_path, None, conflicts[index]))
+                                continue
+                            # The source's stat result and hash for the manifest, taken now: a
+                            # converted source that is not kept is gone afterwards
+                            source = None
+                            if manifests is not None:
+                                started = time.perf_counter()
+                                try:
+                                    st = os.stat(file_path)
+                                    if manifests.for_file(file_path).is_current(
+                                            file_path, self.target_ext, options, st=st, use_hash=self.use_hash):
+                                        self._record(index, ConvertResult(file_path, self.outputs(file_path)[0],
+                                                                          None, True))
+                                        continue
+                                    source = (st, hash_file(file_path) if self.use_hash else None)
+                                except OSError:
+                                    pass  # The conversion reports it
+                                finally:
+                                    if self.timed:
+                                        STATS.add("convert.manifest", time.perf_counter() - started)
+                            cost = 0
+                            if self.memory_limit:
+                                started = time.perf_counter()
+                                cost = estimate_memory(file_path, self.max_dimension, len(self.targets))
+                                if self.timed:
+                                    STATS.add("convert.estimate", time.perf_counter() - started)
+                            waiting = (index, file_path, cost, source)
+                        index, file_path, cost, source = waiting
+                        if self.memory_limit and pending and in_flight + cost > self.memory_limit:
+                            break
+                        waiting = None
+                        if self._single:
+                            future = pool.submit(convert_image, file_path, self.targets[0].format, self.keep_old,
+                                                 self.max_dimension, self.timed)
+                        else:
+                            future = pool.submit(convert_image_targets, file_path, self.targets, self.keep_old,
+                                                 self.max_dimension, self.timed)
+                        pending[future] = (index, file_path, cost, source)
+                        in_flight += cost
+                    if not pending:
+                        break
+                    done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                    for future in done:
+                        index, file_path, cost, source = pending.pop(future)
+                        in_flight -= cost
+                        try:
+                            result = future.result()
+                        except Exception as e:
+                            result = ConvertResult(file_path, None, str(e) or type(e).__name__)
+                        if source is not None and not result.error:
+                            st, sha256 = source
+                            outputs = result.outputs or (result.output,)
+                            if any(_same_path(path, file_path) for path in outputs):
+                                # Re-encoded in place: what a rerun finds is the rewritten file
+                                try:
+                                    st = os.stat(file_path)
+                                    sha256 = hash_file(file_path) if self.use_hash else None
+                                except OSError:
+                                    st = None
+                            if st is not None:
+                                manifests.for_file(file_path).record(file_path, outputs, self.target_ext, options,
+                                                                     st=st, sha256=sha256)
+                        self._record(index, result)
+        finally:
+            if manifests is not None:
+                manifests.close()
+            self.finished_at = time.monotonic()
+            self.finished = True
@@ -0,0 +1,289 @@
+import hashlib
+import json
+import os
+import threading
+import time
+from collections import namedtuple
+
+from organizer.appdirs import cache_dir
+from organizer.stats import STATS
+
+# Bytes hashed from each end of a file before committing to a full hash
+PARTIAL_BYTES = 4096
+# Fixed read buffer for full hashes
+BUFFER_SIZE = 1024 * 1024
+
+# A set of identical files, in list order; `size` is per file
+DuplicateGroup = namedtuple("DuplicateGroup", ["size", "digest", "paths"])
+
+
+def partial_hash(path, size, span=PARTIAL_BYTES):
+    # The first and last `span` bytes; for files up to 2 * span that is the whole
+    # file, so the result doubles as the full hash (see full_hash_needed)
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        digest.update(f.read(span))
+        if size > 2 * span:
+            f.seek(-span, os.SEEK_END)
+            digest.update(f.read(span))
+        elif size > span:
+            digest.update(f.read())
+    return digest.hexdigest()
+
+
+def full_hash_needed(size, span=PARTIAL_BYTES):
+    return size > 2 * span
+
+
+def full_hash(path, buffer_size=BUFFER_SIZE):
+    # Reads into one reused buffer instead of allocating a bytes object per chunk
+    digest = hashlib.sha256()
+    buffer = bytearray(buffer_size)
+    view = memoryview(buffer)
+    with open(path, "rb", buffering=0) as f:
+        while True:
+            n = f.readinto(buffer)
+            if not n:
+                break
+            digest.update(view[:n])
+    return digest.hexdigest()
+
+
+def default_cache_path():
+    return cache_dir("hashes.jsonl")
+
+
+class HashCache:
+    """Partial and full hashes from earlier runs, valid while a file's size and mtime hold.
+
+    Stored as JSON lines and appended to as hashes are computed; the newest line
+    per path wins and the file is rewritten once stale lines outnumber live ones.
+    """
+
+    def __init__(self, path=None):
+        self.path = path or default_cache_path()
+        self.records = {}  # path -> [size, mtime_ns, partial, full]
+        self._new = []
+        self._lock = threading.Lock()
+        self._load()
+
+    def _load(self):
+        lines = 0
+        try:
+            with open(self.path, encoding="utf-8") as f:
+                for line in f:
+                    lines += 1
+                    try:
+                        path, size, mtime_ns, partial, full = json.loads(line)
+                    except (ValueError, TypeError):
+                        continue
+                    self.records[path] = [size, mtime_ns, partial, full]
+        except OSError:
+            return
+        if lines > 2 * len(self.records) + 100:
+            self._compact()
+
+    def _compact(self):
+        temp_path = self.path + ".tmp"
+        try:
+            with open(temp_path, "w", encoding="utf-8") as f:
+                for path, record in self.records.items():
+                    f.write(json.dumps([path, *record]) + "\n")
+            os.replace(temp_path, self.path)
+        except OSError:
+            pass
+
+    def get(self, path, size, mtime_ns):
+        # (partial, full), either of which may be None
+        record = self.records.get(path)
+        if record is None or record[0] != size or record[1] != mtime_ns:
+            return None, None
+        return record[2], record[3]
+
+    def put(self, path, size, mtime_ns, partial=None, full=None):
+        with self._lock:
+            record = self.records.get(path)
+            if record is None or record[0] != size or record[1] != mtime_ns:
+                record = self.records[path] = [size, mtime_ns, None, None]
+            if partial is not None:
+                record[2] = partial
+            if full is not None:
+                record[3] = full
+            self._new.append(path)
+
+    def save(self):
+        with self._lock:
+            new = list(dict.fromkeys(self._new))
+            self._new = []
+        if not new:
+            return
+        try:
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            with open(self.path, "a", encoding="utf-8") as f:
+                for path in new:
+                    f.write(json.dumps([path, *self.records[path]]) + "\n")
+        except OSError:
+            pass
+
+
+class DuplicateSearch:
+    """Finds sets of identical files on a worker thread.
+
+    Files are grouped by size first, so a file with a unique size is never read.
+    Same-size files are compared by a hash of their first and last few KB, and
+    only those still matching are hashed in full. Hashing runs on a thread pool
+    (hashlib and file reads release the GIL). With use_cache, hashes are kept in
+    a HashCache (loaded on the worker thread) and reused while files are unchanged.
+    """
+
+    def __init__(self, paths, workers=None, use_cache=True, cache_path=None):
+        self.paths = list(paths)
+        self.workers = max(1, workers or min(8, (os.cpu_count() or 1) * 2))
+        self.use_cache = use_cache
+        self.cache_path = cache_path
+        self.cache = None
+        self.phase = "sizes"
+        self.total = 0  # Files to hash in the current phase
+        self.completed = 0
+        self.bytes_hashed = 0
+        self.groups = []
+        self.error = None
+        self.finished = False
+        self._cancel = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    def start(self):
+        self._thread.start()
+        return self
+
+    def cancel(self):
+        self._cancel.set()
+
+    @property
+    def cancelled(self):
+        return self._cancel.is_set()
+
+    def wait(self, timeout=None):
+        self._thread.join(timeout)
+        return self.finished
+
+    def _hash_all(self, phase, files, compute, slot):
+        # files: (path, size, mtime_ns) tuples; returns {path: digest}, leaving out
+        # files that could not be read
+        from concurrent.futures import ThreadPoolExecutor
+
+        self.phase = phase
+        self.total = len(files)
+        self.completed = 0
+        digests = {}
+        todo = []
+        for path, size, mtime_ns in files:
+            cached = self.cache.get(path, size, mtime_ns)[slot] if self.cache is not None else None
+            if cached is not None:
+                digests[path] = cached
+                self.completed += 1
+            else:
+                todo.append((path, size, mtime_ns))
+
+        timed = STATS.enabled
+
+        def work(item):
+            if self.cancelled:
+                return item, None
+            path, size, _ = item
+            started = time.perf_counter()
+            try:
+                digest = compute(path, size)
+            except OSError:
+                return item, None
+            if timed:
+                read = min(size, 2 * PARTIAL_BYTES) if phase == "partial" else size
+                STATS.add(f"duplicates.{phase}", time.perf_counter() - started, read)
+            return item, digest
+
+        with ThreadPoolExecutor(max_workers=self.workers) as pool:
+            for (path, size, mtime_ns), digest in pool.map(work, todo):
+                self.completed += 1
+                if digest is None:
+                    continue
+                digests[path] = digest
+                self.bytes_hashed += min(size, 2 * PARTIAL_BYTES) if phase == "partial" else size
+                if self.cache is not None:
+                    if phase == "partial":
+                        full = digest if not full_hash_needed(size) else None
+                        self.cache.put(path, size, mtime_ns, partial=digest, full=full)
+                    else:
+                        self.cache.put(path, size, mtime_ns, full=digest)
+        return digests
+
+    def _run(self):
+        try:
+            if self.use_cache:
+                self.cache = HashCache(self.cache_path)
+            by_size = {}
+            for path in self.paths:
+                if self.cancelled:
+                    return
+                try:
+                    st = os.stat(path)
+                except OSError:
+                    continue
+                by_size.setdefault(st.st_size, []).append((path, st.st_size, st.st_mtime_ns))
+            candidates = [files for files in by_size.values() if len(files) > 1]
+
+            # Empty files are identical without reading them
+            groups = {}
+            partial_todo = []
+            for files in candidates:
+                if files[0][1] == 0:
+                    groups[(0, "")] = [path for path, _, _ in files]
+                else:
+                    partial_todo.extend(files)
+
+            partials = self._hash_all("partial", partial_todo, partial_hash, 0)
+            if self.cancelled:
+                return
+            by_partial = {}
+            for item in partial_todo:
+                digest = partials.get(item[0])
+                if digest is not None:
+                    by_partial.setdefault((item[1], digest), []).append(item)
+
+            full_todo = []
+            for (size, digest), files in by_partial.items():
+                if len(files) < 2:
+                    continue
+                if full_hash_needed(size):
+                    full_todo.extend(files)
+                else:
+                    groups[(size, digest)] = [path for path, _, _ in files]
+
+            fulls = self._hash_all("full", full_todo, lambda path, size: full_hash(path), 1)
+            if self.cancelled:
+                return
+            for path, size, _ in full_todo:
+                digest = fulls.get(path)
+                if digest is not None:
+                    groups.setdefault((size, digest), []).append(path)
+
+            # Groups ordered by where their first file sits in the list
+            position = {path: i for i, path in enumerate(self.paths)}
+            found = [DuplicateGroup(size, digest, sorted(paths, key=position.__getitem__))
+                     for (size, digest), paths in groups.items() if len(paths) > 1]
+            found.sort(key=lambda group: position[group.paths[0]])
+            self.groups = found
+        except Exception as e:
+            self.error = str(e) or type(e).__name__
+        finally:
+            if self.cache is not None:
+                self.cache.save()
+            self.phase = "done"
+            self.finished = True
+
+    @property
+    def redundant_files(self):
+        return sum(len(group.paths) - 1 for group in self.groups)
+
+    @property
+    def redundant_bytes(self):
+        return sum(group.size * (len(group.paths) - 1) for group in self.groups)
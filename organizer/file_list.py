@@ -0,0 +1,277 @@
+import os
+import re
+import stat
+import time
+from collections import namedtuple
+
+from organizer.stats import STATS
+
+# Stat data captured once when a file is added, so sorting never touches the disk
+FileInfo = namedtuple("FileInfo", ["size", "mtime", "ctime"])
+
+SORT_FIELDS = ("name", "ext", "size", "mtime", "ctime")
+
+_DIGITS_RE = re.compile(r"(\d+)")
+
+
+def natural_key(text):
+    # "file2" < "file10": digit runs compare as numbers. re.split with a capturing
+    # group puts the digit runs at the odd positions.
+    parts = _DIGITS_RE.split(text.lower())
+    for i in range(1, len(parts), 2):
+        parts[i] = int(parts[i])
+    return tuple(parts)
+
+
+def stat_info(path):
+    try:
+        st = os.stat(path)
+    except OSError:
+        return None
+    if not stat.S_ISREG(st.st_mode):
+        return None
+    return FileInfo(st.st_size, st.st_mtime, st.st_ctime)
+
+
+def collect_info(paths):
+    # Fresh stat data for every path; missing files are left out
+    info = {}
+    for path in paths:
+        file_info = stat_info(path)
+        if file_info is not None:
+            info[path] = file_info
+    return info
+
+
+class FileListModel:
+    """Plain, ordered list of file paths backing a SortableFileList."""
+
+    def __init__(self, allowed_extensions=None):
+        self.allowed_extensions = [ext.lower() for ext in allowed_extensions] if allowed_extensions else None
+        self.paths = []
+        # path -> FileInfo, captured when the file was added or on refresh_metadata()
+        self.info = {}
+        # Normalized real paths of everything in the list, so the same file reached
+        # through a symlink, a different case or ".." segments is only added once
+        self._keys = set()
+        # field -> {path: sort key}, filled on first sort by that field
+        self._sort_keys = {}
+        # sort spec -> resulting order, valid until files are added or removed, so
+        # sorting again by a spec already used is a plain list copy
+        self._orders = {}
+        # Bumped on every change to the list, so views can tell cached data is stale
+        self.version = 0
+        # What saving the list as a session needs to rescan only what changed (see
+        # organizer.sessions): the scanned folders -> (scan mode, ScanFilter), every
+        # directory listed under them -> (mtime_ns, depth, root), and the files
+        # removed by hand from those directories
+        self.roots = {}
+        self.directories = {}
+        self.removed = set()
+
+    def __len__(self):
+        return len(self.paths)
+
+    def __getitem__(self, index):
+        return self.paths[index]
+
+    @staticmethod
+    def path_key(path):
+        return os.path.normcase(os.path.realpath(path))
+
+    def has_allowed_extension(self, path):
+        if not self.allowed_extensions:
+            return True
+        _, ext = os.path.splitext(path)
+        return ext.lower() in self.allowed_extensions
+
+    def is_valid_file(self, path):
+        return self.has_allowed_extension(path) and os.path.isfile(path)
+
+    def __contains__(self, path):
+        return self.path_key(path) in self._keys
+
+    def has_key(self, key):
+        # Whether a file with this path_key() is in the list
+        return key in self._keys
+
+    def add(self, path):
+        return self.add_many((path,)) == 1
+
+    def add_many(self, paths):
+        # Cheapest checks first: the extension costs nothing, the key a realpath, and
+        # a single stat both checks for a regular file and captures its metadata.
+        # Returns how many paths were appended.
+        added = 0
+        keys = self._keys
+        timed = STATS.enabled
+        for path in paths:
+            if not self.has_allowed_extension(path):
+                continue
+            key = self.path_key(path)
+            if key in keys:
+                continue
+            if timed:
+                started = time.perf_counter()
+                file_info = stat_info(key)
+                STATS.add("list.stat", time.perf_counter() - started)
+            else:
+                file_info = stat_info(key)
+            if file_info is None:
+                continue
+            keys.add(key)
+            self.paths.append(path)
+            self.info[path] = file_info
+            added += 1
+        if added:
+            self._orders = {}
+            self.version += 1
+        return added
+
+    def add_scanned(self, entries):
+        # Entries from the folder scanner are already filtered and known to be files,
+        # and carry their key and stat data, so this is pure bookkeeping.
+        added = 0
+        keys = self._keys
+        info = self.info
+        removed = self.removed
+        for path, key, size, mtime, ctime in entries:
+            if key in keys:
+                continue
+            if removed:
+                # Added back by hand
+                removed.discard(path)
+            keys.add(key)
+            self.paths.append(path)
+            info[path] = FileInfo(size, mtime, ctime)
+            added += 1
+        if added:
+            self._orders = {}
+            self.version += 1
+        return added
+
+    def add_directories(self, root, mode, directories, scan_filter=None):
+        # Records a finished scan of `root`, with the directories FolderScan listed
+        self.roots[root] = (mode, scan_filter)
+        for directory, mtime_ns, depth in directories:
+            self.directories[directory] = (mtime_ns, depth, root)
+
+    def clear(self):
+        self.paths = []
+        self.info = {}
+        self._keys = set()
+        self.roots = {}
+        self.directories = {}
+        self.removed = set()
+        self._sort_keys = {}
+        self._orders = {}
+        self.version += 1
+
+    def remove(self, indices):
+        # Drops the rows at `indices` in one pass and returns how many were removed
+        drop = {i for i in indices if 0 <= i < len(self.paths)}
+        if not drop:
+            return 0
+        kept = []
+        for i, path in enumerate(self.paths):
+            if i in drop:
+                if self.directories:
+                    self.removed.add(path)
+                self._keys.discard(self.path_key(path))
+                self.info.pop(path, None)
+                for keys in self._sort_keys.values():
+                    keys.pop(path, None)
+            else:
+                kept.append(path)
+        self.paths = kept
+        self._orders = {}
+        self.version += 1
+        return len(drop)
+
+    def update_info(self, info):
+        # Replaces the cached stat data, e.g. with the result of collect_info()
+        self.info = info
+        for field in ("size", "mtime", "ctime"):
+            self._sort_keys.pop(field, None)
+        self._orders = {}
+        self.version += 1
+
+    def refresh_metadata(self):
+        self.update_info(collect_info(self.paths))
+
+    def move(self, src_index, dst_index):
+        path = self.paths.pop(src_index)
+        self.paths.insert(dst_index, path)
+        self.version += 1
+
+    def move_block(self, indices, start):
+        # Moves the rows at `indices` together, keeping their relative order, so the
+        # first of them lands at `start`. Returns the range of their new indices.
+        indices = sorted(indices)
+        count = len(indices)
+        first = indices[0]
+        if indices[-1] - first + 1 == count:
+            # Contiguous block (the usual case): slice operations, no Python-level loop
+            block = self.paths[first:first + count]
+            del self.paths[first:first + count]
+        else:
+            chosen = set(indices)
+            block = [self.paths[i] for i in indices]
+            self.paths[:] = [p for i, p in enumerate(self.paths) if i not in chosen]
+        start = min(max(start, 0), len(self.paths))
+        self.paths[start:start] = block
+        self.version += 1
+        return range(start, start + count)
+
+    def reverse(self):
+        self.paths.reverse()
+        self.version += 1
+
+    def _make_sort_key(self, field):
+        if field == "name":
+            return lambda p: natural_key(os.path.basename(p))
+        if field == "ext":
+            return lambda p: os.path.splitext(p)[1].lower()
+        if field not in SORT_FIELDS:
+            raise ValueError(f"Unknown sort field: {field}")
+        # Missing files sort first, as if their value was 0
+        position = FileInfo._fields.index(field)
+        info = self.info
+        return lambda p: info[p][position] if p in info else 0
+
+    def _sort_key_map(self, field):
+        keys = self._sort_keys.get(field)
+        if keys is None:
+            keys = self._sort_keys[field] = {}
+        if len(keys) != len(self.paths):
+            make_key = self._make_sort_key(field)
+            for path in self.paths:
+                if path not in keys:
+                    keys[path] = make_key(path)
+        return keys
+
+    def sort(self, keys, max_cached_orders=8):
+        # keys: [(field, descending), ...], most significant first. Sorts are stable,
+        # so sorting by each key from the least significant one up gives the
+        # multi-key order; every key is a cached dict lookup, with no disk access.
+        spec = tuple((field, bool(descending)) for field, descending in keys)
+        order = self._orders.get(spec)
+        if order is None:
+            order = list(self.paths)
+            for field, descending in reversed(spec):
+                order.sort(key=self._sort_key_map(field).__getitem__, reverse=descending)
+            if len(self._orders) >= max_cached_orders:
+                self._orders = {}
+            self._orders[spec] = order
+        self.reorder(order)
+
+    def reorder(self, order):
+        # `order` must hold exactly the paths already in the list
+        self.paths[:] = order
+        self.version += 1
+
+    def sort_by_name(self, descending=False):
+        self.sort([("name", descending)])
+
+    def sort_by_date(self, descending=False):
+        self.sort([("mtime", descending)])
@@ -0,0 +1,79 @@
+import errno
+import os
+import shutil
+
+
+def copy_file(src, dst):
+    """Copies contents and metadata, letting the kernel move the bytes where it can.
+
+    copy_file_range (Linux, and server-side copies on NFS 4.2/CIFS) or sendfile
+    avoid bouncing the data through user space; anything else falls back to
+    shutil.copy2.
+    """
+    copy_range = getattr(os, "copy_file_range", None)
+    sendfile = getattr(os, "sendfile", None)
+    if copy_range is None and sendfile is None:
+        shutil.copy2(src, dst)
+        return
+    with open(src, "rb") as fsrc, open(dst, "wb") as fdst:
+        infd, outfd = fsrc.fileno(), fdst.fileno()
+        remaining = os.fstat(infd).st_size
+        offset = 0
+        chunk = 1 << 30
+        while remaining > 0:
+            try:
+                if copy_range is not None:
+                    sent = copy_range(infd, outfd, min(chunk, remaining))
+                else:
+                    sent = sendfile(outfd, infd, offset, min(chunk, remaining))
+            except OSError as e:
+                if offset == 0 and copy_range is not None and e.errno in (errno.EXDEV, errno.ENOSYS, errno.EINVAL,
+                                                                          errno.EOPNOTSUPP):
+                    # Older kernels refuse copy_file_range across filesystems
+                    copy_range = None
+                    if sendfile is None:
+                        break
+                    continue
+                raise
+            if sent == 0:
+                break
+            offset += sent
+            remaining -= sent
+        if remaining > 0:
+            fsrc.seek(offset)
+            fdst.seek(offset)
+            shutil.copyfileobj(fsrc, fdst, 1024 * 1024)
+    shutil.copystat(src, dst)
+
+
+class FileMover:
+    """Moves files with os.rename, falling back to copy and delete across devices.
+
+    Which (source folder, target folder) pairs are on different devices is
+    remembered, so a batch pays for at most one failed rename per folder pair.
+    """
+
+    def __init__(self):
+        self._cross_device = set()
+
+    def __call__(self, src, dst):
+        pair = (os.path.dirname(src), os.path.dirname(dst))
+        if pair not in self._cross_device:
+            try:
+                os.rename(src, dst)
+                return
+            except OSError as e:
+                if e.errno != errno.EXDEV:
+                    raise
+                self._cross_device.add(pair)
+        # Like os.rename on POSIX, an existing target is replaced (e.g. a partial copy
+        # left by a crash); planners make sure targets are free
+        try:
+            copy_file(src, dst)
+        except BaseException:
+            try:
+                os.remove(dst)
+            except OSError:
+                pass
+            raise
+        os.remove(src)
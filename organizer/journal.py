@@ -0,0 +1,397 @@
+import json
+import os
+import time
+import uuid
+from collections import namedtuple
+
+from organizer.appdirs import state_dir
+from organizer.fileops import FileMover
+from organizer.stats import STATS
+
+STATUS_COMPLETE = "complete"
+STATUS_ROLLED_BACK = "rolled_back"
+# The batch failed and some of its renames could not be undone
+STATUS_ROLLBACK_INCOMPLETE = "rollback_incomplete"
+STATUS_UNDONE = "undone"
+
+# ops: every (from, to) rename of the batch in order; done: how many of them are
+# in effect as of the last sync; status: None while the batch is unfinished (e.g.
+# after a crash); undoing: whether the progress counts were going down (an undo
+# or a rollback) rather than up; skipped: indexes of the ops a resume left alone
+# because their destination was taken
+JournalState = namedtuple("JournalState", ["path", "created", "files", "ops", "done", "status", "undoing",
+                                           "skipped"])
+# kind: what the batch did, "rename" or "move"
+JournalSummary = namedtuple("JournalSummary", ["files", "status", "kind"])
+
+
+class RollbackError(OSError):
+    """A batch failed and the rollback left `unreversed` renames in place.
+
+    Raised from the original error, which is its __cause__.
+    """
+
+    def __init__(self, error, unreversed):
+        super().__init__(f"{error} ({unreversed} files could not be put back)")
+        self.unreversed = unreversed
+
+
+def default_journal_dir():
+    return state_dir("journals")
+
+
+class RenameJournal:
+    """Append-only JSON-lines log of one rename batch.
+
+    The full list of renames is written and synced before the first file moves.
+    After that, only a running count of completed renames is appended, in groups
+    (every `flush_every` renames or `flush_interval` seconds), so throughput stays
+    close to plain os.rename. After a crash, at most the last group is uncertain,
+    and resuming or undoing checks those renames against the disk (see
+    _SyncWindow and settled_done()).
+    """
+
+    def __init__(self, path, flush_every=1000, flush_interval=1.0, chunk_size=5000):
+        self.path = path
+        self.flush_every = flush_every
+        self.flush_interval = flush_interval
+        self.chunk_size = chunk_size
+        self._file = None
+        self._pending = None
+        self._last_flush = time.monotonic()
+
+    @classmethod
+    def create(cls, directory=None, keep=50, **kwargs):
+        directory = directory or default_journal_dir()
+        os.makedirs(directory, exist_ok=True)
+        _prune(directory, keep)
+        # Sortable by creation time, newest last
+        now = time.time_ns()
+        stamp = time.strftime("%Y%m%d-%H%M%S", time.localtime(now // 10**9))
+        name = f"{stamp}-{now % 10**9:09d}-{uuid.uuid4().hex[:4]}.jsonl"
+        return cls(os.path.join(directory, name), **kwargs)
+
+    def _write(self, record, sync=False):
+        if self._file is None:
+            self._file = open(self.path, "a", encoding="utf-8")
+        self._file.write(json.dumps(record) + "\n")
+        if sync:
+            started = time.perf_counter() if STATS.enabled else None
+            self._file.flush()
+            os.fsync(self._file.fileno())
+            self._last_flush = time.monotonic()
+            if started is not None:
+                STATS.add("rename.journal_sync", time.perf_counter() - started)
+
+    def begin(self, ops, files=None, kind="rename"):
+        self._write({"type": "begin", "created": time.time(), "kind": kind, "files": files or len(ops),
+                     "ops": len(ops)})
+        for i in range(0, len(ops), self.chunk_size):
+            self._write({"type": "ops", "ops": ops[i:i + self.chunk_size]})
+        self._write({"type": "progress", "done": 0}, sync=True)
+
+    def progress(self, done, force=False):
+        # Returns whether the count was synced to disk
+        self._pending = done
+        if force or done % self.flush_every == 0 or time.monotonic() - self._last_flush >= self.flush_interval:
+            self._write({"type": "progress", "done": done}, sync=True)
+            self._pending = None
+            return True
+        return False
+
+    def start_pass(self, done, undo):
+        # Progress counts from `done` on go down (undo) or up (resume)
+        self._pending = None
+        self._write({"type": "undo" if undo else "resume"})
+        self._write({"type": "progress", "done": done}, sync=True)
+
+    def skip(self, index):
+        # Op `index` was left alone; counted as passed, so the count moves on
+        self._pending = None
+        self._write({"type": "skipped", "op": index})
+        self._write({"type": "progress", "done": index + 1}, sync=True)
+
+    def finish(self, status):
+        if self._pending is not None:
+            self._write({"type": "progress", "done": self._pending})
+            self._pending = None
+        self._write({"type": "status", "status": status}, sync=True)
+        self.close()
+
+    def close(self):
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+
+def load_journal(path):
+    created = None
+    files = 0
+    expected = 0
+    ops = []
+    done = 0
+    status = None
+    undoing = False
+    skipped = set()
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            try:
+                record = json.loads(line)
+            except ValueError:
+                continue  # Torn last line
+            kind = record.get("type")
+            if kind == "begin":
+                created = record.get("created")
+                files = record.get("files", 0)
+                expected = record.get("ops", 0)
+            elif kind == "ops":
+                ops.extend(tuple(op) for op in record["ops"])
+            elif kind == "progress":
+                done = record["done"]
+            elif kind == "status":
+                status = record["status"]
+            elif kind in ("undo", "resume"):
+                undoing = kind == "undo"
+            elif kind == "skipped":
+                skipped.add(record["op"])
+    if len(ops) != expected:
+        # The plan itself never finished writing, so no file was touched
+        return JournalState(path, created, files, [], 0, STATUS_ROLLED_BACK, False, frozenset())
+    return JournalState(path, created, files, ops, done, status, undoing, frozenset(skipped))
+
+
+def _in_effect(op):
+    src, dst = op
+    return os.path.lexists(dst) and not os.path.lexists(src)
+
+
+def _reversed(op):
+    src, dst = op
+    return os.path.lexists(src) and not os.path.lexists(dst)
+
+
+def settled_done(state):
+    """How many ops of an unfinished batch are really in effect.
+
+    The journal count can lag behind by the renames since its last sync. No path
+    is renamed twice in that stretch (see _SyncWindow), so each of those renames
+    can be checked on its own: moving on from the synced count, a rename has run
+    when its source is gone and its destination exists, and an undo has reversed
+    it when the opposite holds.
+    """
+    ops = state.ops
+    done = state.done
+    skipped = state.skipped
+    if state.undoing:
+        while done > 0 and (done - 1 in skipped or _reversed(ops[done - 1])):
+            done -= 1
+    else:
+        while done < len(ops) and (done in skipped or _in_effect(ops[done])):
+            done += 1
+    return done
+
+
+def journal_summary(path):
+    """JournalSummary of a journal, from its first and last lines only.
+
+    Journals of big batches run to many megabytes, so listing them does not parse
+    the recorded renames.
+    """
+    with open(path, "rb") as f:
+        try:
+            header = json.loads(f.readline())
+        except ValueError:
+            header = {}
+        f.seek(0, os.SEEK_END)
+        f.seek(max(0, f.tell() - 4096))
+        lines = f.read().splitlines()
+    status = None
+    if lines:
+        try:
+            status = json.loads(lines[-1]).get("status")
+        except ValueError:
+            pass
+    return JournalSummary(header.get("files", 0), status, header.get("kind", "rename"))
+
+
+def list_journals(directory=None):
+    # Newest first
+    directory = directory or default_journal_dir()
+    try:
+        names = sorted((n for n in os.listdir(directory) if n.endswith(".jsonl")), reverse=True)
+    except OSError:
+        return []
+    return [os.path.join(directory, name) for name in names]
+
+
+def _prune(directory, keep):
+    for path in list_journals(directory)[keep:]:
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+
+
+class _SyncWindow:
+    """Paths renamed since the journal last synced its progress count.
+
+    A path renamed twice in one unsynced stretch (a file parked under a temporary
+    name and moved on, a name freed and taken again) leaves the disk ambiguous
+    after a crash: a half-done swap looks like one never started. So the count is
+    synced before an op reuses a path, and every op after the last sync can be
+    checked against the disk on its own.
+    """
+
+    def __init__(self, journal):
+        self.journal = journal
+        self.paths = set()
+
+    def before(self, done, src, dst):
+        if self.journal is None:
+            return
+        paths = self.paths
+        src, dst = os.path.normcase(src), os.path.normcase(dst)
+        if src in paths or dst in paths:
+            self.journal.progress(done, force=True)
+            paths.clear()
+        paths.add(src)
+        paths.add(dst)
+
+    def after(self, done):
+        if self.journal is not None and self.journal.progress(done):
+            self.paths.clear()
+
+
+def run_operations(ops, journal=None, start=0, resuming=False, skipped=()):
+    """Performs ops[start:] in order and returns how many ops are in effect.
+
+    Each op is an os.rename, or a copy and delete when it crosses devices. On an
+    error, everything performed so far in this batch is undone and the error
+    re-raised; if some renames could not be undone, a RollbackError is raised
+    from it instead.
+
+    When resuming, the disk may have changed since the batch was planned: an op
+    whose destination is taken is skipped rather than replacing that file, and
+    so is any later op that would move on the file it was to put there. Skipped
+    ops (with those in `skipped`, from earlier passes) are left out of an undo.
+    """
+    done = start
+    timed = STATS.enabled
+    perf_counter = time.perf_counter
+    move = FileMover()
+    window = _SyncWindow(journal)
+    skipped = set(skipped)
+    blocked = set()  # Paths where a skipped op was to put a file
+    normcase = os.path.normcase
+    try:
+        for i in range(start, len(ops)):
+            src, dst = ops[i]
+            if resuming and (normcase(src) in blocked or os.path.lexists(dst)):
+                blocked.add(normcase(dst))
+                skipped.add(i)
+                done = i + 1
+                if journal is not None:
+                    journal.skip(i)
+                    window.paths.clear()
+                continue
+            window.before(done, src, dst)
+            if timed:
+                started = perf_counter()
+                move(src, dst)
+                STATS.add("rename.move", perf_counter() - started)
+            else:
+                move(src, dst)
+            done = i + 1
+            window.after(done)
+    except Exception as e:
+        unreversed = undo_operations(ops, done, journal, skipped)
+        if journal is not None:
+            journal.finish(STATUS_ROLLBACK_INCOMPLETE if unreversed else STATUS_ROLLED_BACK)
+        if unreversed:
+            raise RollbackError(e, unreversed) from e
+        raise
+    if journal is not None:
+        journal.finish(STATUS_COMPLETE)
+    return done
+
+
+def undo_operations(ops, done, journal=None, skipped=()):
+    """Reverses ops[:done], last first, and returns how many could not be reversed.
+
+    A rename is only reversed while its destination exists and its original name
+    is free; nothing is ever moved onto an existing path. Ops in `skipped` never
+    ran and are passed over.
+    """
+    failed = 0
+    move = FileMover()
+    window = _SyncWindow(journal)
+    if journal is not None:
+        journal.start_pass(done, undo=True)
+    for i in range(done - 1, -1, -1):
+        src, dst = ops[i]
+        window.before(i + 1, dst, src)
+        if i in skipped:
+            pass
+        elif os.path.lexists(src):
+            if os.path.lexists(dst):
+                failed += 1  # Something else took its old name since
+            # Otherwise already reversed by an undo that was interrupted
+        else:
+            try:
+                move(dst, src)
+            except OSError:
+                failed += 1  # Gone or changed since
+        window.after(i)
+    return failed
+
+
+def resume_journal(path):
+    """Finishes an interrupted batch and returns its JournalState afterwards.
+
+    Ops whose destination was taken since are skipped (see run_operations); the
+    state's `skipped` lists them. An undo that was cut short is finished as an
+    undo: the files it had not put back yet are put back.
+    """
+    state = load_journal(path)
+    if state.status is not None:
+        return state
+    if state.undoing:
+        undo_journal(path)
+        return load_journal(path)
+    done = settled_done(state)
+    journal = RenameJournal(path)
+    try:
+        journal.start_pass(done, undo=False)
+        run_operations(state.ops, journal, start=done, resuming=True, skipped=state.skipped)
+    finally:
+        journal.close()
+    return load_journal(path)
+
+
+def undo_journal(path):
+    """Puts every file of a batch back under its original name, in one pass.
+
+    Returns the number of renames that could not be reversed.
+    """
+    state = load_journal(path)
+    if state.status in (STATUS_ROLLED_BACK, STATUS_UNDONE):
+        return 0
+    done = state.done if state.status is not None else settled_done(state)
+    journal = RenameJournal(path)
+    try:
+        failed = undo_operations(state.ops, done, journal, state.skipped)
+        journal.finish(STATUS_UNDONE)
+    finally:
+        journal.close()
+    return failed
+
+
+def interrupted_journals(directory=None):
+    return [path for path in list_journals(directory) if journal_summary(path).status is None]
+
+
+def last_undoable_journal(directory=None):
+    for path in list_journals(directory):
+        if journal_summary(path).status in (None, STATUS_COMPLETE):
+            return path
+    return None
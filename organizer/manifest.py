@@ -0,0 +1,162 @@
+import hashlib
+import json
+import os
+import time
+
+MANIFEST_NAME = ".organizer-manifest.jsonl"
+
+
+def hash_file(path, chunk_size=1024 * 1024):
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+class ConversionManifest:
+    """Record of finished conversions for one output directory.
+
+    Stored as JSON lines, one per converted source, appended as files finish, so a
+    crashed or cancelled batch can be resumed: everything recorded is skipped and
+    a torn last line is ignored. When a source is converted again its newer line
+    wins; the file is rewritten compactly once stale lines outnumber live ones.
+    """
+
+    def __init__(self, directory, flush_every=50, flush_interval=1.0):
+        self.directory = directory
+        self.path = os.path.join(directory, MANIFEST_NAME)
+        self.flush_every = flush_every
+        self.flush_interval = flush_interval
+        self.records = {}  # (source name, options key) -> record
+        self._file = None
+        self._unflushed = 0
+        self._last_flush = time.monotonic()
+        self._load()
+
+    @staticmethod
+    def options_key(target_ext, options):
+        return json.dumps([target_ext, options or {}], sort_keys=True)
+
+    def _load(self):
+        lines = 0
+        try:
+            with open(self.path, encoding="utf-8") as f:
+                for line in f:
+                    lines += 1
+                    try:
+                        record = json.loads(line)
+                        self.records[(record["source"], record["options_key"])] = record
+                    except (ValueError, KeyError, TypeError):
+                        continue
+        except FileNotFoundError:
+            return
+        except OSError:
+            return
+        if lines > 2 * len(self.records) + 100:
+            self._compact()
+
+    def _compact(self):
+        temp_path = self.path + ".tmp"
+        try:
+            with open(temp_path, "w", encoding="utf-8") as f:
+                for record in self.records.values():
+                    f.write(json.dumps(record) + "\n")
+            os.replace(temp_path, self.path)
+        except OSError:
+            pass
+
+    def is_current(self, source_path, target_ext, options=None, st=None, use_hash=False):
+        """Whether source_path was already converted with these settings and is unchanged.
+
+        `st` may be passed in when the caller already has the source's stat result.
+        """
+        key = (os.path.basename(source_path), self.options_key(target_ext, options))
+        record = self.records.get(key)
+        if record is None:
+            return False
+        # Lines written before multi-target jobs have a single "output"
+        outputs = record.get("outputs") or [record["output"]]
+        if not all(os.path.exists(os.path.join(self.directory, name)) for name in outputs):
+            return False
+        try:
+            st = st or os.stat(source_path)
+        except OSError:
+            return False
+        if st.st_size != record["size"]:
+            return False
+        if st.st_mtime_ns == record["mtime_ns"]:
+            return True
+        # Touched but maybe not changed: the content hash settles it
+        if use_hash and record.get("sha256"):
+            try:
+                if hash_file(source_path) != record["sha256"]:
+                    return False
+            except OSError:
+                return False
+            # Remember the new mtime so the next run doesn't hash it again
+            self._append(dict(record, mtime_ns=st.st_mtime_ns))
+            return True
+        return False
+
+    def record(self, source_path, outputs, target_ext, options=None, st=None, sha256=None):
+        """Notes that source_path was converted into every path in `outputs`.
+
+        `st` (and `sha256`, for use_hash checks) describe the source as it was
+        converted: take them before converting, since a source that is not kept
+        is gone afterwards.
+        """
+        try:
+            st = st or os.stat(source_path)
+        except OSError:
+            return
+        record = {
+            "source": os.path.basename(source_path),
+            "outputs": [os.path.basename(path) for path in outputs],
+            "options_key": self.options_key(target_ext, options),
+            "size": st.st_size,
+            "mtime_ns": st.st_mtime_ns,
+        }
+        if sha256:
+            record["sha256"] = sha256
+        self._append(record)
+
+    def _append(self, record):
+        self.records[(record["source"], record["options_key"])] = record
+        if self._file is None:
+            self._file = open(self.path, "a", encoding="utf-8")
+        self._file.write(json.dumps(record) + "\n")
+        self._unflushed += 1
+        # Flushed in groups rather than per file; a crash costs at most one group
+        # being converted again
+        if self._unflushed >= self.flush_every or time.monotonic() - self._last_flush >= self.flush_interval:
+            self.flush()
+
+    def flush(self):
+        if self._file is not None and self._unflushed:
+            self._file.flush()
+            self._unflushed = 0
+        self._last_flush = time.monotonic()
+
+    def close(self):
+        if self._file is not None:
+            self.flush()
+            self._file.close()
+            self._file = None
+
+
+class ManifestStore:
+    # One manifest per output directory, opened on first use
+    def __init__(self):
+        self._manifests = {}
+
+    def for_file(self, file_path):
+        directory = os.path.dirname(os.path.abspath(file_path))
+        manifest = self._manifests.get(directory)
+        if manifest is None:
+            manifest = self._manifests[directory] = ConversionManifest(directory)
+        return manifest
+
+    def close(self):
+        for manifest in self._manifests.values():
+            manifest.close()
@@ -0,0 +1,271 @@
+"""Per-file metadata for rename templates: capture date, camera and image size.
+
+Only image headers are read: Pillow opens files lazily, so the size and EXIF
+tags come from the first few kilobytes and no pixel data is decoded. Reads run
+on a thread pool and are cached per path, size and mtime, in memory and as JSON
+lines under the user cache directory, so redrawing a rename preview, or
+renaming the same photos again later, does not reopen them.
+"""
+import json
+import os
+import threading
+import time
+from collections import OrderedDict, namedtuple
+
+from organizer.appdirs import cache_dir
+from organizer.file_list import stat_info
+from organizer.stats import STATS
+
+# What a header read finds; any field may be None. exif_date is a timestamp
+ImageMetadata = namedtuple("ImageMetadata", ["exif_date", "make", "model", "width", "height"])
+NO_METADATA = ImageMetadata(None, None, None, None, None)
+
+# Everything a template token can use for one file: stat data plus, when the
+# template asks for it, the header fields (None when not read)
+FileFields = namedtuple("FileFields", ["info", "image"])
+
+_EXIF_IFD = 0x8769
+_DATE_TIME_ORIGINAL = 0x9003
+_DATE_TIME = 0x0132
+_MAKE = 0x010F
+_MODEL = 0x0110
+_ORIENTATION = 0x0112
+
+
+def default_cache_path():
+    return cache_dir("metadata.jsonl")
+
+
+def exif_timestamp(value):
+    # "YYYY:MM:DD HH:MM:SS" as a local timestamp, or None
+    if not value:
+        return None
+    try:
+        return time.mktime(time.strptime(str(value).strip("\x00 ")[:19], "%Y:%m:%d %H:%M:%S"))
+    except (ValueError, OverflowError):
+        return None
+
+
+def _text(value):
+    if value is None:
+        return None
+    if isinstance(value, bytes):
+        value = value.decode("latin-1")
+    value = " ".join(str(value).replace("\x00", " ").split())
+    return value or None
+
+
+def read_metadata(path):
+    """ImageMetadata from the file header; NO_METADATA for files Pillow cannot open."""
+    from PIL import Image
+
+    try:
+        with Image.open(path) as img:
+            width, height = img.size
+            exif = img.getexif()
+            date = exif.get_ifd(_EXIF_IFD).get(_DATE_TIME_ORIGINAL) or exif.get(_DATE_TIME)
+            make = _text(exif.get(_MAKE))
+            model = _text(exif.get(_MODEL))
+            if exif.get(_ORIENTATION) in (5, 6, 7, 8):
+                # Shown rotated by a quarter turn
+                width, height = height, width
+    except Exception:
+        return NO_METADATA
+    return ImageMetadata(exif_timestamp(date), make, model, width, height)
+
+
+class MetadataCache:
+    """Header metadata for many files, read once per file version.
+
+    load() reads everything missing for a batch in parallel and blocks; lookup()
+    hands out a per-file accessor for name templates. A non-waiting accessor
+    never touches the disk for headers: it notes the files it could not answer
+    for, and request_missed() reads those in the background, newest request
+    first, for a preview to pick up with updated().
+    """
+
+    def __init__(self, path=None, use_disk=True, workers=None):
+        self.path = (path or default_cache_path()) if use_disk else None
+        self.workers = max(1, workers or min(8, (os.cpu_count() or 1) * 2))
+        self.records = None  # path -> (size, mtime, ImageMetadata), loaded on first use
+        self._new = []
+        self._missed = OrderedDict()  # key -> None, asked for by a non-waiting lookup
+        self._wanted = OrderedDict()
+        self._running = 0
+        self._updated = False
+        self._lock = threading.Lock()
+        self._pool = None
+
+    def _records(self):
+        # With the lock held
+        if self.records is None:
+            self.records = {}
+            lines = 0
+            if self.path is not None:
+                try:
+                    with open(self.path, encoding="utf-8") as f:
+                        for line in f:
+                            lines += 1
+                            try:
+                                path, size, mtime, *fields = json.loads(line)
+                                self.records[path] = (size, mtime, ImageMetadata(*fields))
+                            except (ValueError, TypeError):
+                                continue
+                except OSError:
+                    pass
+                if lines > 2 * len(self.records) + 100:
+                    self._compact()
+        return self.records
+
+    def _compact(self):
+        temp_path = self.path + ".tmp"
+        try:
+            with open(temp_path, "w", encoding="utf-8") as f:
+                for path, (size, mtime, image) in self.records.items():
+                    f.write(json.dumps([path, size, mtime, *image]) + "\n")
+            os.replace(temp_path, self.path)
+        except OSError:
+            pass
+
+    def get(self, path, size, mtime):
+        """The cached ImageMetadata for this version of the file, or None."""
+        with self._lock:
+            record = self._records().get(path)
+        if record is None or record[0] != size or record[1] != mtime:
+            return None
+        return record[2]
+
+    def _put(self, path, size, mtime, image):
+        with self._lock:
+            self._records()[path] = (size, mtime, image)
+            if self.path is not None:
+                self._new.append(path)
+
+    def _read(self, key):
+        path, size, mtime = key
+        started = time.perf_counter() if STATS.enabled else None
+        image = read_metadata(path)
+        if started is not None:
+            STATS.add("metadata.read", time.perf_counter() - started)
+        self._put(path, size, mtime, image)
+        return image
+
+    def load(self, paths, info=None, cancelled=None):
+        """Reads the headers not cached yet for `paths`, in parallel; returns False if cancelled.
+
+        `info` maps paths to FileInfo (missing entries are stat'ed).
+        """
+        from concurrent.futures import ThreadPoolExecutor
+
+        info = info or {}
+        keys = []
+        for path in paths:
+            file_info = info.get(path) or stat_info(path)
+            if file_info is not None and self.get(path, file_info.size, file_info.mtime) is None:
+                keys.append((path, file_info.size, file_info.mtime))
+        if keys:
+            with ThreadPoolExecutor(max_workers=self.workers) as pool:
+                # In chunks, so a cancelled preview stops within one chunk
+                for i in range(0, len(keys), 256):
+                    if cancelled is not None and cancelled():
+                        pool.shutdown(cancel_futures=True)
+                        self.save()
+                        return False
+                    list(pool.map(self._read, keys[i:i + 256]))
+            self.save()
+        return True
+
+    def lookup(self, info=None, header=True, wait=True):
+        """f(path) -> FileFields for one file, or None while its header is still unread.
+
+        Without `header` only stat data is looked up. A waiting lookup reads a
+        missing header on the spot; a non-waiting one returns None and leaves the
+        file for request_missed().
+        """
+        info = info if info is not None else {}
+
+        def fields(path):
+            file_info = info.get(path) or stat_info(path)
+            if not header:
+                return FileFields(file_info, None)
+            if file_info is None:
+                return FileFields(None, NO_METADATA)
+            image = self.get(path, file_info.size, file_info.mtime)
+            if image is None:
+                key = (path, file_info.size, file_info.mtime)
+                if not wait:
+                    with self._lock:
+                        self._missed[key] = None
+                    return None
+                image = self._read(key)
+            return FileFields(file_info, image)
+        return fields
+
+    def request_missed(self):
+        """Reads in the background what non-waiting lookups missed since the last call.
+
+        Earlier requests not started yet are dropped, so rows scrolled past are
+        never read.
+        """
+        from concurrent.futures import ThreadPoolExecutor
+
+        with self._lock:
+            self._wanted, self._missed = self._missed, OrderedDict()
+            if self._pool is None and self._wanted:
+                self._pool = ThreadPoolExecutor(max_workers=min(4, self.workers))
+            self._dispatch()
+
+    @property
+    def busy(self):
+        with self._lock:
+            return bool(self._wanted or self._running)
+
+    def updated(self):
+        """Whether headers were read in the background since the last call."""
+        with self._lock:
+            updated, self._updated = self._updated, False
+        return updated
+
+    def _dispatch(self):
+        # With the lock held
+        while self._wanted and self._running < min(4, self.workers):
+            key, _ = self._wanted.popitem(last=False)
+            self._running += 1
+            try:
+                self._pool.submit(self._read_requested, key)
+            except RuntimeError:  # Closed
+                self._running -= 1
+                return
+
+    def _read_requested(self, key):
+        try:
+            self._read(key)
+        finally:
+            with self._lock:
+                self._running -= 1
+                self._updated = True
+                self._dispatch()
+
+    def save(self):
+        with self._lock:
+            new = list(dict.fromkeys(self._new))
+            self._new = []
+            records = self.records
+        if not new or self.path is None:
+            return
+        try:
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            with open(self.path, "a", encoding="utf-8") as f:
+                for path in new:
+                    size, mtime, image = records[path]
+                    f.write(json.dumps([path, size, mtime, *image]) + "\n")
+        except OSError:
+            pass
+
+    def close(self):
+        with self._lock:
+            self._wanted.clear()
+            pool, self._pool = self._pool, None
+        if pool is not None:
+            pool.shutdown(wait=False, cancel_futures=True)
+        self.save()
@@ -0,0 +1,240 @@
+"""Moves files into folders by rules: by type, extension, date or EXIF capture date.
+
+A rule pairs an optional set of extensions with a folder template such as
+"{category}" or "Photos/{year}/{month}". The whole batch is planned up front
+from data already in memory (the list's cached stat data), then applied in one
+pass: every destination folder is created once, and each file is moved with a
+single os.rename, or a kernel-side copy and delete when it changes device.
+"""
+import os
+import string
+import time
+from collections import namedtuple
+
+from organizer.journal import run_operations
+from organizer.metadata import MetadataCache
+from organizer.renamer import DirectoryIndex, _fold, split_path
+from organizer.stats import STATS
+
+DATE_SOURCES = ("mtime", "exif")
+
+# Folder templates offered in the GUI
+TEMPLATE_PRESETS = {
+    "By type": "{category}",
+    "By extension": "{ext}",
+    "By year": "{year}",
+    "By year/month": "{year}/{month}",
+    "By type, then year": "{category}/{year}",
+}
+
+TEMPLATE_FIELDS = ("category", "ext", "year", "month", "day")
+
+CATEGORIES = {
+    "Images": (".jpg", ".jpeg", ".png", ".gif", ".bmp", ".webp", ".tiff", ".tif", ".ico", ".heic", ".raw",
+               ".cr2", ".nef", ".arw", ".dng", ".svg"),
+    "Videos": (".mp4", ".mov", ".avi", ".mkv", ".wmv", ".webm", ".m4v", ".mpg", ".mpeg"),
+    "Audio": (".mp3", ".wav", ".flac", ".aac", ".ogg", ".m4a", ".wma", ".opus"),
+    "Documents": (".pdf", ".doc", ".docx", ".odt", ".rtf", ".txt", ".md", ".xls", ".xlsx", ".ods", ".csv",
+                  ".ppt", ".pptx", ".odp", ".epub"),
+    "Archives": (".zip", ".rar", ".7z", ".tar", ".gz", ".bz2", ".xz", ".iso"),
+    "Code": (".py", ".js", ".ts", ".html", ".css", ".json", ".xml", ".c", ".cpp", ".h", ".java", ".go", ".rs",
+             ".sh", ".bat", ".ps1"),
+}
+_CATEGORY_OF = {ext: category for category, extensions in CATEGORIES.items() for ext in extensions}
+
+# extensions: lower-case ".ext" strings the rule applies to, or None for any file
+Rule = namedtuple("Rule", ["extensions", "template"])
+
+
+def parse_rule(text):
+    """A rule from "jpg,png: Photos/{year}" or just "{category}"; raises ValueError."""
+    extensions = None
+    template = text
+    head, sep, tail = text.partition(":")
+    if sep and "{" not in head and "/" not in head and "\\" not in head:
+        extensions = frozenset("." + e.strip().lower().lstrip(".") for e in head.split(",") if e.strip())
+        template = tail
+    template = template.strip().strip("/\\")
+    check_template(template)
+    return Rule(extensions, template)
+
+
+def check_template(template):
+    if not template:
+        raise ValueError("The folder template is empty.")
+    for _, field, spec, conversion in string.Formatter().parse(template):
+        if field is None:
+            continue
+        if field not in TEMPLATE_FIELDS or spec or conversion:
+            raise ValueError(f"Unknown field {{{field}}} in folder template; use "
+                             + ", ".join("{" + f + "}" for f in TEMPLATE_FIELDS) + ".")
+    if ".." in template.replace("\\", "/").split("/"):
+        raise ValueError("The folder template must not go up with '..'.")
+
+
+def category_for(ext):
+    return _CATEGORY_OF.get(ext.lower(), "Other")
+
+
+class FolderNamer:
+    """Renders each file's destination folder from the first rule that matches it.
+
+    The rendered folder is memoized per (rule, extension, day), so a million files
+    from a few hundred days cost a few hundred format calls.
+    """
+
+    def __init__(self, rules, destination=None):
+        self.rules = list(rules)
+        self.destination = destination
+        self._cache = {}
+        self._rule_of = {}
+        self._days = {}
+        # Per rule: whether its template uses the file's date
+        self.needs_date = [any(f in ("year", "month", "day") for _, f, _, _ in string.Formatter().parse(r.template))
+                           for r in self.rules]
+
+    def rule_for(self, ext):
+        """Index of the first rule matching a file extension, or None."""
+        n = self._rule_of.get(ext, -1)
+        if n == -1:
+            lower = ext.lower()
+            n = next((n for n, rule in enumerate(self.rules)
+                      if rule.extensions is None or lower in rule.extensions), None)
+            self._rule_of[ext] = n
+        return n
+
+    def folder(self, n, directory, ext, timestamp):
+        """Destination folder (with a trailing separator) for a file matched by rule `n`.
+
+        `directory` is the file's own folder (with its trailing separator), used
+        when there is no destination root; `timestamp` may be None when the rule
+        does not use the date.
+        """
+        day = None
+        if self.needs_date[n] and timestamp is not None:
+            # Every UTC offset is a whole number of quarter hours, so local days
+            # start on a quarter-hour boundary and one localtime call covers each
+            quarter = int(timestamp // 900)
+            day = self._days.get(quarter)
+            if day is None:
+                day = self._days[quarter] = time.localtime(quarter * 900)[:3]
+        key = (n, ext, day)
+        relative = self._cache.get(key)
+        if relative is None:
+            lower = ext.lower()
+            values = {
+                "category": category_for(lower),
+                "ext": lower[1:] or "no extension",
+                "year": f"{day[0]:04d}" if day else "Unknown date",
+                "month": f"{day[1]:02d}" if day else "Unknown date",
+                "day": f"{day[2]:02d}" if day else "Unknown date",
+            }
+            relative = os.path.normpath(self.rules[n].template.format(**values))
+            relative = "" if relative == os.curdir else relative + os.sep
+            self._cache[key] = relative
+        if self.destination is not None:
+            return os.path.join(self.destination, relative)
+        # Organizing in place again leaves already sorted files where they are
+        # instead of nesting them one level deeper
+        tail = _fold(directory) if _fold else directory
+        if relative and (tail == relative or tail.endswith(os.sep + (_fold(relative) if _fold else relative))):
+            return directory
+        return directory + relative
+
+
+def plan_moves(files, rules, destination=None, date_source="mtime", info=None, metadata=None, index=None):
+    """Computes every (source, target) move for a batch without touching any file.
+
+    `info` maps paths to FileInfo (the list's cached stat data; missing entries
+    are stat'ed). With date_source "exif", capture dates are read through
+    `metadata` (a MetadataCache), falling back to the file date.
+    Files no rule matches, or already in place, are left out. Names already
+    taken in a destination folder, on disk or by an earlier file of the batch,
+    get a `_1`, `_2`... suffix.
+    """
+    if date_source not in DATE_SOURCES:
+        raise ValueError(f"Unknown date source: {date_source}")
+    namer = FolderNamer(rules, destination)
+    if index is None:
+        index = DirectoryIndex()
+    rule_for = namer.rule_for
+    needs_date = namer.needs_date
+    fold = _fold
+    info = info or {}
+    lookup = None
+    if date_source == "exif":
+        # The headers of the files whose folder has a date, read up front in parallel
+        if metadata is None:
+            metadata = MetadataCache()
+        dated = []
+        for file_path in files:
+            n = rule_for(split_path(file_path)[2])
+            if n is not None and needs_date[n]:
+                dated.append(file_path)
+        metadata.load(dated, info)
+        lookup = metadata.lookup(info)
+    started = time.perf_counter() if STATS.enabled else None
+    claimed = {}  # Destination folder key -> names taken there
+    next_suffix = {}
+    plan = []
+    append = plan.append
+
+    for file_path in files:
+        directory, name, ext = split_path(file_path)
+        n = rule_for(ext)
+        if n is None:
+            continue
+        timestamp = None
+        if needs_date[n]:
+            if lookup is not None:
+                timestamp = lookup(file_path).image.exif_date
+            if timestamp is None:
+                file_info = info.get(file_path)
+                if file_info is None:
+                    try:
+                        timestamp = os.stat(file_path).st_mtime
+                    except OSError:
+                        continue
+                else:
+                    timestamp = file_info.mtime
+        folder = namer.folder(n, directory, ext, timestamp)
+        folder_key = fold(folder) if fold else folder
+        if folder_key == (fold(directory) if fold else directory):
+            continue  # Already where the rule puts it
+
+        names = claimed.get(folder_key)
+        if names is None:
+            names = claimed[folder_key] = set(index.names(folder))
+        filename = name + ext
+        key = fold(filename) if fold else filename
+        if key in names:
+            counter_key = (folder_key, fold(name) if fold else name, ext)
+            c = next_suffix.get(counter_key, 1)
+            while True:
+                filename = f"{name}_{c}{ext}"
+                key = fold(filename) if fold else filename
+                if key not in names:
+                    break
+                c += 1
+            next_suffix[counter_key] = c + 1
+        names.add(key)
+        append((file_path, folder + filename))
+
+    if started is not None:
+        STATS.add("organize.plan", time.perf_counter() - started)
+    return plan
+
+
+def apply_moves(plan, journal=None):
+    """Creates the destination folders, then performs the moves; returns how many were moved.
+
+    With a RenameJournal the batch can be resumed or undone after a crash; on an
+    error, moves already made are undone before the error is raised.
+    """
+    folders = sorted({os.path.dirname(target) for _, target in plan})
+    for folder in folders:
+        os.makedirs(folder, exist_ok=True)
+    if journal is not None:
+        journal.begin(plan, len(plan), kind="move")
+    run_operations(plan, journal)
+    return len(plan)
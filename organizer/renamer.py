@@ -0,0 +1,482 @@
+import os
+import re
+import time
+import uuid
+
+from organizer.journal import run_operations
+from organizer.metadata import MetadataCache
+from organizer.stats import STATS
+
+RENAME_MODES = [
+    "After X characters",
+    "Before X characters",
+    "After expression",
+    "Before expression",
+    "Remove expression only",
+    "Ordered renaming",
+    "Template",
+]
+
+# Modes that number the files, and so take a start number
+COUNTER_MODES = ("Ordered renaming", "Template")
+
+# Runs of @ in an "Ordered renaming" pattern, each replaced by the zero-padded counter
+COUNTER_RE = re.compile(r"@+")
+
+# Tokens of a "Template" name, e.g. "{exif_date:%Y%m%d}_{camera}_{@@@@}". Dates take
+# a strftime format after the colon (default %Y-%m-%d); {@@@} is the counter
+TEMPLATE_FIELDS = ("name", "parent", "mtime", "ctime", "exif_date", "camera", "make", "model", "width",
+                   "height")
+# Fields that need the image header read (see organizer.metadata)
+HEADER_FIELDS = ("exif_date", "camera", "make", "model", "width", "height")
+_DATE_FIELDS = ("mtime", "ctime", "exif_date")
+DEFAULT_DATE_FORMAT = "%Y-%m-%d"
+_TOKEN_RE = re.compile(r"\{\{|\}\}|\{([^{}]*)\}|[{}]")
+# Characters that cannot appear in a file name on some system, replaced in token values
+_UNSAFE_RE = re.compile(r'[\x00-\x1f/\\:*?"<>|]')
+
+
+def parse_start_number(text):
+    try:
+        return int(text) if text else 1
+    except ValueError:
+        raise ValueError("Start Number must be an integer.") from None
+
+
+def _field_value(field, spec, name, path, fields):
+    # The text of one template field for a file, or None when the file has no value
+    if field == "name":
+        return name
+    if field == "parent":
+        return os.path.basename(os.path.dirname(path)) or None
+    info, image = fields
+    if field in ("mtime", "ctime"):
+        timestamp = getattr(info, field) if info is not None else None
+    elif field == "exif_date":
+        timestamp = image.exif_date
+    elif field == "camera":
+        make, model = image.make, image.model
+        if make and model and model.lower().startswith(make.split()[0].lower()):
+            return model  # "Canon" + "Canon EOS R5"
+        return " ".join(part for part in (make, model) if part) or None
+    else:
+        value = getattr(image, field)
+        return None if value is None else str(value)
+    if timestamp is None:
+        return None
+    try:
+        return time.strftime(spec or DEFAULT_DATE_FORMAT, time.localtime(timestamp))
+    except (ValueError, OverflowError, OSError):
+        return None
+
+
+def parse_template(template):
+    """Compiles a "Template" pattern into literal strings and tokens; raises ValueError.
+
+    A token is a field with an optional format, then optional "|" fallbacks, each
+    either another field (taking the same format unless it has its own) or
+    literal text: "{exif_date:%Y%m%d|mtime}", "{camera|Unknown camera}", "{camera|}".
+    A token with no value and no fallback leaves the file's name unchanged.
+    Returns (parts, fields used), where each token part is (counter width, None)
+    or (None, [(field, format) or (None, literal text), ...]).
+    """
+    parts = []
+    used = set()
+    last = 0
+    for match in _TOKEN_RE.finditer(template):
+        parts.append(template[last:match.start()])
+        last = match.end()
+        text = match.group(0)
+        if text in ("{{", "}}"):
+            parts.append(text[0])
+            continue
+        if match.group(1) is None:
+            raise ValueError("Unbalanced brace in template; write {{ or }} for a literal brace.")
+        alternatives = match.group(1).split("|")
+        head = alternatives[0].strip()
+        if head and COUNTER_RE.fullmatch(head) and len(alternatives) == 1:
+            parts.append((len(head), None))
+            continue
+        choices = []
+        spec = None
+        for n, alternative in enumerate(alternatives):
+            field, colon, own_spec = alternative.partition(":")
+            field = field.strip()
+            if field in TEMPLATE_FIELDS:
+                if colon and field not in _DATE_FIELDS:
+                    raise ValueError(f"Only dates take a format, not {{{field}}}.")
+                if n == 0:
+                    spec = own_spec if colon else None
+                choices.append((field, own_spec if colon else spec))
+                used.add(field)
+            elif n == 0:
+                raise ValueError(f"Unknown token {{{alternative}}} in template; use "
+                                 + ", ".join("{" + f + "}" for f in TEMPLATE_FIELDS) + " or {@@@}.")
+            else:
+                choices.append((None, alternative))
+        parts.append((None, choices))
+    parts.append(template[last:])
+    if any(isinstance(part, str) and ("/" in part or "\\" in part) for part in parts):
+        raise ValueError("A name template cannot contain a folder separator.")
+    return [part for part in parts if part != ""], used
+
+
+def template_uses_header(template):
+    # Whether naming by this template needs image headers read
+    return any(field in HEADER_FIELDS for field in parse_template(template)[1])
+
+
+def _template_function(template, start, lookup):
+    parts, used = parse_template(template)
+    file_fields = used - {"name", "parent"}
+    if file_fields and lookup is None:
+        lookup = MetadataCache(use_disk=False).lookup(header=bool(file_fields & set(HEADER_FIELDS)))
+    unsafe = _UNSAFE_RE.sub
+
+    def template_name(name, index, path):
+        fields = None
+        if file_fields:
+            fields = lookup(path)
+            if fields is None:
+                return None  # Header not read yet
+        out = []
+        for part in parts:
+            if isinstance(part, str):
+                out.append(part)
+                continue
+            width, choices = part
+            if width is not None:
+                out.append("%0*d" % (width, start + index))
+                continue
+            for field, spec in choices:
+                value = spec if field is None else _field_value(field, spec, name, path, fields)
+                if value is not None:
+                    out.append(unsafe("_", value))
+                    break
+            else:
+                return name  # Missing value and no fallback
+        return "".join(out).strip() or name
+    return template_name
+
+
+def name_function(mode, value, start=1, lookup=None):
+    """Returns f(name, index, path) -> new name (without extension) for a rename mode.
+
+    Everything that only depends on the mode and value is worked out here, once
+    per batch rather than once per file. For "Template", `lookup` is an accessor
+    from MetadataCache.lookup(); f returns None for a file whose header a
+    non-waiting lookup has not read yet.
+    """
+    if mode in ("After X characters", "Before X characters"):
+        try:
+            x = int(value)
+        except ValueError:
+            raise ValueError("Value must be an integer for 'X characters'.") from None
+        if mode == "After X characters":
+            # Remove everything AFTER the Xth character (Keep first X)
+            return lambda name, index, path: name[:x]
+        # Remove everything BEFORE the Xth character (Keep from X to end)
+        return lambda name, index, path: name[x:]
+
+    if mode == "After expression":
+        # Remove everything after the expression, keeping the expression itself
+        def after_expression(name, index, path):
+            idx = name.find(value)
+            return name[:idx + len(value)] if idx != -1 else name
+        return after_expression
+
+    if mode == "Before expression":
+        # Remove everything before the expression (Keep expression + suffix)
+        def before_expression(name, index, path):
+            idx = name.find(value)
+            return name[idx:] if idx != -1 else name
+        return before_expression
+
+    if mode == "Remove expression only":
+        return lambda name, index, path: name.replace(value, "")
+
+    if mode == "Ordered renaming":
+        # value is the pattern; each @ run becomes the number padded to the run's length.
+        # Turn it into a %-format string once so every name is a single formatting op.
+        parts = []
+        last = 0
+        for match in COUNTER_RE.finditer(value):
+            parts.append(value[last:match.start()].replace("%", "%%"))
+            parts.append("%%0%dd" % len(match.group(0)))
+            last = match.end()
+        parts.append(value[last:].replace("%", "%%"))
+        fmt = "".join(parts)
+        runs = len(parts) // 2
+        if runs == 1:
+            return lambda name, index, path: fmt % (start + index)
+        return lambda name, index, path: fmt % ((start + index,) * runs)
+
+    if mode == "Template":
+        return _template_function(value, start, lookup)
+
+    raise ValueError(f"Unknown rename mode: {mode}")
+
+
+def split_path(file_path):
+    """(directory with trailing separator, name, extension) of a file path.
+
+    Same result as os.path.split + os.path.splitext for file paths, but on plain
+    string methods: this runs once per file and the generic versions dominate the
+    cost of planning large batches.
+    """
+    if os.altsep:
+        cut = max(file_path.rfind(os.sep), file_path.rfind(os.altsep)) + 1
+        directory, filename = file_path[:cut], file_path[cut:]
+    else:
+        directory, sep, filename = file_path.rpartition(os.sep)
+        directory += sep
+    name, dot, ext = filename.rpartition(".")
+    if not dot or not name.lstrip("."):
+        return directory, filename, ""
+    return directory, name, dot + ext
+
+
+# Names are compared case-insensitively where the filesystem is
+_fold = os.path.normcase if os.name == "nt" else None
+
+
+class DirectoryIndex:
+    """Names present in each directory, read with a single listing per directory.
+
+    Collision checks are set lookups against these snapshots instead of a stat per
+    candidate name, which matters when thousands of files compete for one name or
+    the folder is on a network share. Listings are taken on first use and can be
+    shared by several plans over the same files.
+    """
+
+    def __init__(self):
+        self._listings = {}
+
+    def names(self, directory):
+        key = _fold(directory) if _fold else directory
+        listing = self._listings.get(key)
+        if listing is None:
+            started = time.perf_counter() if STATS.enabled else None
+            try:
+                names = os.listdir(directory or os.curdir)
+            except OSError:
+                names = []
+            listing = frozenset(map(_fold, names) if _fold else names)
+            self._listings[key] = listing
+            if started is not None:
+                STATS.add("rename.listdir", time.perf_counter() - started)
+        return listing
+
+    def invalidate(self, directory=None):
+        if directory is None:
+            self._listings.clear()
+        else:
+            self._listings.pop(_fold(directory) if _fold else directory, None)
+
+
+def _template_lookup(mode, value, metadata, info, files=None, wait=True):
+    # The field accessor a "Template" name needs, reading the batch's headers up
+    # front (in parallel) when `files` is given; None for the other modes
+    if mode != "Template":
+        return None
+    header = template_uses_header(value)
+    if metadata is None:
+        metadata = MetadataCache()
+    if header and files is not None:
+        metadata.load(files, info)
+    return metadata.lookup(info, header=header, wait=wait)
+
+
+def plan_renames(files, mode, value, start=1, index=None, metadata=None, info=None):
+    """Computes the complete old -> new mapping for a batch without touching any file.
+
+    Returns a list of (source, target) pairs for the files whose name changes.
+    Files are numbered by their position in `files`. Names freed by other files in
+    the same batch count as available, so chains and swaps are planned as such; a
+    `_1`, `_2`... suffix is only added when the name is held by a file that stays
+    put or was already given to an earlier file in the batch.
+
+    Templates read file data through `metadata` (a MetadataCache) and `info`
+    (path -> FileInfo, the list's cached stat data).
+    """
+    started = time.perf_counter() if STATS.enabled else None
+    new_name_for = name_function(mode, value, start, _template_lookup(mode, value, metadata, info, files))
+    if index is None:
+        index = DirectoryIndex()
+    fold = _fold
+
+    computed = []
+    moving = {}  # directory -> names given up by files moving out of it
+    for position, file_path in enumerate(files):
+        directory, name, ext = split_path(file_path)
+        new_name = new_name_for(name, position, file_path)
+        if new_name == name:
+            continue
+        computed.append((file_path, directory, new_name, ext))
+        dir_key = fold(directory) if fold else directory
+        freed = moving.get(dir_key)
+        if freed is None:
+            freed = moving[dir_key] = set()
+        freed.add(fold(name + ext) if fold else name + ext)
+
+    occupied = {}  # directory -> names that will exist once the plan has run
+    next_suffix = {}
+    plan = []
+    append = plan.append
+    for file_path, directory, new_name, ext in computed:
+        dir_key = fold(directory) if fold else directory
+        names = occupied.get(dir_key)
+        if names is None:
+            names = occupied[dir_key] = set(index.names(directory))
+            names -= moving[dir_key]
+        new_filename = new_name + ext
+        key = fold(new_filename) if fold else new_filename
+        if key in names:
+            # Carry on from the last suffix handed out for this name, so k files
+            # competing for one name cost O(k) lookups rather than O(k^2)
+            counter_key = (dir_key, key)
+            c = next_suffix.get(counter_key, 1)
+            while True:
+                new_filename = f"{new_name}_{c}{ext}"
+                key = fold(new_filename) if fold else new_filename
+                if key not in names:
+                    break
+                c += 1
+            next_suffix[counter_key] = c + 1
+        names.add(key)
+        append((file_path, directory + new_filename))
+    if started is not None:
+        STATS.add("rename.plan", time.perf_counter() - started)
+    return plan
+
+
+PREVIEW_RENAMED = "renamed"
+PREVIEW_UNCHANGED = "unchanged"
+PREVIEW_COLLISION = "collision"
+PREVIEW_PENDING = "pending"
+
+
+class RenamePreview:
+    """Answers "what would this row be renamed to" one row at a time.
+
+    Meant for the rows on screen: each row costs one name computation and a set
+    lookup against the DirectoryIndex, independent of the list length. Whether
+    two files in the batch compete for the same name needs a pass over the whole
+    list; count_targets() does that, typically on a worker thread, and rows pick
+    the result up once it is there.
+
+    A template naming files by their image headers shows rows whose header is not
+    cached yet as pending; see MetadataCache.request_missed().
+    """
+
+    def __init__(self, files, mode, value, start=1, index=None, version=None, metadata=None, info=None):
+        self.files = files
+        self.version = version
+        self.index = index if index is not None else DirectoryIndex()
+        self.target_counts = None
+        self.cancelled = False
+        self._loads_headers = mode == "Template" and template_uses_header(value)
+        if self._loads_headers and metadata is None:
+            metadata = MetadataCache()
+        self.metadata = metadata
+        self._info = info
+        self._new_name_for = name_function(mode, value, start,
+                                           _template_lookup(mode, value, metadata, info, wait=False))
+        self._positions = None
+
+    def _key(self, path):
+        return _fold(path) if _fold else path
+
+    def _moves_away(self, path):
+        # Whether `path` belongs to a file in the batch that gets a new name
+        if self._positions is None:
+            self._positions = {self._key(p): i for i, p in enumerate(self.files)}
+        position = self._positions.get(self._key(path))
+        if position is None:
+            return False
+        _, name, _ = split_path(self.files[position])
+        new_name = self._new_name_for(name, position, self.files[position])
+        return new_name is not None and new_name != name
+
+    def row(self, position):
+        file_path = self.files[position]
+        directory, name, ext = split_path(file_path)
+        new_name = self._new_name_for(name, position, file_path)
+        if new_name is None:
+            return "\u2026", PREVIEW_PENDING
+        if new_name == name:
+            return name + ext, PREVIEW_UNCHANGED
+
+        new_filename = new_name + ext
+        new_path = directory + new_filename
+        if self._key(new_filename) in self.index.names(directory) and not self._moves_away(new_path):
+            return new_filename, PREVIEW_COLLISION
+        counts = self.target_counts
+        if counts is not None and counts.get(self._key(new_path), 0) > 1:
+            return new_filename, PREVIEW_COLLISION
+        return new_filename, PREVIEW_RENAMED
+
+    def cancel(self):
+        self.cancelled = True
+
+    def count_targets(self, files=None):
+        # How many files in the batch want each target path
+        files = self.files if files is None else files
+        if self._loads_headers:
+            # Every header is needed to tell which names compete
+            if not self.metadata.load(files, self._info, lambda: self.cancelled):
+                return None
+        counts = {}
+        new_name_for = self._new_name_for
+        for position, file_path in enumerate(files):
+            if self.cancelled:
+                return None
+            directory, name, ext = split_path(file_path)
+            new_name = new_name_for(name, position, file_path)
+            if new_name is None or new_name == name:
+                continue
+            key = self._key(directory + new_name + ext)
+            counts[key] = counts.get(key, 0) + 1
+        self.target_counts = counts
+        return counts
+
+
+def _temp_path(path, token, index):
+    directory, filename = os.path.split(path)
+    return os.path.join(directory, f".{filename}.{token}-{index}.renaming")
+
+
+def plan_operations(plan):
+    """Expands a rename plan into the ordered (from, to) renames that carry it out.
+
+    Files whose current name is the target of another move are first parked under
+    a temporary name, so swaps and cycles go through without collisions.
+    """
+    normcase = os.path.normcase
+    targets = {normcase(target) for _, target in plan}
+    token = uuid.uuid4().hex[:8]
+
+    parked = []  # Phase 1: every source that another move needs out of the way
+    moves = []  # Phase 2: every target is free by then
+    for index, (source, target) in enumerate(plan):
+        if normcase(source) in targets and normcase(source) != normcase(target):
+            temp = _temp_path(source, token, index)
+            parked.append((source, temp))
+            moves.append((temp, target))
+        else:
+            moves.append((source, target))
+    return parked + moves
+
+
+def apply_plan(plan, journal=None):
+    """Performs a planned batch of renames and returns how many files were moved.
+
+    With a RenameJournal, every rename is recorded so the batch can be resumed or
+    undone after a crash. If a rename fails, moves already made are undone before
+    the error is raised.
+    """
+    ops = plan_operations(plan)
+    if journal is not None:
+        journal.begin(ops, len(plan))
+    run_operations(ops, journal)
+    return len(plan)
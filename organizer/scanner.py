@@ -0,0 +1,304 @@
+import fnmatch
+import os
+import queue
+import re
+import threading
+import time
+from collections import namedtuple
+
+from organizer.file_list import FileListModel
+from organizer.manifest import MANIFEST_NAME
+from organizer.stats import STATS
+
+# A file found by the scanner. `key` is the normalized real path used by
+# FileListModel for de-duplication, and the stat fields become its FileInfo;
+# both are worked out here so the UI thread never has to.
+ScanEntry = namedtuple("ScanEntry", ["path", "key", "size", "mtime", "ctime"])
+
+SCAN_MODES = ("folder_only", "direct_subfolders", "all_children")
+
+
+def _max_depth(mode):
+    if mode == "folder_only":
+        return 0
+    if mode == "direct_subfolders":
+        return 1
+    if mode == "all_children":
+        return None
+    raise ValueError(f"Unknown scan mode: {mode}")
+
+
+_SIZE_RE = re.compile(r"^\s*(\d+(?:\.\d*)?)\s*([kmgt]?)(?:i?b)?\s*$", re.IGNORECASE)
+_SIZE_UNITS = {"": 1, "k": 1024, "m": 1024 ** 2, "g": 1024 ** 3, "t": 1024 ** 4}
+
+
+def parse_size(text):
+    """Bytes from "500", "64 KB", "1.5M" or "2GiB" (units of 1024), None for ""; raises ValueError."""
+    if not text or not text.strip():
+        return None
+    match = _SIZE_RE.match(text)
+    if match is None:
+        raise ValueError(f"Not a size: {text!r} (use e.g. 500KB, 1.5MB or 2GB).")
+    return int(float(match.group(1)) * _SIZE_UNITS[match.group(2).lower()])
+
+
+def parse_date(text, end_of_day=False):
+    """Local timestamp from "YYYY-MM-DD" or "YYYY-MM-DD HH:MM", None for ""; raises ValueError.
+
+    With `end_of_day`, a bare date means the end of that day, so "until" a date includes it.
+    """
+    if not text or not text.strip():
+        return None
+    text = text.strip()
+    for fmt in ("%Y-%m-%d %H:%M", "%Y-%m-%d"):
+        try:
+            parsed = time.strptime(text, fmt)
+        except ValueError:
+            continue
+        timestamp = time.mktime(parsed)
+        if end_of_day and fmt == "%Y-%m-%d":
+            timestamp += 24 * 60 * 60 - 1e-6
+        return timestamp
+    raise ValueError(f"Not a date: {text!r} (use YYYY-MM-DD or YYYY-MM-DD HH:MM).")
+
+
+def _glob_matcher(patterns):
+    # One compiled regex for a list of globs, matched against names regardless of case
+    patterns = [p.strip() for p in patterns if p and p.strip()]
+    if not patterns:
+        return None
+    return re.compile("|".join(fnmatch.translate(p) for p in patterns), re.IGNORECASE).match
+
+
+class ScanFilter:
+    """Which files a folder scan keeps, besides the extension list.
+
+    Checked inside the scanner, cheapest first: folders whose name matches an
+    exclude glob are never entered and `max_depth` stops the descent; the name
+    tests (include/exclude globs, a regex searched in the name) run on the
+    DirEntry before anything touches the disk; size and modification date are
+    tested on the stat the scanner takes anyway. A file rejected here never
+    reaches the list.
+    """
+
+    def __init__(self, include=(), exclude=(), name_regex=None, min_size=None, max_size=None,
+                 modified_since=None, modified_until=None, max_depth=None):
+        self.include = [p.strip() for p in include if p and p.strip()]
+        self.exclude = [p.strip() for p in exclude if p and p.strip()]
+        self.name_regex = name_regex or None
+        self.min_size = min_size
+        self.max_size = max_size
+        self.modified_since = modified_since
+        self.modified_until = modified_until
+        self.max_depth = max_depth
+        try:
+            self._regex = re.compile(name_regex).search if name_regex else None
+        except re.error as e:
+            raise ValueError(f"Invalid name pattern: {e}") from None
+        if min_size is not None and max_size is not None and min_size > max_size:
+            raise ValueError("The minimum size is larger than the maximum size.")
+        if modified_since is not None and modified_until is not None and modified_since > modified_until:
+            raise ValueError("The modified-since date is after the modified-until date.")
+        if max_depth is not None and max_depth < 0:
+            raise ValueError("The maximum depth cannot be negative.")
+        self._include = _glob_matcher(self.include)
+        self._exclude = _glob_matcher(self.exclude)
+
+    @property
+    def tests_name(self):
+        return bool(self._include or self._exclude or self._regex)
+
+    @property
+    def tests_stat(self):
+        return any(v is not None for v in (self.min_size, self.max_size, self.modified_since, self.modified_until))
+
+    def __bool__(self):
+        return self.tests_name or self.tests_stat or self.max_depth is not None
+
+    def excludes_dir(self, name):
+        return self._exclude is not None and self._exclude(name) is not None
+
+    def matches_name(self, name):
+        if self._include is not None and self._include(name) is None:
+            return False
+        if self._exclude is not None and self._exclude(name) is not None:
+            return False
+        return self._regex is None or self._regex(name) is not None
+
+    def matches_stat(self, size, mtime):
+        if self.min_size is not None and size < self.min_size:
+            return False
+        if self.max_size is not None and size > self.max_size:
+            return False
+        if self.modified_since is not None and mtime < self.modified_since:
+            return False
+        return self.modified_until is None or mtime <= self.modified_until
+
+    def limit_depth(self, max_depth):
+        # The tighter of a scan mode's depth limit (None = unlimited) and this filter's
+        if self.max_depth is None:
+            return max_depth
+        return self.max_depth if max_depth is None else min(max_depth, self.max_depth)
+
+    def to_dict(self):
+        return {"include": self.include, "exclude": self.exclude, "name_regex": self.name_regex,
+                "min_size": self.min_size, "max_size": self.max_size, "modified_since": self.modified_since,
+                "modified_until": self.modified_until, "max_depth": self.max_depth}
+
+    @classmethod
+    def from_dict(cls, data):
+        return cls(**data) if data else None
+
+
+def iter_folder_entries(folder_path, mode, allowed_extensions=None, cancel=None, directories=None, depth=0,
+                        scan_filter=None):
+    # Same traversal order as the old os.walk based scan (a folder's files, then its
+    # subfolders top-down), but DirEntry type info is reused and the extension is
+    # checked before anything that may touch the disk.
+    # With a `directories` list, (directory with trailing separator, mtime_ns, depth)
+    # is appended for every directory listed, so a saved session can later tell
+    # which ones changed (see organizer.sessions). `depth` is that of `folder_path`
+    # below the folder the scan mode counts from. A ScanFilter is applied as the
+    # files are listed, see there.
+    max_depth = _max_depth(mode)
+    allowed = {ext.lower() for ext in allowed_extensions} if allowed_extensions else None
+    excludes_dir = name_ok = stat_ok = None
+    if scan_filter:
+        max_depth = scan_filter.limit_depth(max_depth)
+        if scan_filter.exclude:
+            excludes_dir = scan_filter.excludes_dir
+        if scan_filter.tests_name:
+            name_ok = scan_filter.matches_name
+        if scan_filter.tests_stat:
+            stat_ok = scan_filter.matches_stat
+    stack = [(folder_path, depth)]
+    timed = STATS.enabled
+    perf_counter = time.perf_counter
+
+    while stack:
+        if cancel is not None and cancel.is_set():
+            return
+        directory, depth = stack.pop()
+        descend = max_depth is None or depth < max_depth
+        # Only follow symlinked folders when the depth is bounded, to avoid loops
+        follow_links = max_depth is not None
+        real_dir = None
+        subdirs = []
+        if timed:
+            # Directory time excludes the stat calls and the time spent by the consumer
+            dir_started = perf_counter()
+            excluded = 0.0
+
+        try:
+            if directories is not None:
+                # Taken before the listing: a change made while listing shows up
+                # as a newer mtime next time
+                directories.append((os.path.join(directory, ""), os.stat(directory).st_mtime_ns, depth))
+            with os.scandir(directory) as it:
+                for entry in it:
+                    if cancel is not None and cancel.is_set():
+                        return
+                    try:
+                        if entry.is_dir(follow_symlinks=follow_links):
+                            if descend and (excludes_dir is None or not excludes_dir(entry.name)):
+                                subdirs.append(entry.path)
+                            continue
+                        if entry.name.startswith(MANIFEST_NAME):
+                            # Conversion manifests (and their compaction temp file) are ours, not the user's
+                            continue
+                        if allowed is not None and os.path.splitext(entry.name)[1].lower() not in allowed:
+                            continue
+                        if name_ok is not None and not name_ok(entry.name):
+                            continue
+                        if not entry.is_file():
+                            continue
+                        if entry.is_symlink():
+                            key = FileListModel.path_key(entry.path)
+                        else:
+                            if real_dir is None:
+                                real_dir = os.path.realpath(directory)
+                            key = os.path.normcase(os.path.join(real_dir, entry.name))
+                        # Free on Windows, where scandir already returned it
+                        if timed:
+                            started = perf_counter()
+                            st = entry.stat()
+                            elapsed = perf_counter() - started
+                            STATS.add("scan.stat", elapsed)
+                            excluded += elapsed
+                        else:
+                            st = entry.stat()
+                    except OSError:
+                        continue
+                    if stat_ok is not None and not stat_ok(st.st_size, st.st_mtime):
+                        continue
+                    if timed:
+                        paused = perf_counter()
+                        yield ScanEntry(entry.path, key, st.st_size, st.st_mtime, st.st_ctime)
+                        excluded += perf_counter() - paused
+                    else:
+                        yield ScanEntry(entry.path, key, st.st_size, st.st_mtime, st.st_ctime)
+        except OSError:
+            continue
+        finally:
+            if timed:
+                STATS.add("scan.directory", perf_counter() - dir_started - excluded)
+
+        for subdir in reversed(subdirs):
+            stack.append((subdir, depth + 1))
+
+
+class FolderScan:
+    """Walks one folder on a worker thread and hands results back in batches."""
+
+    def __init__(self, folder_path, mode, allowed_extensions=None, batch_size=512, batch_interval=0.1,
+                 scan_filter=None):
+        self.folder_path = folder_path
+        self.mode = mode
+        self.allowed_extensions = allowed_extensions
+        self.scan_filter = scan_filter
+        self.batch_size = batch_size
+        self.batch_interval = batch_interval
+        self.found = 0
+        self.directories = []  # As listed, see iter_folder_entries
+        self.done = False
+        self._results = queue.Queue()
+        self._cancel = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    def start(self):
+        self._thread.start()
+        return self
+
+    def cancel(self):
+        self._cancel.set()
+
+    @property
+    def cancelled(self):
+        return self._cancel.is_set()
+
+    def _run(self):
+        batch = []
+        last_flush = time.monotonic()
+        try:
+            for entry in iter_folder_entries(self.folder_path, self.mode, self.allowed_extensions, self._cancel,
+                                             self.directories, scan_filter=self.scan_filter):
+                batch.append(entry)
+                self.found += 1
+                now = time.monotonic()
+                if len(batch) >= self.batch_size or now - last_flush >= self.batch_interval:
+                    self._results.put(batch)
+                    batch = []
+                    last_flush = now
+        finally:
+            if batch:
+                self._results.put(batch)
+            self.done = True
+
+    def drain(self):
+        # Check `done` before draining: once it is set every batch is already queued
+        batches = []
+        while True:
+            try:
+                batches.append(self._results.get_nowait())
+            except queue.Empty:
+                return batches
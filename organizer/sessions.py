@@ -0,0 +1,290 @@
+"""Named file-list sessions in a SQLite index, reopened with incremental rescans.
+
+A session stores the list in order with the stat data it was sorted on, every
+directory the folder scans listed (with its mtime), the scans' filters and the
+files removed from them by hand. Directory mtimes change when entries are added, removed or
+renamed in them, so reopening stats each stored directory once, lists again
+only the ones that changed, and walks only subfolders that did not exist
+before; everything else comes from the index. Files whose contents changed in
+place keep their saved size and date until the list's metadata is refreshed.
+
+Each file row holds its directory's id and its name rather than the full path,
+and its de-duplication key only when it is not simply the resolved directory
+plus the name (symlinks), which keeps a 400k-file session to a few tens of MB.
+"""
+import json
+import os
+import sqlite3
+import time
+from collections import namedtuple
+
+from organizer.appdirs import state_dir
+from organizer.file_list import stat_info
+from organizer.renamer import split_path
+from organizer.scanner import ScanEntry, ScanFilter, _max_depth, iter_folder_entries
+from organizer.stats import STATS
+
+SessionInfo = namedtuple("SessionInfo", ["name", "saved", "files"])
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS sessions (
+    id INTEGER PRIMARY KEY, name TEXT UNIQUE NOT NULL, saved REAL NOT NULL, files INTEGER NOT NULL);
+CREATE TABLE IF NOT EXISTS roots (
+    session INTEGER NOT NULL, id INTEGER NOT NULL, path TEXT NOT NULL, mode TEXT NOT NULL, filter TEXT,
+    PRIMARY KEY (session, id)) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS dirs (
+    session INTEGER NOT NULL, id INTEGER NOT NULL, path TEXT NOT NULL, real TEXT NOT NULL,
+    mtime_ns INTEGER, depth INTEGER, root INTEGER, PRIMARY KEY (session, id)) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS files (
+    session INTEGER NOT NULL, position INTEGER NOT NULL, dir INTEGER NOT NULL, name TEXT NOT NULL,
+    key TEXT, size INTEGER NOT NULL, mtime REAL NOT NULL, ctime REAL NOT NULL,
+    PRIMARY KEY (session, position)) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS removed (session INTEGER NOT NULL, path TEXT NOT NULL);
+"""
+
+
+def default_session_path():
+    return state_dir("sessions.sqlite3")
+
+
+def _real_directory(directory):
+    # Resolved, case-folded form of a directory (with its trailing separator), as in FileListModel keys
+    return os.path.normcase(os.path.join(os.path.realpath(directory or os.curdir), ""))
+
+
+class LoadedSession:
+    """A session read back and brought up to date, ready to put into a FileListModel.
+
+    `kept`, `added` and `dropped` count files taken from the index, found new and
+    gone since the save; `rescanned` counts the directories listed again.
+    """
+
+    def __init__(self, name):
+        self.name = name
+        self.entries = []  # ScanEntry per file, in list order
+        self.roots = {}
+        self.directories = {}
+        self.removed = set()
+        self.kept = self.added = self.dropped = self.rescanned = 0
+
+    def apply_to(self, model):
+        # Replaces the model's files with the session's
+        model.clear()
+        model.add_scanned(self.entries)
+        model.roots = dict(self.roots)
+        model.directories = dict(self.directories)
+        model.removed = set(self.removed)
+
+
+class SessionStore:
+    """Saves and reopens file lists by name; each call uses its own connection, so any thread may call."""
+
+    def __init__(self, path=None):
+        self.path = path or default_session_path()
+
+    def _connect(self):
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        connection = sqlite3.connect(self.path, timeout=10)
+        connection.execute("PRAGMA journal_mode=WAL")
+        connection.execute("PRAGMA synchronous=NORMAL")
+        connection.executescript(_SCHEMA)
+        return connection
+
+    def list(self):
+        """SessionInfo for every saved session, newest first."""
+        connection = self._connect()
+        try:
+            rows = connection.execute("SELECT name, saved, files FROM sessions ORDER BY saved DESC").fetchall()
+        finally:
+            connection.close()
+        return [SessionInfo(*row) for row in rows]
+
+    def delete(self, name):
+        connection = self._connect()
+        try:
+            with connection:
+                self._delete(connection, name)
+        finally:
+            connection.close()
+
+    @staticmethod
+    def _delete(connection, name):
+        row = connection.execute("SELECT id FROM sessions WHERE name = ?", (name,)).fetchone()
+        if row is None:
+            return
+        for table in ("files", "dirs", "roots", "removed"):
+            connection.execute(f"DELETE FROM {table} WHERE session = ?", row)
+        connection.execute("DELETE FROM sessions WHERE id = ?", row)
+
+    def save(self, name, model):
+        """Stores the model's files, order and scan state as `name`, replacing a session of that name."""
+        name = name.strip()
+        if not name:
+            raise ValueError("Give the session a name.")
+        started = time.perf_counter() if STATS.enabled else None
+        roots = {root: n for n, root in enumerate(model.roots)}
+        dir_ids = {}
+        dir_rows = []
+
+        def dir_id(directory):
+            n = dir_ids.get(directory)
+            if n is None:
+                n = dir_ids[directory] = len(dir_ids)
+                scanned = model.directories.get(directory)
+                mtime_ns, depth, root = scanned if scanned is not None else (None, None, None)
+                dir_rows.append([n, directory, _real_directory(directory), mtime_ns, depth, roots.get(root)])
+            return n
+
+        file_rows = []
+        normcase = os.path.normcase
+        info = model.info
+        for position, path in enumerate(model.paths):
+            directory, _, _ = split_path(path)
+            n = dir_id(directory)
+            filename = path[len(directory):]
+            key = dir_rows[n][2] + normcase(filename)
+            file_info = info[path]
+            file_rows.append((position, n, filename, None if model.has_key(key) else model.path_key(path),
+                              file_info.size, file_info.mtime, file_info.ctime))
+        for directory in model.directories:
+            # Scanned directories without files in the list still need watching for new ones
+            dir_id(directory)
+
+        connection = self._connect()
+        try:
+            with connection:
+                self._delete(connection, name)
+                session = connection.execute("INSERT INTO sessions (name, saved, files) VALUES (?, ?, ?)",
+                                             (name, time.time(), len(file_rows))).lastrowid
+                connection.executemany("INSERT INTO roots VALUES (?, ?, ?, ?, ?)", (
+                    (session, roots[root], root, mode, json.dumps(scan_filter.to_dict()) if scan_filter else None)
+                    for root, (mode, scan_filter) in model.roots.items()))
+                connection.executemany("INSERT INTO dirs VALUES (?, ?, ?, ?, ?, ?, ?)",
+                                       ((session, *row) for row in dir_rows))
+                connection.executemany("INSERT INTO files VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                                       ((session, *row) for row in file_rows))
+                connection.executemany("INSERT INTO removed VALUES (?, ?)",
+                                       ((session, path) for path in model.removed))
+        finally:
+            connection.close()
+        if started is not None:
+            STATS.add("session.save", time.perf_counter() - started)
+        return len(file_rows)
+
+    def load(self, name, allowed_extensions=None, cancel=None):
+        """Reads session `name` and rescans what changed since; returns a LoadedSession, or None if cancelled.
+
+        `allowed_extensions` filters the files found in changed directories, as
+        for a folder drop. Raises ValueError for an unknown name.
+        """
+        timed = STATS.enabled
+        started = time.perf_counter() if timed else None
+        connection = self._connect()
+        try:
+            row = connection.execute("SELECT id FROM sessions WHERE name = ?", (name,)).fetchone()
+            if row is None:
+                raise ValueError(f"There is no saved session named {name!r}.")
+            root_rows = connection.execute("SELECT id, path, mode, filter FROM roots WHERE session = ?",
+                                           row).fetchall()
+            dirs = {n: rest for n, *rest in connection.execute(
+                "SELECT id, path, real, mtime_ns, depth, root FROM dirs WHERE session = ?", row)}
+            removed = {path for path, in connection.execute("SELECT path FROM removed WHERE session = ?", row)}
+            files = connection.execute("SELECT dir, name, key, size, mtime, ctime FROM files WHERE session = ? "
+                                       "ORDER BY position", row).fetchall()
+        finally:
+            connection.close()
+        if timed:
+            STATS.add("session.read", time.perf_counter() - started)
+            started = time.perf_counter()
+
+        loaded = LoadedSession(name)
+        roots = {}
+        for n, root, mode, scan_filter in root_rows:
+            roots[n] = root
+            loaded.roots[root] = (mode, ScanFilter.from_dict(json.loads(scan_filter)) if scan_filter else None)
+        loaded.removed = removed
+        known = {path for path, _, mtime_ns, _, _ in dirs.values() if mtime_ns is not None}
+        gone = set()
+        listings = {}  # dir id -> {file name: ScanEntry} for the directories listed again
+        new_entries = []
+        for n, (directory, _, mtime_ns, depth, root_id) in dirs.items():
+            if mtime_ns is None:
+                continue
+            if cancel is not None and cancel.is_set():
+                return None
+            root = roots.get(root_id)
+            try:
+                current = os.stat(directory).st_mtime_ns
+            except OSError:
+                gone.add(n)
+                continue
+            if current == mtime_ns:
+                loaded.directories[directory] = (mtime_ns, depth, root)
+                continue
+            loaded.rescanned += 1
+            mode, scan_filter = loaded.roots.get(root, ("folder_only", None))
+            listed = []
+            listing = {}
+            for entry in iter_folder_entries(directory, "folder_only", allowed_extensions, cancel, listed, depth,
+                                             scan_filter):
+                listing[entry.path[len(directory):]] = entry
+            listings[n] = listing
+            for scanned, scanned_mtime, scanned_depth in listed:
+                loaded.directories[scanned] = (scanned_mtime, scanned_depth, root)
+            # Subfolders that are new since the save are walked in full
+            max_depth = _max_depth(mode)
+            if scan_filter:
+                max_depth = scan_filter.limit_depth(max_depth)
+            if max_depth is not None and depth >= max_depth:
+                continue
+            try:
+                with os.scandir(directory) as it:
+                    subdirs = [entry.path for entry in it
+                               if entry.is_dir(follow_symlinks=max_depth is not None)
+                               and os.path.join(entry.path, "") not in known
+                               and not (scan_filter and scan_filter.excludes_dir(entry.name))]
+            except OSError:
+                continue
+            for subdir in subdirs:
+                listed = []
+                new_entries.extend(iter_folder_entries(subdir, mode, allowed_extensions, cancel, listed,
+                                                       depth + 1, scan_filter))
+                for scanned, scanned_mtime, scanned_depth in listed:
+                    loaded.directories[scanned] = (scanned_mtime, scanned_depth, root)
+        if cancel is not None and cancel.is_set():
+            return None
+
+        entries = loaded.entries
+        append = entries.append
+        normcase = os.path.normcase
+        for n, filename, key, size, mtime, ctime in files:
+            if n in gone:
+                loaded.dropped += 1
+                continue
+            directory, real, mtime_ns, _, _ = dirs[n]
+            path = directory + filename
+            listing = listings.get(n)
+            if listing is not None:
+                entry = listing.pop(filename, None)
+                if entry is None:
+                    loaded.dropped += 1
+                    continue
+                append(entry)
+            elif mtime_ns is None:
+                # Added on its own rather than by a folder scan: check it is still there
+                file_info = stat_info(path)
+                if file_info is None:
+                    loaded.dropped += 1
+                    continue
+                append(ScanEntry(path, key or real + normcase(filename), *file_info))
+            else:
+                append(ScanEntry(path, key or real + normcase(filename), size, mtime, ctime))
+        loaded.kept = len(entries)
+        # New files go to the end: those in directories listed again, then those in new subfolders
+        for listing in listings.values():
+            entries.extend(entry for entry in listing.values() if entry.path not in removed)
+        entries.extend(entry for entry in new_entries if entry.path not in removed)
+        loaded.added = len(entries) - loaded.kept
+        if timed:
+            STATS.add("session.rescan", time.perf_counter() - started)
+        return loaded
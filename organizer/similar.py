@@ -0,0 +1,415 @@
+"""Near-duplicate images by perceptual hash.
+
+Every image is reduced to a 64-bit fingerprint (aHash, dHash or pHash) that
+changes little under resizing, recompression or format conversion, so two
+images whose fingerprints differ in only a few bits very likely show the same
+picture. Fingerprints are kept in an array('Q') and compared through a
+multi-index: hashes are split into four 16-bit bands, and two hashes within
+distance t must agree within t // 4 bits on at least one band. Images are
+then compared only with those whose band is (nearly) equal, instead of with
+every other image. The number of near values probed per band grows
+combinatorially with t // 4, so past INDEX_MAX_DISTANCE every image is
+compared with all others instead, many at a time (see _LaneBlock).
+"""
+import json
+import math
+import os
+import sys
+import threading
+import time
+from array import array
+from collections import namedtuple
+from itertools import combinations
+from operator import mul
+
+from organizer.appdirs import cache_dir
+from organizer.stats import STATS
+
+HASH_ALGORITHMS = ("dhash", "ahash", "phash")
+DEFAULT_MAX_DISTANCE = 6
+
+BANDS = 4
+BAND_BITS = 64 // BANDS
+_BAND_MASK = (1 << BAND_BITS) - 1
+# Largest distance clustered through the band index; beyond it the probes per
+# band value outnumber what comparing every pair costs
+INDEX_MAX_DISTANCE = 15
+
+# Images showing the same picture, the largest file first; max_distance is the
+# largest Hamming distance between linked fingerprints
+SimilarGroup = namedtuple("SimilarGroup", ["paths", "max_distance"])
+
+# DCT-II basis for the 8 lowest frequencies over 32 samples, for pHash
+_DCT = [[math.cos((2 * x + 1) * u * math.pi / 64) for x in range(32)] for u in range(8)]
+
+
+def _bits(values):
+    result = 0
+    for value in values:
+        result = (result << 1) | value
+    return result
+
+
+def _gray(img, size):
+    # Reduced-size decode first (JPEG decodes at 1/2..1/8 scale for free), then a
+    # cheap box filter down to the hash grid
+    from PIL import Image
+
+    img.draft("L", (size[0] * 8, size[1] * 8))
+    img = img.convert("L")
+    return list(img.resize(size, Image.Resampling.BOX, reducing_gap=2.0).getdata())
+
+
+def image_hash(path, algorithm="dhash"):
+    from PIL import Image
+
+    with Image.open(path) as img:
+        if algorithm == "dhash":
+            px = _gray(img, (9, 8))
+            return _bits(px[y * 9 + x] > px[y * 9 + x + 1] for y in range(8) for x in range(8))
+        if algorithm == "ahash":
+            px = _gray(img, (8, 8))
+            mean = sum(px) / 64
+            return _bits(p > mean for p in px)
+        if algorithm == "phash":
+            px = _gray(img, (32, 32))
+            rows = [px[y * 32:(y + 1) * 32] for y in range(32)]
+            # Separable DCT, only the top-left 8x8 block is needed
+            row_coefs = [[sum(map(mul, row, basis)) for basis in _DCT] for row in rows]
+            coefs = []
+            for v in range(8):
+                basis = _DCT[v]
+                for u in range(8):
+                    coefs.append(sum(basis[y] * row_coefs[y][u] for y in range(32)))
+            # The DC term is the overall brightness; leave it out of the median
+            median = sorted(coefs[1:])[31]
+            return _bits(c > median for c in coefs)
+    raise ValueError(f"Unknown hash algorithm: {algorithm}")
+
+
+def _hash_worker(args):
+    # Runs in a worker process; failures are returned rather than raised
+    path, algorithm = args
+    started = time.perf_counter()
+    try:
+        return path, image_hash(path, algorithm), None, time.perf_counter() - started
+    except Exception as e:
+        return path, None, str(e) or type(e).__name__, time.perf_counter() - started
+
+
+def hamming(a, b):
+    return (a ^ b).bit_count()
+
+
+def _masks(radius, bits=BAND_BITS):
+    # Every XOR mask of up to `radius` set bits within one band
+    masks = [0]
+    for r in range(1, radius + 1):
+        for positions in combinations(range(bits), r):
+            mask = 0
+            for p in positions:
+                mask |= 1 << p
+            masks.append(mask)
+    return masks
+
+
+# Buckets at least this large are compared with _LaneBlock rather than one by one
+_BLOCK_MIN = 16
+
+
+class _LaneBlock:
+    """Many 64-bit hashes packed into one int, one per 64-bit lane.
+
+    within(h, t) finds every lane within Hamming distance t of h using a dozen
+    big-int operations (a SWAR popcount over all lanes at once), which beats a
+    Python loop once a bucket holds more than a handful of hashes.
+    """
+
+    _masks = {}
+
+    def __init__(self, indices, hashes):
+        self.indices = indices
+        lanes = len(indices)
+        self.packed = int.from_bytes(array("Q", [hashes[i] for i in indices]).tobytes(), sys.byteorder)
+        masks = self._masks.get(lanes)
+        if masks is None:
+            ones = ((1 << (64 * lanes)) - 1) // ((1 << 64) - 1)  # Lowest bit of every lane
+            masks = self._masks[lanes] = (ones, ones * 0x5555555555555555, ones * 0x3333333333333333,
+                                          ones * 0x0F0F0F0F0F0F0F0F, ones * 0xFF)
+        self.ones, self.m1, self.m2, self.m4, self.m8 = masks
+
+    def within(self, h, max_distance):
+        ones = self.ones
+        x = self.packed ^ (ones * h)
+        x -= (x >> 1) & self.m1
+        x = (x & self.m2) + ((x >> 2) & self.m2)
+        x = (x + (x >> 4)) & self.m4
+        # Byte sums stay below 256, so nothing carries into the next lane
+        x += x >> 8
+        x += x >> 16
+        x += x >> 32
+        # Bit 7 of a lane ends up set exactly when its count exceeds max_distance
+        over = ((x & self.m8) + ones * (127 - max_distance)) & (ones << 7)
+        close = (ones << 7) ^ over
+        found = []
+        while close:
+            low = close & -close
+            found.append(self.indices[low.bit_length() >> 6])
+            close ^= low
+        return found
+
+
+def cluster_hashes(hashes, max_distance=DEFAULT_MAX_DISTANCE, cancel=None):
+    """Groups of indices into `hashes` linked by distances of at most max_distance.
+
+    Single linkage: images join a group when close to any member. Returns
+    (groups, max distance per group); groups and their members are in index order.
+    Returns None when the `cancel` event is set before it is done.
+    """
+    hashes = list(hashes)
+    parent = list(range(len(hashes)))
+    widest = {}
+
+    def find(i):
+        while parent[i] != i:
+            parent[i] = parent[parent[i]]
+            i = parent[i]
+        return i
+
+    def link(i, j, distance):
+        ri, rj = find(i), find(j)
+        if ri != rj:
+            root, other = min(ri, rj), max(ri, rj)
+            parent[other] = root
+            widest[root] = max(widest.pop(root, 0), widest.pop(other, 0), distance)
+        elif distance > widest.get(ri, 0):
+            widest[ri] = distance
+
+    if max_distance > INDEX_MAX_DISTANCE:
+        block = _LaneBlock(range(len(hashes)), hashes)
+        for i, h in enumerate(hashes):
+            if i % 256 == 0 and cancel is not None and cancel.is_set():
+                return None
+            for j in block.within(h, max_distance):
+                if j > i:
+                    link(i, j, (h ^ hashes[j]).bit_count())
+        return _groups(hashes, find, widest)
+
+    masks = _masks(max_distance // BANDS)[1:]
+    for b in range(BANDS):
+        shift = b * BAND_BITS
+        table = {}
+        for i, h in enumerate(hashes):
+            table.setdefault((h >> shift) & _BAND_MASK, []).append(i)
+        # Probing works on distinct band values rather than on images, so its cost
+        # is bounded by 2**16 * len(masks) however many images there are. Each
+        # bucket is compared with itself and with its neighbours above it (so
+        # every pair of buckets comes up once), all in one batch.
+        get = table.get
+        for probed, (value, bucket) in enumerate(table.items()):
+            if probed % 256 == 0 and cancel is not None and cancel.is_set():
+                return None
+            candidates = list(bucket)
+            for mask in masks:
+                neighbour = value ^ mask
+                if neighbour > value:
+                    others = get(neighbour)
+                    if others is not None:
+                        candidates += others
+            if len(candidates) < 2:
+                continue
+            if len(candidates) >= _BLOCK_MIN:
+                block = _LaneBlock(candidates, hashes)
+                for i in bucket:
+                    h = hashes[i]
+                    for j in block.within(h, max_distance):
+                        if j != i:
+                            link(i, j, (h ^ hashes[j]).bit_count())
+                continue
+            for n, i in enumerate(bucket):
+                h = hashes[i]
+                for j in candidates[n + 1:]:
+                    distance = (h ^ hashes[j]).bit_count()
+                    if distance <= max_distance:
+                        link(i, j, distance)
+    return _groups(hashes, find, widest)
+
+
+def _groups(hashes, find, widest):
+    # cluster_hashes() results from its union-find state
+    members = {}
+    for i in range(len(hashes)):
+        members.setdefault(find(i), []).append(i)
+    groups = [group for group in members.values() if len(group) > 1]
+    groups.sort(key=lambda group: group[0])
+    return groups, [widest.get(group[0], 0) for group in groups]
+
+
+def default_cache_path():
+    return cache_dir("perceptual.jsonl")
+
+
+class PerceptualCache:
+    """Fingerprints from earlier runs, valid while a file's size and mtime hold.
+
+    JSON lines of [path, size, mtime_ns, algorithm, hash], newest line wins.
+    """
+
+    def __init__(self, path=None):
+        self.path = path or default_cache_path()
+        self.records = {}  # (path, algorithm) -> (size, mtime_ns, hash)
+        self._new = []
+        self._load()
+
+    def _load(self):
+        try:
+            with open(self.path, encoding="utf-8") as f:
+                for line in f:
+                    try:
+                        path, size, mtime_ns, algorithm, value = json.loads(line)
+                    except (ValueError, TypeError):
+                        continue
+                    self.records[(path, algorithm)] = (size, mtime_ns, value)
+        except OSError:
+            pass
+
+    def get(self, path, algorithm, size, mtime_ns):
+        record = self.records.get((path, algorithm))
+        if record is None or record[0] != size or record[1] != mtime_ns:
+            return None
+        return record[2]
+
+    def put(self, path, algorithm, size, mtime_ns, value):
+        self.records[(path, algorithm)] = (size, mtime_ns, value)
+        self._new.append((path, algorithm))
+
+    def save(self):
+        new, self._new = self._new, []
+        if not new:
+            return
+        try:
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            with open(self.path, "a", encoding="utf-8") as f:
+                for key in new:
+                    f.write(json.dumps([key[0], *self.records[key][:2], key[1], self.records[key][2]]) + "\n")
+        except OSError:
+            pass
+
+
+class SimilarSearch:
+    """Fingerprints a batch of images on a process pool and clusters near-duplicates.
+
+    Runs on a worker thread; progress is in `completed`/`total`, the result in
+    `groups`, and files that could not be decoded in `failed`.
+    """
+
+    def __init__(self, paths, algorithm="dhash", max_distance=DEFAULT_MAX_DISTANCE, workers=None,
+                 use_cache=True, cache_path=None):
+        if algorithm not in HASH_ALGORITHMS:
+            raise ValueError(f"Unknown hash algorithm: {algorithm}")
+        self.paths = list(paths)
+        self.algorithm = algorithm
+        self.max_distance = max_distance
+        self.workers = max(1, workers or os.cpu_count() or 1)
+        self.use_cache = use_cache
+        self.cache_path = cache_path
+        self.phase = "hashing"
+        self.total = len(self.paths)
+        self.completed = 0
+        self.failed = []  # (path, error)
+        self.hashes = array("Q")  # Fingerprint of each path in `hashed`
+        self.hashed = []
+        self.groups = []
+        self.error = None
+        self.finished = False
+        self._cancel = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    def start(self):
+        self._thread.start()
+        return self
+
+    def cancel(self):
+        self._cancel.set()
+
+    @property
+    def cancelled(self):
+        return self._cancel.is_set()
+
+    def wait(self, timeout=None):
+        self._thread.join(timeout)
+        return self.finished
+
+    @property
+    def redundant_files(self):
+        return sum(len(group.paths) - 1 for group in self.groups)
+
+    def _run(self):
+        from concurrent.futures import ProcessPoolExecutor
+
+        cache = None
+        try:
+            cache = PerceptualCache(self.cache_path) if self.use_cache else None
+            sizes = {}
+            todo = []
+            for path in self.paths:
+                if self.cancelled:
+                    return
+                try:
+                    st = os.stat(path)
+                except OSError as e:
+                    self.failed.append((path, str(e)))
+                    self.completed += 1
+                    continue
+                sizes[path] = (st.st_size, st.st_mtime_ns)
+                value = cache.get(path, self.algorithm, st.st_size, st.st_mtime_ns) if cache is not None else None
+                if value is not None:
+                    self.hashes.append(value)
+                    self.hashed.append(path)
+                    self.completed += 1
+                else:
+                    todo.append(path)
+
+            timed = STATS.enabled
+            if todo:
+                with ProcessPoolExecutor(max_workers=self.workers) as pool:
+                    # Chunks keep the per-image IPC cost small; a cancel waits for
+                    # the chunks already handed out
+                    chunk = max(1, min(64, len(todo) // (self.workers * 4) or 1))
+                    for start in range(0, len(todo), chunk * self.workers * 4):
+                        if self.cancelled:
+                            return
+                        part = todo[start:start + chunk * self.workers * 4]
+                        for path, value, error, seconds in pool.map(
+                                _hash_worker, [(path, self.algorithm) for path in part], chunksize=chunk):
+                            self.completed += 1
+                            if timed:
+                                STATS.add("similar.hash", seconds, sizes[path][0])
+                            if error is not None:
+                                self.failed.append((path, error))
+                                continue
+                            self.hashes.append(value)
+                            self.hashed.append(path)
+                            if cache is not None:
+                                cache.put(path, self.algorithm, *sizes[path], value)
+
+            self.phase = "clustering"
+            started = time.perf_counter()
+            clustered = cluster_hashes(self.hashes, self.max_distance, self._cancel)
+            if clustered is None:
+                return
+            clusters, widths = clustered
+            if timed:
+                STATS.add("similar.cluster", time.perf_counter() - started)
+            # The largest file of each group first, so it is the one kept by default
+            self.groups = [
+                SimilarGroup(sorted((self.hashed[i] for i in cluster), key=lambda p: -sizes[p][0]), width)
+                for cluster, width in zip(clusters, widths)
+            ]
+        except Exception as e:
+            self.error = str(e) or type(e).__name__
+        finally:
+            if cache is not None:
+                cache.save()
+            self.phase = "done"
+            self.finished = True
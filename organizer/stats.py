@@ -0,0 +1,86 @@
+"""Opt-in timings of the phases of scanning, listing, renaming and converting.
+
+Collection is off by default. Instrumented code reads `STATS.enabled` once per
+call and only takes timestamps when it is set, so leaving it off costs one
+attribute read per loop or call.
+"""
+import json
+import math
+import threading
+from array import array
+
+
+def _percentile(ordered, fraction):
+    # Nearest-rank percentile of an already sorted sequence
+    if not ordered:
+        return 0.0
+    rank = max(0, math.ceil(fraction * len(ordered)) - 1)
+    return ordered[rank]
+
+
+class Stats:
+    """Per-phase sample counts, durations (seconds) and bytes moved."""
+
+    def __init__(self):
+        self.enabled = False
+        self._lock = threading.Lock()
+        self._phases = {}  # phase -> [array of durations, bytes]
+
+    def add(self, phase, seconds, nbytes=0):
+        with self._lock:
+            entry = self._phases.get(phase)
+            if entry is None:
+                entry = self._phases[phase] = [array("d"), 0]
+            entry[0].append(seconds)
+            entry[1] += nbytes
+
+    def merge(self, timings):
+        # (phase, seconds, bytes) triples, as returned by the conversion workers
+        for phase, seconds, nbytes in timings:
+            self.add(phase, seconds, nbytes)
+
+    def reset(self):
+        with self._lock:
+            self._phases = {}
+
+    def __bool__(self):
+        return bool(self._phases)
+
+    def summary(self):
+        """One dict per phase, in the order phases were first seen."""
+        with self._lock:
+            phases = [(phase, sorted(samples), nbytes) for phase, (samples, nbytes) in self._phases.items()]
+        rows = []
+        for phase, ordered, nbytes in phases:
+            total = sum(ordered)
+            rows.append({
+                "phase": phase,
+                "count": len(ordered),
+                "total": total,
+                "p50": _percentile(ordered, 0.50),
+                "p95": _percentile(ordered, 0.95),
+                "max": ordered[-1] if ordered else 0.0,
+                "bytes": nbytes,
+                "bytes_per_second": nbytes / total if nbytes and total > 0 else None,
+            })
+        return rows
+
+    def to_json(self):
+        return json.dumps({"phases": self.summary()}, indent=2)
+
+    def report(self):
+        rows = self.summary()
+        if not rows:
+            return "No timings recorded."
+        lines = [f"{'phase':<22} {'count':>8} {'total s':>9} {'p50 ms':>9} {'p95 ms':>9} {'MB':>9} {'MB/s':>8}"]
+        for row in rows:
+            mb = f"{row['bytes'] / 1e6:9.1f}" if row["bytes"] else f"{'-':>9}"
+            rate = f"{row['bytes_per_second'] / 1e6:8.1f}" if row["bytes_per_second"] else f"{'-':>8}"
+            lines.append(f"{row['phase']:<22} {row['count']:>8} {row['total']:9.3f} {row['p50'] * 1000:9.3f} "
+                         f"{row['p95'] * 1000:9.3f} {mb} {rate}")
+        return "\n".join(lines)
+
+
+# Shared by the GUI and the command line; conversion workers send their timings
+# back with each result instead of writing here
+STATS = Stats()
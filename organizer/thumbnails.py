@@ -0,0 +1,199 @@
+"""Small image previews for the file list, made in the background and cached.
+
+Thumbnails are PNG bytes (which Tk loads directly), decoded at reduced size on
+a thread pool: Pillow releases the GIL while decoding and resizing. Finished
+thumbnails stay in a memory LRU bounded by bytes, and on disk under the user
+cache directory, keyed by path, file size, mtime and thumbnail size, so an
+edited image gets a fresh one.
+"""
+import hashlib
+import io
+import os
+import threading
+import time
+from collections import OrderedDict
+
+from organizer.appdirs import cache_dir
+from organizer.stats import STATS
+
+DEFAULT_SIZE = 48
+# Memory LRU budget; a 48 px PNG thumbnail is typically 2-6 KB
+DEFAULT_MEMORY_BYTES = 16 * 1024 * 1024
+# Disk cache budget, enforced once per session by dropping the least recently used
+DEFAULT_DISK_BYTES = 256 * 1024 * 1024
+# What an unreadable image costs in the memory LRU, so failures are not retried
+_FAILED_COST = 64
+
+
+def default_cache_dir():
+    return cache_dir("thumbnails")
+
+
+def make_thumbnail(path, size=DEFAULT_SIZE):
+    """PNG bytes of `path` shrunk to fit size x size, decoding at reduced size where the format allows."""
+    from PIL import Image, ImageOps
+
+    with Image.open(path) as img:
+        img.draft("RGB", (size, size))
+        img.thumbnail((size, size), reducing_gap=2.0)
+        img = ImageOps.exif_transpose(img)
+        if img.mode not in ("RGB", "RGBA", "L", "LA"):
+            img = img.convert("RGBA")
+        buffer = io.BytesIO()
+        img.save(buffer, format="PNG", compress_level=1)
+    return buffer.getvalue()
+
+
+def prune_disk_cache(directory, max_bytes=DEFAULT_DISK_BYTES):
+    # Deletes the least recently used thumbnails (by mtime, refreshed on every
+    # hit) until the cache fits in max_bytes
+    entries = []
+    total = 0
+    try:
+        for sub in os.scandir(directory):
+            if not sub.is_dir():
+                continue
+            for entry in os.scandir(sub.path):
+                try:
+                    st = entry.stat()
+                except OSError:
+                    continue
+                entries.append((st.st_mtime, st.st_size, entry.path))
+                total += st.st_size
+    except OSError:
+        return
+    if total <= max_bytes:
+        return
+    entries.sort()
+    for _, file_size, path in entries:
+        try:
+            os.remove(path)
+        except OSError:
+            continue
+        total -= file_size
+        if total <= max_bytes:
+            break
+
+
+class ThumbnailLoader:
+    """Makes thumbnails for the rows on screen, newest request first.
+
+    want() replaces the set of thumbnails still to make, so rows scrolled past
+    before their turn are never decoded; results() hands back the finished
+    ones. Call close() when done.
+    """
+
+    def __init__(self, size=DEFAULT_SIZE, workers=None, memory_bytes=DEFAULT_MEMORY_BYTES, cache_path=None,
+                 use_disk=True, disk_bytes=DEFAULT_DISK_BYTES):
+        from concurrent.futures import ThreadPoolExecutor
+
+        self.size = size
+        self.workers = max(1, workers or min(4, os.cpu_count() or 1))
+        self.memory_bytes = memory_bytes
+        self.cache_path = (cache_path or default_cache_dir()) if use_disk else None
+        self.disk_bytes = disk_bytes
+        self._memory = OrderedDict()  # key -> PNG bytes, or None for an unreadable image
+        self._memory_used = 0
+        self._wanted = OrderedDict()  # key -> None, still to make, in request order
+        self._running = set()
+        self._done = []
+        self._lock = threading.Lock()
+        self._pool = ThreadPoolExecutor(max_workers=self.workers)
+        if self.cache_path is not None:
+            self._pool.submit(prune_disk_cache, self.cache_path, disk_bytes)
+
+    @staticmethod
+    def key(path, file_size, mtime):
+        return path, file_size, mtime
+
+    def cached(self, key):
+        """(True, data) from the memory LRU without any I/O, or (False, None)."""
+        with self._lock:
+            if key not in self._memory:
+                return False, None
+            self._memory.move_to_end(key)
+            return True, self._memory[key]
+
+    def want(self, keys):
+        """Makes these thumbnails next (keys from key()); earlier requests not started yet are dropped."""
+        with self._lock:
+            self._wanted = OrderedDict((key, None) for key in keys
+                                       if key not in self._memory and key not in self._running)
+            self._dispatch()
+
+    @property
+    def busy(self):
+        with self._lock:
+            return bool(self._wanted or self._running or self._done)
+
+    def results(self):
+        """(key, PNG bytes or None) for every thumbnail finished since the last call."""
+        with self._lock:
+            done, self._done = self._done, []
+        return done
+
+    def close(self):
+        with self._lock:
+            self._wanted.clear()
+        self._pool.shutdown(wait=False, cancel_futures=True)
+
+    def _dispatch(self):
+        # With the lock held: keeps the workers busy, the first-requested first
+        while self._wanted and len(self._running) < self.workers:
+            key, _ = self._wanted.popitem(last=False)
+            self._running.add(key)
+            try:
+                self._pool.submit(self._make, key)
+            except RuntimeError:  # Closed
+                self._running.discard(key)
+                return
+
+    def _disk_path(self, key):
+        path, file_size, mtime = key
+        digest = hashlib.sha1(f"{path}\0{file_size}\0{mtime!r}\0{self.size}".encode("utf-8", "surrogatepass"))
+        name = digest.hexdigest()
+        return os.path.join(self.cache_path, name[:2], name[2:] + ".png")
+
+    def _make(self, key):
+        timed = STATS.enabled
+        started = time.perf_counter() if timed else None
+        data = None
+        disk_path = self._disk_path(key) if self.cache_path is not None else None
+        try:
+            if disk_path is not None:
+                try:
+                    with open(disk_path, "rb") as f:
+                        data = f.read()
+                    os.utime(disk_path)  # Recently used, for prune_disk_cache
+                except OSError:
+                    data = None
+            if data is None:
+                data = make_thumbnail(key[0], self.size)
+                if timed:
+                    STATS.add("thumbnails.decode", time.perf_counter() - started, key[1])
+                if disk_path is not None:
+                    try:
+                        os.makedirs(os.path.dirname(disk_path), exist_ok=True)
+                        temp_path = f"{disk_path}.{threading.get_ident()}.tmp"
+                        with open(temp_path, "wb") as f:
+                            f.write(data)
+                        os.replace(temp_path, disk_path)
+                    except OSError:
+                        pass
+            elif timed:
+                STATS.add("thumbnails.disk", time.perf_counter() - started, len(data))
+        except Exception:
+            data = None
+        with self._lock:
+            self._running.discard(key)
+            self._remember(key, data)
+            self._done.append((key, data))
+            self._dispatch()
+
+    def _remember(self, key, data):
+        # With the lock held
+        self._memory[key] = data
+        self._memory_used += len(data) if data is not None else _FAILED_COST
+        while self._memory_used > self.memory_bytes and len(self._memory) > 1:
+            _, old = self._memory.popitem(last=False)
+            self._memory_used -= len(old) if old is not None else _FAILED_COST
@@ -0,0 +1,360 @@
+"""Watches folders for files that arrive or change, and hands them out in small batches.
+
+On Linux the kernel reports changes through inotify, so an idle watcher sleeps
+in poll() and costs nothing; elsewhere (or when inotify is unavailable) the
+folders are re-listed every `poll_interval` seconds with the same scan as a
+folder drop, and the listings are diffed.
+
+A file is handed out once it has settled: right after its writer closes it
+(inotify), or once its size and date hold still for `settle` seconds. Files
+that were already handed out, and then renamed or moved by whoever processed
+them, are recognized by their inode and not handed out again.
+"""
+import errno
+import os
+import queue
+import select
+import stat
+import struct
+import sys
+import threading
+import time
+from collections import OrderedDict
+
+from organizer.scanner import _max_depth, iter_folder_entries
+
+# Names of files that are still being downloaded or written, or are our own
+# temporary files (the rename journal parks files under a leading dot)
+TEMP_SUFFIXES = (".part", ".partial", ".tmp", ".crdownload", ".download", ".renaming")
+
+_IN_MODIFY = 0x00000002
+_IN_CLOSE_WRITE = 0x00000008
+_IN_MOVED_TO = 0x00000080
+_IN_CREATE = 0x00000100
+_IN_DELETE_SELF = 0x00000400
+_IN_MOVE_SELF = 0x00000800
+_IN_Q_OVERFLOW = 0x00004000
+_IN_IGNORED = 0x00008000
+_IN_ISDIR = 0x40000000
+_WATCH_MASK = _IN_MODIFY | _IN_CLOSE_WRITE | _IN_MOVED_TO | _IN_CREATE | _IN_DELETE_SELF | _IN_MOVE_SELF
+_EVENT_HEADER = struct.Struct("iIII")
+
+# How many handed-out files are remembered to recognize them after a rename
+_EMITTED_LIMIT = 100_000
+
+
+class _Inotify:
+    """Minimal inotify binding over ctypes; raises OSError where it is unavailable."""
+
+    def __init__(self):
+        if not sys.platform.startswith("linux"):
+            raise OSError(errno.ENOSYS, "inotify is only available on Linux")
+        import ctypes
+
+        libc = ctypes.CDLL(None, use_errno=True)
+        try:
+            self._add_watch = libc.inotify_add_watch
+            init = libc.inotify_init1
+        except AttributeError:
+            raise OSError(errno.ENOSYS, "inotify is not available") from None
+        self._add_watch.argtypes = (ctypes.c_int, ctypes.c_char_p, ctypes.c_uint32)
+        self._ctypes = ctypes
+        self.fd = init(os.O_NONBLOCK | os.O_CLOEXEC)
+        if self.fd < 0:
+            e = ctypes.get_errno()
+            raise OSError(e, os.strerror(e))
+
+    def add_watch(self, path, mask):
+        wd = self._add_watch(self.fd, os.fsencode(path), mask)
+        if wd < 0:
+            e = self._ctypes.get_errno()
+            raise OSError(e, os.strerror(e), path)
+        return wd
+
+    def read(self):
+        # (wd, mask, name) for every queued event
+        try:
+            data = os.read(self.fd, 64 * 1024)
+        except BlockingIOError:
+            return []
+        events = []
+        offset = 0
+        while offset < len(data):
+            wd, mask, _, length = _EVENT_HEADER.unpack_from(data, offset)
+            offset += _EVENT_HEADER.size
+            name = os.fsdecode(data[offset:offset + length].rstrip(b"\0"))
+            offset += length
+            events.append((wd, mask, name))
+        return events
+
+    def close(self):
+        os.close(self.fd)
+
+
+class FolderWatcher:
+    """Hands out new or changed files under `folders` on a background thread.
+
+    `mode` is a folder scan mode (see organizer.scanner.SCAN_MODES), and
+    `allowed_extensions` and an optional ScanFilter limit which files count, as
+    for a folder drop. Files
+    already present when the watcher starts are left alone. Settled files are
+    queued in batches of up to `batch_size`; take them with get_batch().
+    """
+
+    def __init__(self, folders, mode="folder_only", allowed_extensions=None, settle=0.5, batch_window=0.1,
+                 poll_interval=1.0, batch_size=50, use_inotify=True, scan_filter=None):
+        self.folders = [os.path.abspath(folder) for folder in folders]
+        self.mode = mode
+        self.scan_filter = scan_filter or None
+        self.max_depth = scan_filter.limit_depth(_max_depth(mode)) if scan_filter else _max_depth(mode)
+        self.allowed_extensions = {ext.lower() for ext in allowed_extensions} if allowed_extensions else None
+        self.settle = settle
+        self.batch_window = batch_window
+        self.poll_interval = poll_interval
+        self.batch_size = batch_size
+        self.use_inotify = use_inotify
+        self.backend = None  # "inotify" or "polling", once started
+        self.error = None
+        self.handed_out = 0
+        self._batches = queue.Queue()
+        self._pending = {}  # path -> [deadline, (size, mtime) at the last check, closed by its writer]
+        self._emitted = OrderedDict()  # (device, inode, size, mtime) of handed out files
+        self._emitted_lock = threading.Lock()
+        self._stop = threading.Event()
+        self._wake_r, self._wake_w = os.pipe()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    def start(self):
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+        try:
+            os.write(self._wake_w, b"x")
+        except OSError:
+            pass
+        self._thread.join()
+        for fd in (self._wake_r, self._wake_w):
+            try:
+                os.close(fd)
+            except OSError:
+                pass
+
+    @property
+    def stopped(self):
+        return self._stop.is_set()
+
+    def get_batch(self, timeout=None):
+        """The next list of settled files, or None if none came within `timeout` seconds."""
+        try:
+            if timeout == 0:
+                return self._batches.get_nowait()
+            return self._batches.get(timeout=timeout)
+        except queue.Empty:
+            return None
+
+    def mark_seen(self, paths):
+        # Files processed outside the watcher (e.g. the ones already there when it
+        # started) are not handed out again once renamed or moved
+        for path in paths:
+            try:
+                st = os.stat(path)
+            except OSError:
+                continue
+            self._remember(st)
+
+    def _remember(self, st):
+        identity = (st.st_dev, st.st_ino, st.st_size, st.st_mtime)
+        with self._emitted_lock:
+            if identity in self._emitted:
+                return False
+            self._emitted[identity] = None
+            if len(self._emitted) > _EMITTED_LIMIT:
+                self._emitted.popitem(last=False)
+        return True
+
+    def _wanted(self, name):
+        if name.startswith(".") or name.lower().endswith(TEMP_SUFFIXES):
+            return False
+        if self.allowed_extensions is not None and os.path.splitext(name)[1].lower() not in self.allowed_extensions:
+            return False
+        return self.scan_filter is None or self.scan_filter.matches_name(name)
+
+    def _watched_dir(self, name, depth):
+        # Whether a subfolder at `depth` is watched, as the scanner would enter it
+        if self.max_depth is not None and depth > self.max_depth:
+            return False
+        return self.scan_filter is None or not self.scan_filter.excludes_dir(name)
+
+    def _touch(self, path, closed, now, signature=None):
+        entry = self._pending.get(path)
+        if entry is None:
+            self._pending[path] = [now + (self.batch_window if closed else self.settle), signature, closed]
+        elif closed:
+            entry[0] = now + self.batch_window
+            entry[2] = True
+        # Further writes to a file already waiting don't push its check back: the
+        # check itself sees whether it is still changing
+
+    def _check_pending(self, now):
+        # Moves settled files to the batch queue; returns the next deadline or None
+        ready = []
+        next_deadline = None
+        for path, entry in list(self._pending.items()):
+            deadline, signature, closed = entry
+            if deadline > now:
+                next_deadline = deadline if next_deadline is None else min(next_deadline, deadline)
+                continue
+            try:
+                st = os.stat(path)
+            except OSError:
+                del self._pending[path]
+                continue
+            if not stat.S_ISREG(st.st_mode):
+                del self._pending[path]
+                continue
+            current = (st.st_size, st.st_mtime)
+            if not closed and current != signature:
+                # Still being written (or not looked at yet): check again later
+                entry[0] = now + self.settle
+                entry[1] = current
+                next_deadline = entry[0] if next_deadline is None else min(next_deadline, entry[0])
+                continue
+            del self._pending[path]
+            if self.scan_filter is not None and not self.scan_filter.matches_stat(*current):
+                continue  # Judged on its final size
+            if self._remember(st):
+                ready.append(path)
+        for i in range(0, len(ready), self.batch_size):
+            self._batches.put(ready[i:i + self.batch_size])
+        self.handed_out += len(ready)
+        return next_deadline
+
+    def _run(self):
+        try:
+            if self.use_inotify:
+                try:
+                    inotify = _Inotify()
+                except OSError:
+                    inotify = None
+                if inotify is not None:
+                    self.backend = "inotify"
+                    try:
+                        self._run_inotify(inotify)
+                    finally:
+                        inotify.close()
+                    return
+            self.backend = "polling"
+            self._run_polling()
+        except Exception as e:
+            self.error = str(e) or type(e).__name__
+
+    # --- inotify ---
+
+    def _watch_tree(self, inotify, watches, directory, depth, now=None):
+        # Watches `directory` and its subfolders down to the scan depth. With `now`,
+        # files already inside are treated as new (a folder that was just created
+        # or moved in may have been filled before its watch existed)
+        try:
+            wd = inotify.add_watch(directory, _WATCH_MASK)
+        except OSError as e:
+            if e.errno == errno.ENOSPC:
+                raise OSError(e.errno, "Too many folders to watch; raise fs.inotify.max_user_watches") from None
+            return
+        watches[wd] = (directory, depth)
+        try:
+            with os.scandir(directory) as it:
+                entries = list(it)
+        except OSError:
+            return
+        for entry in entries:
+            try:
+                # Symlinked folders are only followed when the depth is bounded, like the scanner
+                if entry.is_dir(follow_symlinks=self.max_depth is not None):
+                    if self._watched_dir(entry.name, depth + 1):
+                        self._watch_tree(inotify, watches, entry.path, depth + 1, now)
+                elif now is not None and self._wanted(entry.name):
+                    self._touch(entry.path, False, now)
+            except OSError:
+                continue
+
+    def _run_inotify(self, inotify):
+        watches = {}  # wd -> (directory, depth)
+        for folder in self.folders:
+            self._watch_tree(inotify, watches, folder, 0)
+        started_at = time.time()
+        poller = select.poll()
+        poller.register(inotify.fd, select.POLLIN)
+        poller.register(self._wake_r, select.POLLIN)
+        next_deadline = None
+
+        while not self._stop.is_set():
+            # Sleep until an event arrives or a waiting file is due; with nothing
+            # waiting, sleep until an event arrives
+            timeout = None if next_deadline is None else max(0, int((next_deadline - time.monotonic()) * 1000) + 1)
+            poller.poll(timeout)
+            if self._stop.is_set():
+                break
+            now = time.monotonic()
+            for wd, mask, name in inotify.read():
+                if mask & _IN_Q_OVERFLOW:
+                    # Events were dropped: look for anything changed since we started
+                    self._rescan(started_at, now, watches)
+                    continue
+                watch = watches.get(wd)
+                if watch is None:
+                    continue
+                directory, depth = watch
+                if mask & (_IN_IGNORED | _IN_DELETE_SELF | _IN_MOVE_SELF):
+                    if mask & _IN_IGNORED:
+                        watches.pop(wd, None)
+                    continue
+                path = os.path.join(directory, name)
+                if mask & _IN_ISDIR:
+                    if mask & (_IN_CREATE | _IN_MOVED_TO) and self._watched_dir(name, depth + 1):
+                        self._watch_tree(inotify, watches, path, depth + 1, now)
+                    continue
+                if not self._wanted(name):
+                    continue
+                # A closed or moved-in file is complete; a created or modified one
+                # may still be written to
+                self._touch(path, bool(mask & (_IN_CLOSE_WRITE | _IN_MOVED_TO)), now)
+            next_deadline = self._check_pending(now)
+
+    def _rescan(self, since, now, watches):
+        for directory, _ in list(watches.values()):
+            try:
+                with os.scandir(directory) as it:
+                    for entry in it:
+                        try:
+                            if (self._wanted(entry.name) and entry.is_file()
+                                    and entry.stat().st_mtime >= since):
+                                self._touch(entry.path, False, now)
+                        except OSError:
+                            continue
+            except OSError:
+                continue
+
+    # --- polling ---
+
+    def _snapshot(self):
+        listing = {}
+        for folder in self.folders:
+            for entry in iter_folder_entries(folder, self.mode, self.allowed_extensions, self._stop,
+                                             scan_filter=self.scan_filter):
+                if self._wanted(os.path.basename(entry.path)):
+                    listing[entry.path] = (entry.size, entry.mtime)
+        return listing
+
+    def _run_polling(self):
+        previous = self._snapshot()
+        while not self._stop.wait(self.poll_interval):
+            current = self._snapshot()
+            now = time.monotonic()
+            for path, signature in current.items():
+                if previous.get(path) != signature:
+                    # Handed out once a later listing finds it unchanged
+                    self._touch(path, False, now, signature)
+            previous = current
+            self._check_pending(now)
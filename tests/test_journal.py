@@ -0,0 +1,158 @@
+import os
+import tempfile
+import unittest
+from unittest import mock
+
+from organizer import journal
+from organizer.journal import (STATUS_COMPLETE, STATUS_ROLLBACK_INCOMPLETE, STATUS_UNDONE, RenameJournal,
+                               RollbackError, load_journal, resume_journal, undo_journal)
+from organizer.renamer import plan_operations
+
+
+class Crash(BaseException):
+    # Not an Exception, so run_operations does not roll back: the process just stops
+    pass
+
+
+def crashing_mover(moves):
+    real = journal.FileMover
+
+    class Mover(real):
+        def __call__(self, src, dst):
+            if moves[0] == 0:
+                raise Crash()
+            moves[0] -= 1
+            super().__call__(src, dst)
+    return Mover
+
+
+class InterruptedSwapTest(unittest.TestCase):
+    """A swap a <-> b crashed after each of its four renames, then resumed or undone."""
+
+    def setUp(self):
+        self.dir = tempfile.TemporaryDirectory()
+        self.a = os.path.join(self.dir.name, "a.txt")
+        self.b = os.path.join(self.dir.name, "b.txt")
+        for path, text in ((self.a, "a"), (self.b, "b")):
+            with open(path, "w") as f:
+                f.write(text)
+
+    def tearDown(self):
+        self.dir.cleanup()
+
+    def read(self, path):
+        with open(path) as f:
+            return f.read()
+
+    def crash_swap(self, moves):
+        ops = plan_operations([(self.a, self.b), (self.b, self.a)])
+        self.assertEqual(len(ops), 4)
+        return self.crash(ops, moves)
+
+    def crash(self, ops, moves):
+        log = RenameJournal(os.path.join(self.dir.name, "batch.jsonl"))
+        log.begin(ops)
+        with mock.patch.object(journal, "FileMover", crashing_mover([moves])):
+            with self.assertRaises(Crash):
+                journal.run_operations(ops, log)
+        log.close()
+        self.assertIsNone(load_journal(log.path).status)
+        return log.path
+
+    def assert_files(self, contents):
+        names = sorted(n for n in os.listdir(self.dir.name) if n != "batch.jsonl")
+        self.assertEqual(names, ["a.txt", "b.txt"])
+        self.assertEqual((self.read(self.a), self.read(self.b)), contents)
+
+    def test_resume(self):
+        for moves in range(4):
+            with self.subTest(moves=moves):
+                path = self.crash_swap(moves)
+                self.assertEqual(resume_journal(path).status, STATUS_COMPLETE)
+                self.assert_files(("b", "a"))
+                os.remove(path)
+                # Swap back for the next round
+                os.rename(self.a, self.a + ".x")
+                os.rename(self.b, self.a)
+                os.rename(self.a + ".x", self.b)
+
+    def test_undo(self):
+        for moves in range(4):
+            with self.subTest(moves=moves):
+                path = self.crash_swap(moves)
+                self.assertEqual(undo_journal(path), 0)
+                self.assert_files(("a", "b"))
+                os.remove(path)
+
+    def test_undo_interrupted_undo(self):
+        for moves in range(1, 4):
+            for undo_moves in range(moves):
+                with self.subTest(moves=moves, undo_moves=undo_moves):
+                    path = self.crash_swap(moves)
+                    with mock.patch.object(journal, "FileMover", crashing_mover([undo_moves])):
+                        with self.assertRaises(Crash):
+                            undo_journal(path)
+                    self.assertEqual(undo_journal(path), 0)
+                    self.assert_files(("a", "b"))
+                    os.remove(path)
+
+    def test_resume_interrupted_undo(self):
+        # Finishing an undo that was cut short puts the rest back rather than redoing the swap
+        path = self.crash_swap(3)
+        with mock.patch.object(journal, "FileMover", crashing_mover([1])):
+            with self.assertRaises(Crash):
+                undo_journal(path)
+        self.assertEqual(resume_journal(path).status, STATUS_UNDONE)
+        self.assert_files(("a", "b"))
+
+    def test_resume_never_overwrites(self):
+        x = os.path.join(self.dir.name, "x.txt")
+        y = os.path.join(self.dir.name, "y.txt")
+        path = self.crash([(self.a, x), (self.b, y)], 1)
+        # The second target was taken before the batch was resumed
+        with open(y, "w") as f:
+            f.write("new")
+        state = resume_journal(path)
+        self.assertEqual((state.status, state.skipped), (STATUS_COMPLETE, {1}))
+        self.assertEqual((self.read(x), self.read(self.b), self.read(y)), ("a", "b", "new"))
+        self.assertEqual(undo_journal(path), 0)
+        self.assertEqual((self.read(self.a), self.read(self.b), self.read(y)), ("a", "b", "new"))
+
+    def test_undo_never_overwrites(self):
+        c = os.path.join(self.dir.name, "c.txt")
+        log = RenameJournal(os.path.join(self.dir.name, "batch.jsonl"))
+        ops = [(self.a, c)]
+        log.begin(ops)
+        journal.run_operations(ops, log)
+        # Something new took the old name since
+        with open(self.a, "w") as f:
+            f.write("new")
+        self.assertEqual(undo_journal(log.path), 1)
+        self.assertEqual((self.read(self.a), self.read(c)), ("new", "a"))
+
+    def test_incomplete_rollback(self):
+        x = os.path.join(self.dir.name, "x.txt")
+        log = RenameJournal(os.path.join(self.dir.name, "batch.jsonl"))
+        ops = [(self.a, x), (self.b, os.path.join(self.dir.name, "missing", "y.txt"))]
+        log.begin(ops)
+        a, b = self.a, self.b
+
+        class Mover(journal.FileMover):
+            def __call__(self, src, dst):
+                if src == b:
+                    # The first file's old name is taken before the rollback runs
+                    with open(a, "w") as f:
+                        f.write("new")
+                super().__call__(src, dst)
+
+        with mock.patch.object(journal, "FileMover", Mover):
+            with self.assertRaises(RollbackError) as raised:
+                journal.run_operations(ops, log)
+        self.assertEqual(raised.exception.unreversed, 1)
+        self.assertIsInstance(raised.exception.__cause__, FileNotFoundError)
+        self.assertEqual(load_journal(log.path).status, STATUS_ROLLBACK_INCOMPLETE)
+        self.assertEqual((self.read(self.a), self.read(x), self.read(self.b)), ("new", "a", "b"))
+
+
+if __name__ == "__main__":
+    unittest.main()